@@ -1,3 +1,5 @@
+import time
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -7,16 +9,36 @@ from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from .database import get_db
+from .database import async_session
 from . import models
 from .utils.redis import redis_client
 from .utils.debug import debug
+from .utils.hashing import auth_config, password_hasher
+from .utils.metrics import (
+    auth_token_cache_total,
+    auth_verification_total,
+    cache_requests_total,
+)
+from .utils.timing import span
+from .utils.token_cache import TokenCache, VerificationCache
 
 # 配置
 SECRET_KEY = "your-secret-key"  # 在生产环境中应该使用环境变量
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 USER_CACHE_TTL = 300  # 用户缓存5分钟
+# 最近一次成功校验的 HMAC 记录有效期, 命中时跳过 bcrypt
+AUTH_VERIFICATION_TTL = auth_config.get("verification_cache_ttl", 600)
+# 令牌携带的用户资料足以构造 User 时跳过数据库 (撤销与禁用通过广播生效)
+TOKEN_CLAIMS_FAST_PATH = auth_config.get("token_claims_fast_path", True)
+PROFILE_CLAIMS = ("email", "full_name", "disabled")
+
+token_cache = TokenCache(max_entries=auth_config.get("token_cache_size", 10000))
+# 校验记录只保存在本进程内存, 密钥每次启动随机生成; 不写入 Redis, 读到 Redis 的人也无法离线验证密码
+verification_cache = VerificationCache(
+    ttl=AUTH_VERIFICATION_TTL,
+    max_entries=auth_config.get("verification_cache_size", 10000),
+)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -64,16 +86,25 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
+def user_claims(user) -> dict:
+    """Claims embedded in access tokens so get_current_user can skip the database."""
+    # jti 保证同一秒内签发的令牌也互不相同, 撤销一个不会波及另一个
+    claims = {"sub": user.username, "jti": uuid.uuid4().hex}
+    if TOKEN_CLAIMS_FAST_PATH:
+        claims.update({name: getattr(user, name) for name in PROFILE_CLAIMS})
+    return claims
+
+
 async def get_user(db: AsyncSession, username: str):
     # 尝试从缓存获取用户
     cache_key = f"user:{username}"
-    debug.log(f"Attempting to get user from cache: {username}")
+    debug.log("Attempting to get user from cache: %s", username)
     cached_user = redis_client.get(cache_key)
     if cached_user:
-        debug.log(f"User cache hit: {username}")
+        debug.sample("cache_hit", "User cache hit: %s", username)
         return models.User(**cached_user)
 
-    debug.log(f"User cache miss: {username}")
+    debug.sample("cache_miss", "User cache miss: %s", username)
     result = await db.execute(
         select(models.User).where(models.User.username == username)
     )
@@ -88,89 +119,140 @@ async def get_user(db: AsyncSession, username: str):
             "disabled": user.disabled,
             "hashed_password": user.hashed_password,
         }
-        debug.log(f"Caching user data for: {username}")
+        debug.log("Caching user data for: %s", username)
         redis_client.set(cache_key, user_data, ttl=USER_CACHE_TTL)
-        debug.log(f"User data cached successfully for: {username}")
+        debug.log("User data cached successfully for: %s", username)
     return user
 
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
-    # 尝试从缓存获取认证结果
-    cache_key = f"auth:{username}:{get_password_hash(password)}"
-    debug.log(f"Attempting to get auth result from cache: {username}")
-    cached_result = redis_client.get(cache_key)
-    if cached_result is not None:
-        debug.log(f"Auth cache hit: {username}")
-        return models.User(**cached_result) if cached_result else False
-
-    debug.log(f"Auth cache miss: {username}")
     user = await get_user(db, username)
     if not user:
-        debug.log(f"User not found: {username}")
-        redis_client.set(cache_key, None, ttl=USER_CACHE_TTL)
+        debug.log("User not found: %s", username)
         return False
-    if not verify_password(password, user.hashed_password):
-        debug.log(f"Invalid password for user: {username}")
-        redis_client.set(cache_key, None, ttl=USER_CACHE_TTL)
+
+    digest = verification_cache.digest(username, password, user.hashed_password)
+    if verification_cache.contains(digest):
+        debug.log("Auth verification cache hit: %s", username)
+        auth_verification_total.labels(result="cache_hit").inc()
+        return user
+
+    # bcrypt 在独立线程池中执行, 不阻塞事件循环
+    if not await password_hasher.verify(password, user.hashed_password):
+        debug.log("Invalid password for user: %s", username)
+        auth_verification_total.labels(result="invalid").inc()
         return False
 
-    # 缓存认证结果
-    user_data = {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "full_name": user.full_name,
-        "disabled": user.disabled,
-        "hashed_password": user.hashed_password,
-    }
-    debug.log(f"Caching auth result for: {username}")
-    redis_client.set(cache_key, user_data, ttl=USER_CACHE_TTL)
-    debug.log(f"Auth result cached successfully for: {username}")
+    auth_verification_total.labels(result="verified").inc()
+    verification_cache.add(digest)
     return user
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
-    # 尝试从缓存获取token解析结果
-    cache_key = f"token:{token}"
-    cached_user = redis_client.get(cache_key)
-    if cached_user:
-        debug.log(f"Token cache hit")
-        return User(**cached_user)
+    with span("auth"):
+        return await _resolve_user(token)
+
 
-    debug.log(f"Token cache miss")
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+async def _resolve_user(token: str) -> "User":
+    credentials_exception = _credentials_exception()
+    token_hash = token_cache.token_hash(token)
+    if token_cache.is_revoked(token_hash):
+        auth_token_cache_total.labels(result="revoked").inc()
+        raise credentials_exception
+
+    # 本进程已验证过的令牌: 不解码、不访问 Redis 与数据库
+    user_data = token_cache.get(token_hash)
+    if user_data is not None:
+        auth_token_cache_total.labels(result="hit").inc()
+        cache_requests_total.labels("token", "get", "hit").inc()
+    else:
+        cache_requests_total.labels("token", "get", "miss").inc()
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            auth_token_cache_total.labels(result="invalid").inc()
+            raise credentials_exception
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
 
-    async for db in get_db():
-        try:
-            user = await get_user(db, username=token_data.username)
+        if TOKEN_CLAIMS_FAST_PATH and all(name in payload for name in PROFILE_CLAIMS):
+            auth_token_cache_total.labels(result="claims").inc()
+            user_data = {
+                "username": username,
+                **{name: payload[name] for name in PROFILE_CLAIMS},
+            }
+        else:
+            # 旧令牌不含用户资料, 仍需查询用户
+            auth_token_cache_total.labels(result="db").inc()
+            async with async_session() as db:
+                user = await get_user(db, username=username)
             if user is None:
                 raise credentials_exception
-
-            # 缓存token解析结果
             user_data = {
                 "username": user.username,
                 "email": user.email,
                 "full_name": user.full_name,
                 "disabled": user.disabled,
             }
-            redis_client.set(cache_key, user_data, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
-            return User(**user_data)
-        finally:
-            await db.close()
+        token_cache.put(token_hash, user_data, payload["exp"])
+
+    if token_cache.is_disabled(user_data["username"]):
+        user_data = {**user_data, "disabled": True}
+    return User(**user_data)
+
+
+def username_from_authorization(authorization: Optional[str]) -> Optional[str]:
+    """Verified username behind an ``Authorization: Bearer`` header, for middleware.
+
+    Served from the local token cache when possible; a forged ``sub`` never
+    passes the signature check.
+    """
+    if not authorization or authorization[:7].lower() != "bearer ":
+        return None
+    token = authorization[7:]
+    cached = token_cache.get(token_cache.token_hash(token))
+    if cached is not None:
+        return cached["username"]
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+def revoke_token(token: str):
+    """Revokes a token until its verified expiry.
+
+    Forged, expired or malformed tokens get 401.
+    """
+    # 必须验证签名: 否则任何人都能写入任意过期时间的撤销记录并广播到所有 worker
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    expires = payload.get("exp")
+    if not isinstance(expires, (int, float)) or payload.get("sub") is None:
+        raise _credentials_exception()
+    token_cache.revoke_token(token_cache.token_hash(token), expires)
+
+
+def disable_user(username: str):
+    # 禁用前签发的令牌最迟在一个有效期后过期
+    redis_client.delete(f"user:{username}")
+    token_cache.disable_user(username, time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
 
-    raise credentials_exception
+def enable_user(username: str):
+    redis_client.delete(f"user:{username}")
+    token_cache.enable_user(username)
 
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
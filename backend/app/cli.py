@@ -1,22 +1,26 @@
+import asyncio
+import sys
 import click
-from sqlalchemy.orm import Session
-from .database import SessionLocal, engine
+from datetime import datetime
+from sqlalchemy import func, select, update
+from .database import async_session, check_schema
 from . import models
-from .auth import get_password_hash
+from .auth import disable_user, enable_user, get_password_hash
+from .services.key_analyzer import TimeRange
+from .services.key_exporter import KeyExporter, ExportFormatError
+from .services.key_ingestor import KeyIngestor
+from .services.retention import retention_job
 import uuid
 
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 升级前就要运行的命令: 0004 的指纹唯一索引要求先删除重复行
+SCHEMA_CHECK_EXEMPT = {"dedupe-keys"}
 
 
 @click.group()
-def cli():
-    pass
+@click.pass_context
+def cli(ctx: click.Context):
+    if ctx.invoked_subcommand not in SCHEMA_CHECK_EXEMPT:
+        asyncio.run(check_schema())
 
 
 @cli.command()
@@ -26,27 +30,170 @@ def cli():
 @click.option("--full-name", default=None)
 def create_user(username: str, password: str, email: str = None, full_name: str = None):
     """创建新用户"""
-    db = next(get_db())
 
-    # 检查用户是否已存在
-    if db.query(models.User).filter(models.User.username == username).first():
-        click.echo(f"用户 {username} 已存在")
-        return
+    async def run():
+        async with async_session() as db:
+            # 检查用户是否已存在
+            result = await db.execute(
+                select(models.User).where(models.User.username == username)
+            )
+            if result.scalar_one_or_none():
+                click.echo(f"用户 {username} 已存在")
+                return
+
+            # 创建新用户
+            user = models.User(
+                id=str(uuid.uuid4()),
+                username=username,
+                email=email,
+                full_name=full_name,
+                hashed_password=get_password_hash(password),
+            )
+
+            db.add(user)
+            await db.commit()
+            click.echo(f"用户 {username} 创建成功")
+
+    asyncio.run(run())
+
+
+def _set_disabled(username: str, disabled: bool):
+    async def run():
+        async with async_session() as db:
+            result = await db.execute(
+                update(models.User)
+                .where(models.User.username == username)
+                .values(disabled=disabled)
+            )
+            await db.commit()
+            return result.rowcount
+
+    if not asyncio.run(run()):
+        raise click.ClickException(f"用户 {username} 不存在")
+    # 通知所有 worker 丢弃本地缓存的令牌
+    (disable_user if disabled else enable_user)(username)
+
+
+@cli.command("disable-user")
+@click.argument("username")
+def disable_user_command(username: str):
+    """禁用用户, 已签发的令牌立即失效"""
+    _set_disabled(username, True)
+    click.echo(f"用户 {username} 已禁用")
+
+
+@cli.command("enable-user")
+@click.argument("username")
+def enable_user_command(username: str):
+    """重新启用用户"""
+    _set_disabled(username, False)
+    click.echo(f"用户 {username} 已启用")
+
+
+@cli.command()
+@click.option(
+    "--start", type=click.DateTime(), default=None, help="起始时间 (Asia/Shanghai)"
+)
+@click.option(
+    "--end", type=click.DateTime(), default=None, help="结束时间 (Asia/Shanghai)"
+)
+@click.option(
+    "--format", "fmt", type=click.Choice(list(KeyExporter.FORMATS)), default="csv"
+)
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None)
+def export_keys(start: datetime, end: datetime, fmt: str, output: str):
+    """按时间范围流式导出密钥数据"""
+    try:
+        exporter = KeyExporter(fmt, TimeRange(start, end))
+    except ExportFormatError as e:
+        raise click.ClickException(str(e))
+
+    async def run(out):
+        async for chunk in exporter.stream():
+            out.write(chunk)
+
+    if output:
+        with open(output, "wb") as out:
+            asyncio.run(run(out))
+        click.echo(f"导出完成: {output}", err=True)
+    else:
+        asyncio.run(run(sys.stdout.buffer))
+
+
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="只统计不删除")
+def dedupe_keys(dry_run: bool):
+    """删除规范化指纹重复的密钥 (保留最早的一条), 用于创建唯一索引前"""
+
+    async def run():
+        async with async_session() as db:
+            ranked = (
+                select(
+                    models.KeyInfo.id,
+                    func.row_number()
+                    .over(
+                        partition_by=models.normalized_fingerprint(
+                            models.KeyInfo.fingerprint
+                        ),
+                        order_by=models.KeyInfo.id,
+                    )
+                    .label("rank"),
+                )
+                .where(models.KeyInfo.fingerprint.isnot(None))
+                .subquery()
+            )
+            duplicates = select(ranked.c.id).where(ranked.c.rank > 1)
+            if dry_run:
+                count = (
+                    await db.execute(
+                        select(func.count()).select_from(duplicates.subquery())
+                    )
+                ).scalar_one()
+                click.echo(f"重复密钥: {count}")
+                return
+            result = await db.execute(
+                models.KeyInfo.__table__.delete().where(
+                    models.KeyInfo.id.in_(duplicates)
+                )
+            )
+            await db.commit()
+            click.echo(f"已删除重复密钥: {result.rowcount}")
+
+    asyncio.run(run())
+
+
+@cli.command()
+def rebuild_bloom():
+    """从数据库重建指纹去重 Bloom 过滤器"""
+
+    async def run():
+        async with async_session() as db:
+            loaded = await KeyIngestor.rebuild_bloom(db)
+        click.echo(f"Bloom 过滤器已加载指纹: {loaded}")
+
+    asyncio.run(run())
+
+
+@cli.command()
+@click.option("--dry-run", is_flag=True, help="只统计待折叠的密钥数")
+@click.option("--max-batches", type=int, default=None, help="本次最多执行的事务数")
+def compact_keys(dry_run: bool, max_batches: int):
+    """把超过保留期的低分密钥折叠为小时汇总, 原始行归档到压缩文件后删除"""
 
-    # 创建新用户
-    user = models.User(
-        id=str(uuid.uuid4()),
-        username=username,
-        email=email,
-        full_name=full_name,
-        hashed_password=get_password_hash(password),
-    )
+    async def run():
+        if dry_run:
+            click.echo(
+                f"待折叠密钥 ({retention_job.cutoff()} 之前): {await retention_job.pending()}"
+            )
+            return
+        totals = await retention_job.run_once(max_batches)
+        click.echo(
+            f"已折叠密钥: {totals['keys']} ({totals['hours']} 小时, {totals['batches']} 批), "
+            f"归档目录: {retention_job.archive_path}"
+        )
 
-    db.add(user)
-    db.commit()
-    click.echo(f"用户 {username} 创建成功")
+    asyncio.run(run())
 
 
 if __name__ == "__main__":
-    models.Base.metadata.create_all(bind=engine)
     cli()
@@ -41,5 +41,26 @@ current_config = config[ENV]
 
 # 添加数据库和 Redis 配置
 current_config.update(
-    {"database": file_config.get("database", {}), "redis": file_config.get("redis", {})}
+    {
+        "database": file_config.get("database", {}),
+        "redis": file_config.get("redis", {}),
+        "pagination": file_config.get("pagination", {}),
+        "export": file_config.get("export", {}),
+        "search": file_config.get("search", {}),
+        "dedup": file_config.get("dedup", {}),
+        "auth": file_config.get("auth", {}),
+        "rate_limit": file_config.get("rate_limit", {}),
+        "admission": file_config.get("admission", {}),
+        "deadlines": file_config.get("deadlines", {}),
+        "profiling": file_config.get("profiling", {}),
+        "logging": file_config.get("logging", {}),
+        "startup": file_config.get("startup", {}),
+        "analytics": file_config.get("analytics", {}),
+        "snapshots": file_config.get("snapshots", {}),
+        "hot_window": file_config.get("hot_window", {}),
+        "change_feed": file_config.get("change_feed", {}),
+        "stream": file_config.get("stream", {}),
+        "score_index": file_config.get("score_index", {}),
+        "retention": file_config.get("retention", {}),
+    }
 )
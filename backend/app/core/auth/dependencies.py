@@ -6,7 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from ...models.user import User
-from ...core.db import get_db
+from ...database import async_session
 from ...utils.redis import redis_client
 from ...utils.debug import debug
 from .security import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
@@ -18,13 +18,13 @@ USER_CACHE_TTL = 300  # 用户缓存5分钟
 
 async def get_user(db: AsyncSession, username: str) -> Optional[User]:
     cache_key = f"user:{username}"
-    debug.log(f"Attempting to get user from cache: {username}")
+    debug.log("Attempting to get user from cache: %s", username)
     cached_user = redis_client.get(cache_key)
     if cached_user:
-        debug.log(f"User cache hit: {username}")
+        debug.sample("cache_hit", "User cache hit: %s", username)
         return User(**cached_user)
 
-    debug.log(f"User cache miss: {username}")
+    debug.sample("cache_miss", "User cache miss: %s", username)
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalar_one_or_none()
 
@@ -37,9 +37,9 @@ async def get_user(db: AsyncSession, username: str) -> Optional[User]:
             "disabled": user.disabled,
             "hashed_password": user.hashed_password,
         }
-        debug.log(f"Caching user data for: {username}")
+        debug.log("Caching user data for: %s", username)
         redis_client.set(cache_key, user_data, ttl=USER_CACHE_TTL)
-        debug.log(f"User data cached successfully for: {username}")
+        debug.log("User data cached successfully for: %s", username)
     return user
 
 
@@ -47,10 +47,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
     cache_key = f"token:{token}"
     cached_user = redis_client.get(cache_key)
     if cached_user:
-        debug.log(f"Token cache hit")
+        debug.sample("cache_hit", "Token cache hit")
         return UserResponse(**cached_user)
 
-    debug.log(f"Token cache miss")
+    debug.sample("cache_miss", "Token cache miss")
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -66,24 +66,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
     except JWTError:
         raise credentials_exception
 
-    async for db in get_db():
-        try:
-            user = await get_user(db, username=token_data.username)
-            if user is None:
-                raise credentials_exception
-
-            user_data = {
-                "username": user.username,
-                "email": user.email,
-                "full_name": user.full_name,
-                "disabled": user.disabled,
-            }
-            redis_client.set(cache_key, user_data, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
-            return UserResponse(**user_data)
-        finally:
-            await db.close()
+    async with async_session() as db:
+        user = await get_user(db, username=token_data.username)
+    if user is None:
+        raise credentials_exception
 
-    raise credentials_exception
+    user_data = {
+        "username": user.username,
+        "email": user.email,
+        "full_name": user.full_name,
+        "disabled": user.disabled,
+    }
+    redis_client.set(cache_key, user_data, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+    return UserResponse(**user_data)
 
 
 async def get_current_active_user(
@@ -1,3 +1,3 @@
-from .database import Base, init_db, get_db
+from ...database import Base, engine, async_session, check_schema, get_db
 
-__all__ = ["Base", "init_db", "get_db"]
+__all__ = ["Base", "engine", "async_session", "check_schema", "get_db"]
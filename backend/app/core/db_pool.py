@@ -1,16 +0,0 @@
-from sqlalchemy.engine import create_engine
-from sqlalchemy.pool import QueuePool
-from ..config import current_config
-
-db_config = current_config["database"]
-DATABASE_URL = f"postgresql://{db_config['username']}:{db_config['password']}@{db_config['host']}:{db_config['port']}/{db_config['database']}"
-
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800,
-    echo=False,
-)
@@ -1,32 +1,215 @@
+import asyncio
+import itertools
+import os
+import re
+import time
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-import json
-import os
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .config import BASE_DIR, current_config
 from .utils.debug import debug
+from .utils.timing import record
+from .utils.metrics import (
+    db_pool_checkout_wait_seconds,
+    db_pool_connections,
+    db_query_duration_seconds,
+    db_read_route_total,
+    db_rows_fetched_total,
+    gauge_function,
+    replica_lag_seconds,
+)
+
+# 全进程唯一的数据库引擎与会话工厂, 路由、认证、CLI 均从这里获取会话
+db_config = current_config["database"]
+
+
+def _database_url(cfg: dict) -> str:
+    # 只读副本未填写的连接参数沿用主库配置
+    cfg = {**db_config, **cfg}
+    return (
+        f"postgresql+asyncpg://{cfg['username']}:{cfg['password']}"
+        f"@{cfg['host']}:{cfg['port']}/{cfg['database']}"
+    )
+
+
+DATABASE_URL = _database_url({})
+
+POOL_SIZE = db_config.get("pool_size", 10)
+MAX_OVERFLOW = db_config.get("max_overflow", 20)
+POOL_TIMEOUT = db_config.get("pool_timeout", 30)
+POOL_RECYCLE = db_config.get("pool_recycle", 1800)
+POOL_PRE_PING = db_config.get("pool_pre_ping", True)
+PREPARED_STATEMENT_CACHE_SIZE = db_config.get("prepared_statement_cache_size", 500)
+STATEMENT_TIMEOUT_MS = db_config.get("statement_timeout_ms", 30000)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - started)
+
+
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?([A-Za-z_][\w.]*)", re.IGNORECASE)
+_STATEMENT_TYPES = {"select", "insert", "update", "delete"}
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-with open(os.path.join(BASE_DIR, "config.json")) as f:
-    config = json.load(f)
+@lru_cache(maxsize=1024)
+def _statement_labels(statement: str) -> Tuple[str, str]:
+    words = statement.split(None, 1)
+    statement_type = words[0].lower() if words else "other"
+    if statement_type == "with":
+        statement_type = "select"
+    elif statement_type not in _STATEMENT_TYPES:
+        statement_type = "other"
+    match = _TABLE_RE.search(statement)
+    return statement_type, match.group(1) if match else "-"
 
-db_config = config["database"]
-DATABASE_URL = f"postgresql+asyncpg://{db_config['username']}:{db_config['password']}@{db_config['host']}:{db_config['port']}/{db_config['database']}"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+def _instrument_queries(engine, role: str):
+    """Times every statement and counts the rows it returned or affected.
+
+    Streamed (server-side cursor) results report no row count, so only the
+    time to open them is recorded.
+    """
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statement_type, table = _statement_labels(statement)
+        elapsed = time.perf_counter() - context._query_started
+        db_query_duration_seconds.labels(role, statement_type, table).observe(elapsed)
+        record("db", elapsed)
+        if cursor.rowcount > 0:
+            db_rows_fetched_total.labels(role, statement_type, table).inc(
+                cursor.rowcount
+            )
+
+
+def _create_engine(url: str, role: str):
+    engine = create_async_engine(
+        url,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+        connect_args={
+            # SQLAlchemy 的 asyncpg 方言按连接缓存预编译语句
+            "prepared_statement_cache_size": PREPARED_STATEMENT_CACHE_SIZE,
+            "server_settings": {
+                "statement_timeout": str(STATEMENT_TIMEOUT_MS),
+                "application_name": f"key-analysis-{role}",
+            },
+        },
+    )
+    _instrument_queries(engine, role)
+    return engine
+
+
+engine = _create_engine(DATABASE_URL, "primary")
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+gauge_function(
+    db_pool_connections.labels(state="in_use"), lambda: engine.pool.checkedout()
+)
+gauge_function(
+    db_pool_connections.labels(state="idle"), lambda: engine.pool.checkedin()
+)
+gauge_function(
+    db_pool_connections.labels(state="overflow"), lambda: max(engine.pool.overflow(), 0)
+)
+
 Base = declarative_base()
 
+# 迁移脚本目录 (alembic.ini 与 migrations/ 位于 backend/ 下)
+ALEMBIC_INI = os.path.join(BASE_DIR, "alembic.ini")
+
+
+class SchemaOutOfDateError(RuntimeError):
+    pass
+
+
+async def check_schema():
+    """Fails fast when the database is not at the latest Alembic revision.
+
+    Replaces running ``create_all`` on every boot: the schema is owned by
+    ``alembic upgrade head``, startup only compares revisions.
+    """
+    from alembic.config import Config
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    heads = set(ScriptDirectory.from_config(Config(ALEMBIC_INI)).get_heads())
+    async with engine.connect() as conn:
+        current = set(
+            await conn.run_sync(
+                lambda sync_conn: MigrationContext.configure(
+                    sync_conn
+                ).get_current_heads()
+            )
+        )
+    if current != heads:
+        raise SchemaOutOfDateError(
+            f"Database schema is at {sorted(current) or 'no revision'}, "
+            f"expected {sorted(heads)}; "
+            "run `alembic upgrade head` from backend/"
+        )
+    debug.log("Database schema at revision %s", sorted(current))
 
-async def init_db():
-    try:
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-            debug.log("Database tables created successfully")
-    except Exception as e:
-        debug.error(f"Error creating database tables: {str(e)}")
-        raise
+
+async def warm_up(connections: int):
+    """Opens ``connections`` pooled connections per engine.
+
+    The first requests then skip the connection handshake.
+    """
+    engines = [engine, *(replica.engine for replica in replica_router.replicas)]
+
+    async def open_one(target):
+        conn = await target.connect()
+        await conn.execute(text("SELECT 1"))
+        return conn
+
+    for target in engines:
+        # 同时持有多个连接, 池中才会真正建立多条
+        opened = await asyncio.gather(
+            *(open_one(target) for _ in range(min(connections, POOL_SIZE))),
+            return_exceptions=True,
+        )
+        for conn in opened:
+            if isinstance(conn, Exception):
+                debug.error(
+                    "Connection warm-up failed for %s: %s", target.url.host, conn
+                )
+            else:
+                await conn.close()
+
+
+async def dispose_engines():
+    await engine.dispose()
+    for replica in replica_router.replicas:
+        await replica.engine.dispose()
+
+
+async def set_statement_timeout(session: AsyncSession, timeout_ms: int):
+    # SET LOCAL 只作用于当前事务, 提交或回滚后恢复连接默认值
+    await session.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
 
 
 async def get_db():
@@ -37,3 +220,112 @@ async def get_db():
         except Exception:
             await session.rollback()
             raise
+
+
+REPLICA_MAX_LAG_SECONDS = db_config.get("replica_max_lag_seconds", 5)
+REPLICA_LAG_CHECK_INTERVAL = db_config.get("replica_lag_check_interval", 2)
+
+# 副本延迟 (秒), NULL 表示无法确认:
+# - 非 standby 返回 0;
+# - WAL receiver 不在 streaming 状态 (复制中断或在重连) 时返回 NULL, 不能用接收位置判断追平;
+# - 已接收的 WAL 全部回放时, 副本持有主库截至最后一次收到消息 (WAL 或 keepalive) 时的提交,
+#   延迟为距该消息的时间;
+# - 否则为最后回放事务的年龄.
+# 读取 pg_stat_wal_receiver 需要 pg_read_all_stats 权限, 无权限时 status 为 NULL, 副本不参与路由.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN receiver.status IS DISTINCT FROM 'streaming' THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+            THEN GREATEST(EXTRACT(EPOCH FROM now() - receiver.last_msg_receipt_time), 0)
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+    FROM (SELECT 1) AS standby
+    LEFT JOIN pg_stat_wal_receiver AS receiver ON true
+    """)
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = _create_engine(url, name)
+        self.session_factory = sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+
+    @property
+    def replayed_through(self) -> float:
+        """Wall-clock time up to which this replica is known to hold all commits."""
+        return self.checked_at - self.lag if self.lag is not None else 0.0
+
+    async def check_lag(self):
+        try:
+            async with self.engine.connect() as conn:
+                lag = (await conn.execute(REPLICA_LAG_SQL)).scalar_one()
+            if lag is None:
+                debug.error("Replica %s is not streaming WAL, lag unknown", self.name)
+            self.lag = float(lag) if lag is not None else None
+        except Exception as e:
+            debug.error("Replica %s lag check failed: %s", self.name, e)
+            self.lag = None
+        self.checked_at = time.time()
+        replica_lag_seconds.labels(replica=self.name).set(
+            -1 if self.lag is None else self.lag
+        )
+
+
+class ReplicaRouter:
+    """Routes analytics reads to a replica that already holds the requested range.
+
+    A replica qualifies when everything committed up to ``end`` (or up to now
+    for open ranges), minus the configured lag budget, has been replayed.
+    Lag is sampled every ``replica_lag_check_interval`` seconds; a replica
+    whose WAL receiver is not streaming, or that misses three samples, is
+    skipped. A caught-up replica only vouches for commits up to the last
+    message it received, so on an idle primary the lag grows with the
+    keepalive interval. Anything else goes to the primary.
+    """
+
+    def __init__(self, replica_configs: List[dict]):
+        self.replicas = [
+            Replica(cfg.get("name", f"replica{i}"), _database_url(cfg))
+            for i, cfg in enumerate(replica_configs)
+        ]
+        self._round_robin = itertools.count()
+
+    def session_factory(self, end_ms: Optional[int] = None):
+        now = time.time()
+        needed = min(end_ms / 1000, now) if end_ms is not None else now
+        usable = [
+            replica
+            for replica in self.replicas
+            if now - replica.checked_at < REPLICA_LAG_CHECK_INTERVAL * 3
+            and replica.replayed_through >= needed - REPLICA_MAX_LAG_SECONDS
+        ]
+        if not usable:
+            if self.replicas:
+                db_read_route_total.labels(target="primary").inc()
+            return async_session
+        replica = usable[next(self._round_robin) % len(usable)]
+        db_read_route_total.labels(target=replica.name).inc()
+        return replica.session_factory
+
+    async def run(self):
+        """Background task sampling replica lag."""
+        while True:
+            await asyncio.gather(*(replica.check_lag() for replica in self.replicas))
+            await asyncio.sleep(REPLICA_LAG_CHECK_INTERVAL)
+
+
+replica_router = ReplicaRouter(db_config.get("replicas", []))
+
+
+async def get_read_db(end: Optional[int] = None):
+    """Read-only session for analytics.
+
+    Shares the endpoint's ``end`` query parameter.
+    """
+    async with replica_router.session_factory(end)() as session:
+        yield session
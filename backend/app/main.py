@@ -1,23 +1,104 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .core.db import init_db
+from .auth import token_cache
+from .database import check_schema, dispose_engines, replica_router, warm_up
 from .config import current_config
 from .utils.debug import debug
-from .routers import auth, users, keys, statistics
+from .utils.lazy import np, pd
+from .utils.metrics import mark_process_dead, metrics_app, sample_gauges
+from .utils.redis import redis_client
+from .utils.timing import TimedJSONResponse
+from .routers import auth, users, keys, statistics, stream
+from .middleware.deadline import DeadlineMiddleware
+from .middleware.metrics import MetricsMiddleware
+from .middleware.profiling import ProfilerMiddleware, ServerTimingMiddleware
+from .middleware.rate_limit import RateLimitMiddleware, rate_limit_config
+from .services.change_feed import change_feed
+from .services.compute_backend import get_backend
+from .services.dashboard_stream import dashboard_broadcaster
+from .services.fingerprint_index import fingerprint_index, search_config
+from .services.hot_window import hot_window
+from .services.retention import retention_job
+from .services.snapshot_store import snapshot_store
+
+startup_config = current_config.get("startup", {})
+
+
+async def _preload_analytics():
+    # 在线程中导入 pandas/numpy (及配置的计算后端), 首个统计请求不再承担导入耗时
+    started = time.perf_counter()
+    await asyncio.to_thread(pd.load)
+    await asyncio.to_thread(np.load)
+    await asyncio.to_thread(get_backend)
+    debug.log("Analytics stack loaded in %.2fs", time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    debug.log("Starting up application...")
+    started = time.perf_counter()
+    if startup_config.get("check_migrations", True):
+        await check_schema()
+    # 连接预热: Redis 探测放在线程里, 不阻塞事件循环
+    await asyncio.gather(
+        asyncio.to_thread(redis_client.connect),
+        warm_up(startup_config.get("warm_connections", 2)),
+    )
+    token_cache.start()
+
+    tasks = [asyncio.create_task(sample_gauges())]
+    if replica_router.replicas:
+        tasks.append(asyncio.create_task(replica_router.run()))
+    if change_feed.enabled:
+        tasks.append(asyncio.create_task(change_feed.run()))
+    if search_config.get("ngram_index", False):
+        tasks.append(asyncio.create_task(fingerprint_index.run()))
+    if hot_window.enabled:
+        tasks.append(asyncio.create_task(hot_window.run()))
+    if dashboard_broadcaster.enabled:
+        tasks.append(asyncio.create_task(dashboard_broadcaster.run()))
+    if snapshot_store.enabled:
+        tasks.append(asyncio.create_task(snapshot_store.run()))
+    if retention_job.enabled:
+        tasks.append(asyncio.create_task(retention_job.run()))
+    if startup_config.get("preload_analytics", True):
+        tasks.append(asyncio.create_task(_preload_analytics()))
+    debug.log("Application startup completed in %.2fs", time.perf_counter() - started)
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await dispose_engines()
+    mark_process_dead()
+
 
 app = FastAPI(
     title="Key Analysis API",
     description="A FastAPI application for key analysis",
     version="1.0.0",
+    default_response_class=TimedJSONResponse,
+    lifespan=lifespan,
 )
 
 
-@app.on_event("startup")
-async def startup_event():
-    debug.log("Starting up application...")
-    await init_db()
-    debug.log("Application startup completed")
+# 按请求的采样分析 (仅管理员, 最内层) 与 Server-Timing 分段耗时
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(ServerTimingMiddleware)
 
+# 请求截止时间与断开取消 (只包住路由本身)
+app.add_middleware(DeadlineMiddleware)
+
+# 限流 (先注册, 位于 CORS 内层, 429 响应也带 CORS 头)
+if rate_limit_config.get("enabled", True):
+    app.add_middleware(RateLimitMiddleware)
+
+# 请求延迟指标 (位于 CORS 内层, 包含限流耗时)
+app.add_middleware(MetricsMiddleware)
 
 # 配置CORS
 app.add_middleware(
@@ -33,3 +114,7 @@ app.include_router(auth.router, prefix="/api", tags=["auth"])
 app.include_router(users.router, prefix="/api", tags=["users"])
 app.include_router(keys.router, prefix="/api", tags=["keys"])
 app.include_router(statistics.router, prefix="/api", tags=["statistics"])
+app.include_router(stream.router, prefix="/api", tags=["stream"])
+
+# Prometheus 指标
+app.mount("/metrics", metrics_app())
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import time
+from typing import Optional
+
+from ..utils.debug import debug
+from ..utils.deadline import DeadlineExceeded, deadline_config, request_deadline
+from ..utils.metrics import request_cancelled_total
+
+# 只读路由: 入库等写请求不在默认列表中, 且非 GET/HEAD 请求一律不取消
+CANCEL_ON_DISCONNECT = [
+    "/api/statistics",
+    "/api/keys/recent",
+    "/api/keys/high-score",
+    "/api/keys/search",
+    "/api/keys/export",
+]
+CANCELLABLE_METHODS = ("GET", "HEAD")
+
+
+class DeadlineMiddleware:
+    """Gives each request a deadline and cancels it when the client goes away.
+
+    The deadline is the route's configured budget (longest matching prefix
+    in ``deadlines.routes``, else ``default_seconds``), shortened by an
+    ``X-Request-Timeout`` header in seconds, and is published through the
+    ``request_deadline`` context variable for statement timeouts and compute
+    checkpoints. A DeadlineExceeded escaping the app becomes a 504.
+
+    For GET and HEAD requests under ``cancel_on_disconnect`` prefixes the
+    middleware owns ``receive``: a pump task forwards messages to the app
+    and cancels the app task on ``http.disconnect``, so an abandoned request
+    stops at its next await (a running asyncpg query is cancelled
+    server-side) and its connection goes back to the pool. Other methods
+    are never cancelled, so a disconnect cannot interrupt a write mid-commit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.default_seconds = deadline_config.get("default_seconds", 30)
+        self.routes = sorted(
+            deadline_config.get("routes", {"/api/statistics": 20}).items(),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.cancel_prefixes = tuple(
+            deadline_config.get("cancel_on_disconnect", CANCEL_ON_DISCONNECT)
+        )
+
+    def budget_for(self, path: str, headers) -> float:
+        budget = next(
+            (seconds for prefix, seconds in self.routes if path.startswith(prefix)),
+            self.default_seconds,
+        )
+        for name, value in headers:
+            if name == b"x-request-timeout":
+                try:
+                    budget = min(budget, max(0.0, float(value)))
+                except ValueError:
+                    pass
+                break
+        return budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        token = request_deadline.set(
+            time.monotonic() + self.budget_for(path, scope["headers"])
+        )
+        response_started = False
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            cancel_prefix = self._cancel_prefix(scope["method"], path)
+            if cancel_prefix is None:
+                await self.app(scope, receive, tracking_send)
+            else:
+                await self._run_cancellable(
+                    scope, receive, tracking_send, cancel_prefix
+                )
+        except DeadlineExceeded as e:
+            if response_started:
+                raise
+            body = json.dumps({"detail": str(e)}).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 504,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            request_deadline.reset(token)
+
+    def _cancel_prefix(self, method: str, path: str) -> Optional[str]:
+        if method not in CANCELLABLE_METHODS:
+            return None
+        return next(
+            (prefix for prefix in self.cancel_prefixes if path.startswith(prefix)), None
+        )
+
+    async def _run_cancellable(self, scope, receive, send, route: str):
+        inbox: "asyncio.Queue[dict]" = asyncio.Queue()
+        response_complete = False
+
+        async def pump():
+            while True:
+                message = await receive()
+                inbox.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def tracking_send(message):
+            nonlocal response_complete
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                response_complete = True
+
+        # The child task copies the context, so it sees request_deadline
+        app_task = asyncio.ensure_future(self.app(scope, inbox.get, tracking_send))
+        pump_task = asyncio.ensure_future(pump())
+        try:
+            await asyncio.wait(
+                {app_task, pump_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not app_task.done() and response_complete:
+                # Servers report a disconnect once the response is sent; let
+                # post-response work (background tasks) finish
+                await app_task
+        finally:
+            pump_task.cancel()
+            if not app_task.done():
+                app_task.cancel()
+                # Wait for session cleanup so the connection is back in the pool
+                await asyncio.gather(app_task, return_exceptions=True)
+                if pump_task.done() and not pump_task.cancelled():
+                    request_cancelled_total.labels(route=route).inc()
+                    debug.log(
+                        "Client disconnected, cancelled %s %s",
+                        scope["method"],
+                        scope["path"],
+                    )
+        if not app_task.cancelled():
+            app_task.result()
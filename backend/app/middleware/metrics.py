@@ -0,0 +1,39 @@
+import time
+
+from ..utils.metrics import http_request_duration_seconds
+
+
+class MetricsMiddleware:
+    """Observes request latency labelled by the matched route template.
+
+    FastAPI writes the matched route into the (shared) scope while routing,
+    so it is read after the app returns; unmatched paths share one label to
+    keep cardinality bounded. Streaming responses are timed to the last body
+    chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            http_request_duration_seconds.labels(
+                scope["method"],
+                route.path if route is not None else "<unmatched>",
+                str(status),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,198 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from ..auth import username_from_authorization
+from ..config import current_config
+from ..utils.timing import request_spans, server_timing
+
+profiling_config = current_config.get("profiling", {})
+
+
+class ServerTimingMiddleware:
+    """Collects the request's spans and returns them as a Server-Timing header.
+
+    Spans recorded after the response has started (streamed bodies) are not
+    included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        spans = {}
+        token = request_spans.set(spans)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing(spans, time.perf_counter() - started)
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", header),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_spans.reset(token)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename.rsplit("/", 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _awaited_stack(coro) -> List[str]:
+    """Stack of a suspended coroutine, outermost first, following its await chain."""
+    stack = []
+    while coro is not None:
+        frame = (
+            getattr(coro, "cr_frame", None)
+            or getattr(coro, "gi_frame", None)
+            or getattr(coro, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        coro = (
+            getattr(coro, "cr_await", None)
+            or getattr(coro, "gi_yieldfrom", None)
+            or getattr(coro, "ag_await", None)
+        )
+    if coro is not None:
+        stack.append(f"<await {type(coro).__name__}>")
+    return stack
+
+
+class RequestSampler(threading.Thread):
+    """Samples one request's stack every ``interval`` seconds, wall-clock.
+
+    While the request's coroutine runs, the event-loop thread's stack is cut
+    at the coroutine's root frame; while it is suspended, the await chain
+    shows where it is waiting. Other requests sharing the loop never appear.
+    """
+
+    def __init__(self, coro, loop_thread_id: int, interval: float, max_seconds: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.coro = coro
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def _sample(self) -> Optional[List[str]]:
+        root = self.coro.cr_frame
+        if root is None:
+            return None
+        if not self.coro.cr_running:
+            return _awaited_stack(self.coro)
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            if frame is root:
+                return stack[::-1]
+            frame = frame.f_back
+        return None
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop_event.wait(self.interval) and time.monotonic() < deadline:
+            stack = self._sample()
+            if stack:
+                self.samples[";".join(stack)] += 1
+
+    def stop(self) -> str:
+        self._stop_event.set()
+        self.join()
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
+
+
+class ProfilerMiddleware:
+    """Opt-in per-request sampling profiler for admins.
+
+    ``?profile=1`` or ``X-Profile: 1`` from a user listed in
+    ``profiling.admins`` replaces the response with the request's folded
+    stacks (``frame;frame;frame count`` per line), ready for flamegraph.pl
+    or speedscope. The original status is kept in ``X-Profiled-Status``;
+    ServerTimingMiddleware, wrapping this one, still adds Server-Timing.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = profiling_config.get("enabled", True)
+        self.admins = set(profiling_config.get("admins", []))
+        self.interval = profiling_config.get("interval_ms", 2) / 1000
+        self.max_seconds = profiling_config.get("max_seconds", 60)
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value in (b"1", b"true")
+        query = scope.get("query_string", b"")
+        return b"profile=" in query and parse_qs(query.decode("latin-1")).get(
+            "profile"
+        ) in (["1"], ["true"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or not self._requested(scope):
+            return await self.app(scope, receive, send)
+
+        authorization = (
+            dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+        )
+        if username_from_authorization(authorization) not in self.admins:
+            body = b'{"detail":"Profiling is restricted to admins"}'
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 403,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start_message = {}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start_message.update(message)
+
+        coro = self.app(scope, receive, capture)
+        sampler = RequestSampler(
+            coro, threading.get_ident(), self.interval, self.max_seconds
+        )
+        sampler.start()
+        try:
+            await coro
+        finally:
+            folded = sampler.stop().encode()
+
+        headers = [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(folded)).encode()),
+            (b"x-profiled-status", str(start_message.get("status", 500)).encode()),
+            (b"x-profile-samples", str(sum(sampler.samples.values())).encode()),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": folded})
@@ -1,19 +1,224 @@
-from fastapi import Request, HTTPException
-from ..utils.redis import redis_client
+import json
+import math
 import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ..auth import username_from_authorization
+from ..config import current_config
+from ..utils.debug import debug
+from ..utils.metrics import rate_limit_total
+from ..utils.redis import redis_client
+
+rate_limit_config = current_config.get("rate_limit", {})
+
+# Token bucket, refilled lazily. One round trip and atomic, so concurrent
+# workers can neither undercount nor extend each other's window.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_ms = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_ms = math.ceil((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 1000)
+return {allowed, math.floor(tokens), retry_ms}
+"""
+
+
+@dataclass
+class Budget:
+    name: str
+    rate: float  # tokens per millisecond
+    burst: int
+    per_user: bool
+
+    @classmethod
+    def from_config(cls, name: str, cfg: dict) -> "Budget":
+        requests = cfg.get("requests", 100)
+        return cls(
+            name=name,
+            rate=requests / (cfg.get("per_seconds", 60) * 1000),
+            burst=cfg.get("burst", requests),
+            per_user=cfg.get("per_user", True),
+        )
+
+
+class LocalTokenBuckets:
+    """In-process fallback with the same algorithm as TOKEN_BUCKET_LUA.
+
+    Only approximate: each worker keeps its own buckets, so the budget is
+    divided by ``workers`` to keep the fleet-wide rate near the target.
+    """
+
+    def __init__(self, workers: int, max_keys: int = 100_000):
+        self.workers = max(1, workers)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(
+        self, key: str, budget: Budget, now_ms: int, cost: int = 1
+    ) -> Tuple[bool, int, int]:
+        rate, burst = budget.rate / self.workers, max(1, budget.burst // self.workers)
+        tokens, ts = self._buckets.pop(key, (burst, now_ms))
+        tokens = min(burst, tokens + max(0, now_ms - ts) * rate)
+        if tokens >= cost:
+            allowed, retry_ms, tokens = True, 0, tokens - cost
+        else:
+            allowed, retry_ms = False, math.ceil((cost - tokens) / rate)
+        self._buckets[key] = (tokens, now_ms)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, int(tokens), retry_ms
+
+
+class RateLimiter:
+    """Per-route, per-user token buckets kept in Redis.
+
+    Routes are matched by longest configured path prefix; anything else uses
+    the ``default`` budget. Authenticated requests are counted per user
+    (the token is verified, or found in the local token cache, so a forged
+    ``sub`` cannot drain someone else's budget), anonymous ones per client IP.
+    When Redis errors the limiter switches to LocalTokenBuckets and retries
+    Redis after ``redis_retry_seconds``.
+    """
+
+    REDIS_RETRY_SECONDS = rate_limit_config.get("redis_retry_seconds", 5)
+
+    def __init__(self, config: dict):
+        self.default = Budget.from_config("default", config.get("default", {}))
+        routes = config.get("routes", {})
+        self.routes: List[Tuple[str, Budget]] = sorted(
+            (
+                (prefix, Budget.from_config(prefix, cfg))
+                for prefix, cfg in routes.items()
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+        self.exempt = tuple(
+            config.get("exempt", ["/metrics", "/docs", "/openapi.json"])
+        )
+        self.local = LocalTokenBuckets(config.get("workers", 1))
+        self._script = None
+        self._redis_down_until = 0.0
+
+    def budget_for(self, path: str) -> Optional[Budget]:
+        if path.startswith(self.exempt):
+            return None
+        for prefix, budget in self.routes:
+            if path.startswith(prefix):
+                return budget
+        return self.default
+
+    @staticmethod
+    def identity(authorization: Optional[str], client_host: str) -> str:
+        username = username_from_authorization(authorization)
+        return f"user:{username}" if username else f"ip:{client_host}"
+
+    def _redis_take(
+        self, key: str, budget: Budget, now_ms: int
+    ) -> Tuple[bool, int, int]:
+        if self._script is None:
+            # 短超时的连接: Redis 无响应时抛出异常, 走本地令牌桶, 不阻塞事件循环
+            self._script = redis_client.fast_client.register_script(TOKEN_BUCKET_LUA)
+        allowed, remaining, retry_ms = self._script(
+            keys=[redis_client._get_key(key)],
+            args=[budget.rate, budget.burst, now_ms, 1],
+        )
+        return bool(allowed), int(remaining), int(retry_ms)
+
+    def check(self, budget: Budget, identity: str) -> Tuple[bool, int, int]:
+        """Returns (allowed, remaining, retry_after_ms)."""
+        key = f"rl:{budget.name}:{identity if budget.per_user else 'all'}"
+        now = time.time()
+        now_ms = int(now * 1000)
+        if redis_client.enabled and now >= self._redis_down_until:
+            try:
+                result = self._redis_take(key, budget, now_ms)
+                rate_limit_total.labels(
+                    route=budget.name,
+                    result="allowed" if result[0] else "limited",
+                    backend="redis",
+                ).inc()
+                return result
+            except Exception as e:
+                debug.error("Rate limiter falling back to local buckets: %s", e)
+                self._redis_down_until = now + self.REDIS_RETRY_SECONDS
+        result = self.local.take(key, budget, now_ms)
+        rate_limit_total.labels(
+            route=budget.name,
+            result="allowed" if result[0] else "limited",
+            backend="local",
+        ).inc()
+        return result
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware answering 429 with Retry-After when a budget is spent."""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or RateLimiter(rate_limit_config)
 
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        budget = self.limiter.budget_for(scope["path"])
+        if budget is None:
+            return await self.app(scope, receive, send)
 
-async def rate_limit_middleware(request: Request, call_next):
-    client_ip = request.client.host
-    key = f"rate_limit:{client_ip}"
+        headers: Dict[bytes, bytes] = dict(scope["headers"])
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        client = scope.get("client")
+        identity = self.limiter.identity(
+            authorization, client[0] if client else "unknown"
+        )
+        allowed, remaining, retry_ms = self.limiter.check(budget, identity)
 
-    # 获取当前请求次数
-    current = redis_client.get(key) or 0
-    if int(current) >= 100:  # 每分钟最多100次请求
-        raise HTTPException(status_code=429, detail="Too many requests")
+        if not allowed:
+            body = json.dumps({"detail": "Too many requests"}).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        (
+                            b"retry-after",
+                            str(max(1, math.ceil(retry_ms / 1000))).encode(),
+                        ),
+                        (b"x-ratelimit-limit", str(budget.burst).encode()),
+                        (b"x-ratelimit-remaining", b"0"),
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
 
-    # 更新请求次数
-    redis_client.set(key, int(current) + 1, ttl=60)
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"x-ratelimit-limit", str(budget.burst).encode()),
+                        (b"x-ratelimit-remaining", str(remaining).encode()),
+                    ],
+                }
+            await send(message)
 
-    response = await call_next(request)
-    return response
+        await self.app(scope, receive, send_with_headers)
@@ -1,8 +1,36 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Float,
+    Boolean,
+    Index,
+    func,
+    literal_column,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
 from .database import Base
 import datetime
 
 
+def normalized_fingerprint(column):
+    """SQL counterpart of ``normalize_fingerprint``.
+
+    Whitespace and colons are removed and the result upper-cased. The
+    arguments are inlined literals so ON CONFLICT can match the unique
+    index expression.
+    """
+    return func.upper(
+        func.regexp_replace(
+            column,
+            literal_column("'[[:space:]:]'"),
+            literal_column("''"),
+            literal_column("'g'"),
+        )
+    )
+
+
 class KeyInfo(Base):
     __tablename__ = "key_infos"
 
@@ -16,6 +44,53 @@ class KeyInfo(Base):
     score = Column(Float)
     unique_letters_count = Column(Integer)
 
+    __table_args__ = (
+        # 键集分页索引: (created_at, id) 和 (score, id)
+        Index("ix_key_infos_created_at_id", "created_at", "id"),
+        Index("ix_key_infos_score_id", "score", "id"),
+        # 指纹子串搜索: pg_trgm GIN 索引, 查询须使用相同的 upper(fingerprint) 表达式
+        Index(
+            "ix_key_infos_fingerprint_trgm",
+            func.upper(fingerprint).label("fingerprint_upper"),
+            postgresql_using="gin",
+            postgresql_ops={"fingerprint_upper": "gin_trgm_ops"},
+        ),
+        # 入库去重: 规范化指纹唯一 (与入库时的 normalize_fingerprint 相同), 配合 ON CONFLICT DO NOTHING 使用
+        Index(
+            "ux_key_infos_fingerprint_normalized",
+            normalized_fingerprint(fingerprint),
+            unique=True,
+        ),
+    )
+
+
+class KeyInfoRollup(Base):
+    __tablename__ = "key_info_rollups"
+
+    # 保留任务折叠的低分旧 key, 按本地小时 + 行内最小 id 为键; 每批插入一行, 每轮结束时同一小时合并为一行.
+    # 聚合列可跨行相加 (max 取最大), 只需计数/合计的统计直接读取;
+    # 各数组按同一顺序每个 key 一个元素, 需要精确分位数时展开. id 与指纹只保存在归档文件中
+    hour = Column(DateTime, primary_key=True)
+    first_id = Column(Integer, primary_key=True)
+    key_count = Column(Integer, nullable=False)
+    score_count = Column(Integer, nullable=False)
+    score_sum = Column(Float, nullable=False)
+    score_max = Column(Float)
+    created_at = Column(ARRAY(DateTime), nullable=False)
+    repeat_letter_score = Column(ARRAY(Float), nullable=False)
+    increasing_letter_score = Column(ARRAY(Float), nullable=False)
+    decreasing_letter_score = Column(ARRAY(Float), nullable=False)
+    magic_letter_score = Column(ARRAY(Float), nullable=False)
+    score = Column(ARRAY(Float), nullable=False)
+    unique_letters_count = Column(ARRAY(Integer), nullable=False)
+
+
+class ArchivedFingerprint(Base):
+    __tablename__ = "archived_fingerprints"
+
+    # 已归档 key 的规范化指纹 (normalize_fingerprint), 入库去重时与 key_infos 一起检查
+    fingerprint = Column(String, primary_key=True)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -2,3 +2,4 @@ from . import auth
 from . import users
 from . import keys
 from . import statistics
+from . import stream
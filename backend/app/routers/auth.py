@@ -8,9 +8,12 @@ from ..auth import (
     Token,
     create_access_token,
     authenticate_user,
-    get_password_hash,
+    oauth2_scheme,
+    revoke_token,
+    user_claims,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
+from ..utils.hashing import password_hasher, PasswordHasherBusyError
 from datetime import timedelta
 from pydantic import BaseModel
 import uuid
@@ -29,7 +32,14 @@ class RegisterUser(BaseModel):
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
 ):
-    user = await authenticate_user(db, form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(db, form_data.username, form_data.password)
+    except PasswordHasherBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Login service busy, please retry",
+            headers={"Retry-After": "1"},
+        )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,12 +48,19 @@ async def login_for_access_token(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=user_claims(user), expires_delta=access_token_expires
     )
-    debug.log(f"Generated token for user {user.username}")
+    debug.log("Generated token for user %s", user.username)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme)):
+    # 撤销当前令牌并广播到所有 worker
+    revoke_token(token)
+    return {"message": "Logged out"}
+
+
 @router.post("/register")
 async def register(user_data: RegisterUser, db: AsyncSession = Depends(get_db)):
     # 检查用户名是否已存在
@@ -63,11 +80,19 @@ async def register(user_data: RegisterUser, db: AsyncSession = Depends(get_db)):
         )
 
     # 创建新用户
+    try:
+        hashed_password = await password_hasher.hash(user_data.password)
+    except PasswordHasherBusyError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Registration service busy, please retry",
+            headers={"Retry-After": "1"},
+        )
     user = User(
         id=str(uuid.uuid4()),
         username=user_data.username,
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=hashed_password,
     )
 
     db.add(user)
@@ -1,19 +1,34 @@
-from fastapi import APIRouter, Depends
-from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..auth import User as UserSchema, get_current_active_user
-from ..services.key_analyzer import KeyAnalyzer
+from ..services.key_analyzer import KeyAnalyzer, InvalidCursorError, TimeRange
+from ..services.key_exporter import KeyExporter, ExportFormatError
+from ..services.fingerprint_index import InvalidPatternError
+from ..services.key_ingestor import KeyIn, KeyIngestor
+from ..utils.bulkhead import BulkheadFullError, bulkheads, estimate_cost, guard_stream
 
 router = APIRouter(prefix="/keys", tags=["keys"])
 
 
+@router.post("")
+async def ingest_keys(
+    keys: List[KeyIn],
+    current_user: UserSchema = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db),
+):
+    ingestor = KeyIngestor(db)
+    return await ingestor.ingest(keys)
+
+
 @router.get("/recent")
 async def get_recent_keys(
     current_user: UserSchema = Depends(get_current_active_user),
     start: Optional[int] = None,
     end: Optional[int] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     analyzer = KeyAnalyzer(db)
     return await analyzer.get_recent_keys(start_time=start, end_time=end)
@@ -24,7 +39,94 @@ async def get_high_score_keys(
     current_user: UserSchema = Depends(get_current_active_user),
     start: Optional[int] = None,
     end: Optional[int] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     analyzer = KeyAnalyzer(db)
     return await analyzer.get_high_score_keys(start_time=start, end_time=end)
+
+
+@router.get("/recent/page")
+async def get_recent_keys_page(
+    current_user: UserSchema = Depends(get_current_active_user),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    analyzer = KeyAnalyzer(db)
+    try:
+        return await analyzer.get_recent_keys_page(
+            cursor=cursor, limit=limit, start_time=start, end_time=end
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/high-score/page")
+async def get_high_score_keys_page(
+    current_user: UserSchema = Depends(get_current_active_user),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    analyzer = KeyAnalyzer(db)
+    try:
+        return await analyzer.get_high_score_keys_page(
+            cursor=cursor, limit=limit, start_time=start, end_time=end
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/search")
+async def search_keys(
+    pattern: str,
+    current_user: UserSchema = Depends(get_current_active_user),
+    mode: str = Query("contains", pattern="^(contains|suffix|regex)$"),
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_read_db),
+):
+    analyzer = KeyAnalyzer(db)
+    try:
+        async with bulkheads["search"].admit():
+            return await analyzer.search_fingerprints(pattern, mode=mode, limit=limit)
+    except InvalidPatternError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except BulkheadFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+@router.get("/export")
+async def export_keys(
+    current_user: UserSchema = Depends(get_current_active_user),
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    format: str = "csv",
+):
+    time_range = TimeRange.from_timestamps(start, end)
+    try:
+        exporter = KeyExporter(format, time_range)
+    except ExportFormatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    # 导出期间一直占用配额, 直到流结束或客户端断开
+    bulkhead = bulkheads["export"]
+    try:
+        release = await bulkhead.acquire(estimate_cost(bulkhead, time_range.seconds()))
+    except BulkheadFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return StreamingResponse(
+        await guard_stream(release, exporter.stream()),
+        media_type=exporter.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{exporter.filename}"'},
+    )
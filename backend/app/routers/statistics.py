@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends
-from typing import Optional
+import math
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from ..database import get_db
+from ..database import get_read_db
 from ..auth import User as UserSchema, get_current_active_user
 from ..services.key_analyzer import KeyAnalyzer
+from ..utils.bulkhead import BulkheadFullError
 
 router = APIRouter(tags=["statistics"])
 
@@ -13,7 +15,62 @@ async def get_statistics(
     current_user: UserSchema = Depends(get_current_active_user),
     start: Optional[int] = None,
     end: Optional[int] = None,
-    db: AsyncSession = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=3, le=10000),
+    threshold: float = Query(
+        KeyAnalyzer.HIGH_SCORE_THRESHOLD,
+        allow_inf_nan=False,
+        description="Keys scoring above this qualify",
+    ),
+    db: AsyncSession = Depends(get_read_db),
 ):
     analyzer = KeyAnalyzer(db)
-    return await analyzer.get_statistics(start_time=start, end_time=end)
+    try:
+        return await analyzer.get_statistics(
+            start_time=start, end_time=end, max_points=max_points, threshold=threshold
+        )
+    except BulkheadFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+@router.get("/statistics/thresholds")
+async def get_threshold_sweep(
+    current_user: UserSchema = Depends(get_current_active_user),
+    start: Optional[int] = None,
+    end: Optional[int] = None,
+    thresholds: Optional[List[float]] = Query(
+        None, description="Repeat the parameter for each threshold"
+    ),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # 必填的列表参数缺失时 FastAPI 0.104 生成 422 会出错, 这里自行检查
+    if not thresholds:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="At least one threshold is required",
+        )
+    if len(thresholds) > KeyAnalyzer.MAX_SWEEP_THRESHOLDS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {KeyAnalyzer.MAX_SWEEP_THRESHOLDS} thresholds per request",
+        )
+    # 列表元素不受 allow_inf_nan 约束, 非有限值单独拒绝
+    if not all(math.isfinite(threshold) for threshold in thresholds):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Thresholds must be finite numbers",
+        )
+    analyzer = KeyAnalyzer(db)
+    try:
+        return await analyzer.get_threshold_sweep(
+            thresholds, start_time=start, end_time=end
+        )
+    except BulkheadFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
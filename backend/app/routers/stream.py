@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from ..auth import User as UserSchema, get_current_active_user
+from ..services.dashboard_stream import StreamUnavailable, dashboard_broadcaster
+
+router = APIRouter(prefix="/stream", tags=["stream"])
+
+
+@router.get("/dashboard")
+async def dashboard_stream(
+    current_user: UserSchema = Depends(get_current_active_user),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-Sent Events with today's dashboard deltas as keys are ingested."""
+    try:
+        frames = dashboard_broadcaster.stream(
+            int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+        )
+    except StreamUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "30"},
+        )
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        # 禁止代理缓冲, 否则事件会积攒到缓冲区满才发出
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -7,5 +7,5 @@ router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/me", response_model=UserSchema)
 async def read_users_me(current_user: UserSchema = Depends(get_current_active_user)):
-    debug.log(f"Getting user info for: {current_user.username}")
+    debug.log("Getting user info for: %s", current_user.username)
     return current_user
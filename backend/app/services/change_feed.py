@@ -0,0 +1,387 @@
+import asyncio
+import json
+import math
+import time
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, List, Optional, Tuple
+
+import asyncpg
+
+from ..config import current_config
+from ..database import REPLICA_MAX_LAG_SECONDS, db_config, replica_router
+from ..utils.debug import debug
+from ..utils.metrics import (
+    cache_invalidations_total,
+    change_feed_events_total,
+    change_feed_live,
+)
+from ..utils.redis import redis_client
+
+change_feed_config = current_config.get("change_feed", {})
+
+EPOCH = datetime(1970, 1, 1)
+HOUR = 3600
+
+
+def epoch_seconds(value: datetime) -> float:
+    """Seconds of a naive local time, counted the way the trigger counts its hours."""
+    return (value - EPOCH) / timedelta(seconds=1)
+
+
+class Change:
+    """One committed statement on ``key_infos``, as announced by the trigger.
+
+    ``intervals`` are the merged ``[start, end)`` spans, in epoch seconds of
+    local time, of the hours holding the rows the statement touched. Rows
+    without created_at only affect open ranges, which every change affects.
+    A truncate, and the resync after (re)connecting, affect everything.
+    ``max_id`` is the highest id an insert added; a delete carries the
+    lowest and highest id it removed as ``min_id`` and ``max_id``.
+    """
+
+    def __init__(
+        self,
+        op: str,
+        intervals: List[Tuple[float, float]],
+        max_id: Optional[int] = None,
+        min_id: Optional[int] = None,
+    ):
+        self.op = op
+        self.intervals = intervals
+        self.max_id = max_id
+        self.min_id = min_id
+        self._starts = [start for start, _ in intervals]
+
+    @property
+    def everything(self) -> bool:
+        return self.op in ("truncate", "resync")
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "Change":
+        data = json.loads(payload)
+        if "from" in data:
+            intervals = [(data["from"], data["to"] + HOUR)]
+        else:
+            intervals = []
+            for hour in data.get("hours", ()):
+                if intervals and intervals[-1][1] == hour:
+                    intervals[-1] = (intervals[-1][0], hour + HOUR)
+                else:
+                    intervals.append((hour, hour + HOUR))
+        return cls(data["op"], intervals, data.get("max_id"), data.get("min_id"))
+
+    def overlaps(self, start: Optional[float], end: Optional[float]) -> bool:
+        """Whether rows in ``[start, end]`` may have changed; None is unbounded."""
+        if self.everything or start is None or end is None:
+            return True
+        # 最后一个起点不晚于 end 的区间, 若其终点在 start 之后则相交
+        index = bisect_right(self._starts, end) - 1
+        return index >= 0 and self.intervals[index][1] > start
+
+    @property
+    def first(self) -> float:
+        return self.intervals[0][0] if self.intervals else math.inf
+
+
+class ChangeFeed:
+    """Listens for ``key_infos`` changes and keeps cached ranges exact.
+
+    The triggers from migration 0002 NOTIFY ``key_infos_changes`` once per
+    committed statement. Every worker holds one dedicated asyncpg
+    connection outside the pool that LISTENs on the channel. Notifications
+    that arrive together are handled as one batch:
+
+    * cached ``statistics`` / ``recent_keys`` / ``high_score_keys`` entries
+      whose range overlaps a changed hour are deleted. Each entry is
+      registered in a Redis sorted set scored by the end of its range, so
+      only entries ending after the earliest changed hour are looked at;
+    * subscribers (hot window, fingerprint index, snapshots) are told, and
+      pick up new rows at once instead of polling.
+
+    Since changes are precise while the feed is live, entries are cached for
+    ``cache_ttl`` seconds; otherwise the caller's short TTL applies. Changes
+    made while the listener was not connected cannot be known, so all
+    registered entries are dropped when it connects and when it loses the
+    connection. A computation that started before a change to its range
+    does not cache its result (``position`` / ``store``).
+    """
+
+    CHANNEL = "key_infos_changes"
+    INDEX_KEY = "cache_ranges"
+    CACHE_TTL = change_feed_config.get("cache_ttl", 21600)
+    HEARTBEAT_INTERVAL = change_feed_config.get("heartbeat_interval", 30)
+    RECONNECT_INTERVAL = change_feed_config.get("reconnect_interval", 5)
+    # 仍保留轮询作兜底, 只是间隔拉长
+    FALLBACK_POLL_INTERVAL = change_feed_config.get("fallback_poll_interval", 300)
+    HISTORY = 1024
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.live = False
+        self._subscribers: List[Callable[[List[Change]], None]] = []
+        self._pending: List[Change] = []
+        self._wake = asyncio.Event()
+        self._sequence = 0
+        self._pruned_at = time.monotonic()
+        self._history: Deque[Tuple[int, float, Change]] = deque(maxlen=self.HISTORY)
+
+    def subscribe(self, callback: Callable[[List[Change]], None]):
+        """``callback(changes)`` runs on the event loop for every batch.
+
+        It must not block.
+        """
+        self._subscribers.append(callback)
+
+    def poll_interval(self, interval: float) -> float:
+        return max(interval, self.FALLBACK_POLL_INTERVAL) if self.live else interval
+
+    # ---- 缓存登记与失效 ----
+
+    def position(self) -> int:
+        """Taken before computing a value to cache; see ``store``."""
+        return self._sequence
+
+    def changed_since(
+        self, position: int, start: Optional[datetime], end: Optional[datetime]
+    ) -> bool:
+        if position == self._sequence:
+            return False
+        if not self._history or self._history[0][0] > position + 1:
+            # 早于保留的历史: 保守地视为已变化
+            return True
+        start_s = epoch_seconds(start) if start is not None else None
+        end_s = epoch_seconds(end) if end is not None else None
+        return any(
+            change.overlaps(start_s, end_s)
+            for sequence, _, change in self._history
+            if sequence > position
+        )
+
+    def stale(
+        self, position: int, start: Optional[datetime], end: Optional[datetime]
+    ) -> bool:
+        """Whether a value computed at ``position`` may already be out of date.
+
+        The value was computed from the keys in ``[start, end]``.
+        """
+        return self.changed_since(position, start, end) or self._settling(start, end)
+
+    def _settling(self, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        # 通知来自主库, 只读副本可能还没回放到这次变化
+        if not replica_router.replicas:
+            return False
+        since = time.monotonic() - REPLICA_MAX_LAG_SECONDS
+        start_s = epoch_seconds(start) if start is not None else None
+        end_s = epoch_seconds(end) if end is not None else None
+        return any(
+            change.overlaps(start_s, end_s)
+            for _, arrived, change in reversed(self._history)
+            if arrived >= since
+        )
+
+    def store(
+        self,
+        cache_key: str,
+        value,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        position: int,
+        ttl: int,
+    ) -> bool:
+        """Caches ``value`` computed from the rows of ``[start, end]``.
+
+        ``ttl`` is used while the feed is not live. Nothing is cached when a
+        change to the range arrived after ``position``: the value may
+        predate it, and its invalidation has already run. A value that a
+        read replica may have computed without a change from the last
+        ``replica_max_lag_seconds`` is kept only that long.
+        """
+        if self.changed_since(position, start, end):
+            debug.sample(
+                "cache_set", "Not caching %s: range changed while computing", cache_key
+            )
+            return False
+        if not self.live:
+            return redis_client.set(cache_key, value, ttl=ttl)
+        if self._settling(start, end):
+            return redis_client.set(
+                cache_key, value, ttl=max(1, math.ceil(REPLICA_MAX_LAG_SECONDS))
+            )
+        member = f"{'-inf' if start is None else int(epoch_seconds(start))}|{cache_key}"
+        score = "+inf" if start is None or end is None else epoch_seconds(end)
+        try:
+            # 先登记再写入: 未登记的条目无法被精确失效, 不能带着长 TTL 写入
+            redis_client.client.zadd(
+                redis_client._get_key(self.INDEX_KEY), {member: score}
+            )
+        except Exception as e:
+            debug.error("Cache range index update failed: %s", e)
+            return False
+        return redis_client.set(cache_key, value, ttl=self.CACHE_TTL)
+
+    def _invalidate(self, changes: List[Change]) -> int:
+        """Deletes registered entries overlapping ``changes``.
+
+        Blocking; run it in a thread.
+        """
+        if not redis_client.enabled:
+            return 0
+        client = redis_client.client
+        index = redis_client._get_key(self.INDEX_KEY)
+        if any(change.everything for change in changes):
+            stale = client.zrange(index, 0, -1)
+        else:
+            # 终点早于最早变化小时的条目不受影响; 开放区间的分值为 +inf, 总会被取到
+            first = min(change.first for change in changes)
+            stale = []
+            for member, score in client.zrangebyscore(
+                index, first, "+inf", withscores=True
+            ):
+                start = member.split("|", 1)[0]
+                start = None if start == "-inf" else float(start)
+                end = None if score == math.inf else score
+                if any(change.overlaps(start, end) for change in changes):
+                    stale.append(member)
+        for offset in range(0, len(stale), 1000):
+            chunk = stale[offset : offset + 1000]
+            pipe = client.pipeline(transaction=False)
+            pipe.delete(
+                *(redis_client._get_key(member.split("|", 1)[1]) for member in chunk)
+            )
+            pipe.zrem(index, *chunk)
+            pipe.execute()
+        return len(stale)
+
+    def _prune(self) -> int:
+        """Drops index members whose entry has expired; blocking, run it in a thread."""
+        client = redis_client.client
+        index = redis_client._get_key(self.INDEX_KEY)
+        members = [member for member, _ in client.zscan_iter(index, count=1000)]
+        expired = []
+        for offset in range(0, len(members), 1000):
+            chunk = members[offset : offset + 1000]
+            pipe = client.pipeline(transaction=False)
+            for member in chunk:
+                pipe.exists(redis_client._get_key(member.split("|", 1)[1]))
+            expired += [
+                member for member, exists in zip(chunk, pipe.execute()) if not exists
+            ]
+        for offset in range(0, len(expired), 1000):
+            client.zrem(index, *expired[offset : offset + 1000])
+        return len(expired)
+
+    async def _apply(self, changes: List[Change]):
+        for change in changes:
+            self._sequence += 1
+            self._history.append((self._sequence, time.monotonic(), change))
+            change_feed_events_total.labels(op=change.op).inc()
+        for callback in self._subscribers:
+            try:
+                callback(changes)
+            except Exception as e:
+                debug.error(
+                    "Change feed subscriber %s failed: %s",
+                    getattr(callback, "__qualname__", callback),
+                    e,
+                )
+        started = time.perf_counter()
+        try:
+            removed = await asyncio.to_thread(self._invalidate, changes)
+        except Exception as e:
+            # Redis 不可用时条目会带着长 TTL 留下: 立即按失联处理, 重连后全部作废
+            raise ConnectionError(f"cache invalidation failed: {e}") from e
+        if removed:
+            cache_invalidations_total.inc(removed)
+            debug.sample(
+                "cache_invalidate",
+                "Invalidated %d cached ranges for %d changes in %.1fms",
+                removed,
+                len(changes),
+                (time.perf_counter() - started) * 1000,
+            )
+
+    # ---- 监听 ----
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        try:
+            self._pending.append(Change.from_payload(payload))
+        except (ValueError, KeyError, TypeError) as e:
+            debug.error("Malformed change notification %.200s: %s", payload, e)
+            self._pending.append(Change("resync", []))
+        self._wake.set()
+
+    def _on_terminate(self, connection):
+        self._wake.set()
+
+    async def _resync(self):
+        # 断线期间的变化无从得知: 已登记的缓存全部作废, 订阅者各自追平
+        await self._apply([Change("resync", [])])
+
+    async def _listen(self):
+        connection = await asyncpg.connect(
+            host=db_config["host"],
+            port=db_config["port"],
+            user=db_config["username"],
+            password=db_config["password"],
+            database=db_config["database"],
+            server_settings={"application_name": "key-analysis-change-feed"},
+        )
+        try:
+            connection.add_termination_listener(self._on_terminate)
+            await connection.add_listener(self.CHANNEL, self._on_notify)
+            await self._resync()
+            self.live = True
+            change_feed_live.set(1)
+            debug.log("Change feed listening on %s", self.CHANNEL)
+            while True:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    # 空闲时探测连接, 半开的 TCP 连接不会触发 termination 回调
+                    await connection.fetchval(
+                        "SELECT 1", timeout=self.HEARTBEAT_INTERVAL
+                    )
+                self._wake.clear()
+                if connection.is_closed():
+                    raise ConnectionError("listener connection closed")
+                changes, self._pending = self._pending, []
+                if changes:
+                    await self._apply(changes)
+                if (
+                    redis_client.enabled
+                    and time.monotonic() - self._pruned_at > self.PRUNE_INTERVAL
+                ):
+                    # 过期条目不会通知索引, 定期清理
+                    self._pruned_at = time.monotonic()
+                    await asyncio.to_thread(self._prune)
+        finally:
+            self.live = False
+            change_feed_live.set(0)
+            if not connection.is_closed():
+                await connection.close(timeout=5)
+
+    async def run(self):
+        """Background task: LISTEN on a dedicated connection.
+
+        Reconnects on failure.
+        """
+        while True:
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Change feed listener lost: %s", e)
+            try:
+                await self._resync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Change feed resync failed: %s", e)
+            await asyncio.sleep(self.RECONNECT_INTERVAL)
+
+
+change_feed = ChangeFeed(enabled=change_feed_config.get("enabled", True))
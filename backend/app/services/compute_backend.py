@@ -0,0 +1,543 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import pytz
+
+from ..config import current_config
+from ..utils.debug import debug
+from ..utils.lazy import np, pd, pl
+
+analytics_config = current_config.get("analytics", {})
+
+LOCAL_TZ = pytz.timezone("Asia/Shanghai")
+
+# 默认合格线: score 严格大于该值的 key 计为合格
+QUALIFIED_THRESHOLD = 400
+
+# Columns of the frames built from KeyInfo rows, in order
+FRAME_COLUMNS = (
+    "id",
+    "created_at",
+    "fingerprint",
+    "repeat_letter_score",
+    "increasing_letter_score",
+    "decreasing_letter_score",
+    "magic_letter_score",
+    "score",
+    "unique_letters_count",
+)
+
+
+def lttb(values: Sequence[float], max_points: int):
+    """Positions of the points Largest-Triangle-Three-Buckets keeps out of ``values``.
+
+    Trend points are evenly spaced, so a point's position is its x. The
+    first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the point kept before it
+    and the average of the next bucket.
+    """
+    y = np.asarray(values, dtype="float64")
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, max_points - 1).astype("int64")
+    kept = np.empty(max_points, dtype="int64")
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = (end + next_end - 1) / 2
+        next_y = y[end:next_end].mean()
+        x = np.arange(start, end)
+        area = np.abs(
+            (previous - next_x) * (y[start:end] - y[previous])
+            - (previous - x) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+
+TREND_SERIES = ("avg_scores", "max_scores", "counts")
+
+
+def downsample_trends(
+    trends: Dict[str, Any], max_points: Optional[int]
+) -> Dict[str, Any]:
+    """``trends`` with every series longer than ``max_points`` reduced by LTTB.
+
+    Each series is reduced on its own, so they may keep different points.
+    Applied to the full, cached trends when a response is built, so one
+    cache entry serves every ``max_points``.
+    """
+    if max_points is None:
+        return trends
+    result = dict(trends)
+    for name in TREND_SERIES:
+        series = trends[name]
+        if len(series["values"]) > max_points:
+            kept = lttb(series["values"], max_points).tolist()
+            result[name] = {
+                "times": [series["times"][i] for i in kept],
+                "values": [series["values"][i] for i in kept],
+            }
+    return result
+
+
+class StatisticsCalculator:
+    NUMERIC_COLUMNS = [
+        "repeat_letter_score",
+        "increasing_letter_score",
+        "decreasing_letter_score",
+        "magic_letter_score",
+        "score",
+        "unique_letters_count",
+    ]
+
+    SCORE_COLUMNS = [
+        "repeat_letter_score",
+        "increasing_letter_score",
+        "decreasing_letter_score",
+        "magic_letter_score",
+    ]
+
+    @staticmethod
+    def safe_calc(series: pd.Series, func: callable, default: float = 0.0) -> float:
+        try:
+            result = func(series)
+            return default if pd.isna(result) or np.isinf(result) else float(result)
+        except:
+            return default
+
+    @staticmethod
+    def calculate_trend(current: float, previous: float) -> float:
+        if previous == 0:
+            return 0 if current == 0 else 1
+        try:
+            trend = (current - previous) / previous
+            if pd.isna(trend) or np.isinf(trend):
+                return 0.0
+            return max(min(float(trend), 10.0), -10.0)
+        except:
+            return 0.0
+
+    @classmethod
+    def get_score_distribution(
+        cls, df: pd.DataFrame, threshold: float = QUALIFIED_THRESHOLD
+    ) -> Dict:
+        scores = df["score"].values
+        hist, bins = np.histogram(scores, bins=20)
+
+        stats = {
+            "mean": cls.safe_calc(scores, np.mean),
+            "median": cls.safe_calc(scores, np.median),
+            "std": cls.safe_calc(scores, np.std),
+            "min": cls.safe_calc(scores, np.min),
+            "max": cls.safe_calc(scores, np.max),
+            "q1": cls.safe_calc(scores, lambda x: np.percentile(x, 25)),
+            "q3": cls.safe_calc(scores, lambda x: np.percentile(x, 75)),
+        }
+
+        return {
+            "histogram": hist.tolist(),
+            "bins": bins.tolist(),
+            **stats,
+            "total_count": len(scores),
+            "qualified_count": int(np.sum(scores > threshold)),
+        }
+
+    @classmethod
+    def get_correlation_matrix(cls, df: pd.DataFrame) -> Dict:
+        corr_matrix = df.fillna(0).corr().round(3)
+        corr_matrix = corr_matrix.replace([np.inf, -np.inf], 0).fillna(0)
+        return corr_matrix.to_dict()
+
+    @classmethod
+    def get_score_types_stats(cls, df: pd.DataFrame) -> Dict:
+        stats = df[cls.SCORE_COLUMNS].fillna(0).describe()
+        return stats.replace([np.inf, -np.inf], 0).fillna(0).to_dict()
+
+
+def _finite(value: Any, default: float = 0.0) -> float:
+    if value is None:
+        return default
+    value = float(value)
+    return (
+        default if value != value or value in (float("inf"), float("-inf")) else value
+    )
+
+
+class ComputeBackend:
+    """The statistics steps of KeyAnalyzer over one dataframe library.
+
+    A backend builds its own frame from KeyInfo columns (``frame``) and
+    every other method takes such a frame. Outputs are plain JSON-ready
+    dicts and must match the pandas backend, which is the reference
+    (see benchmarks/check_backend_parity.py).
+    """
+
+    name = "base"
+
+    def frame(self, columns: Dict[str, Sequence]) -> Any:
+        raise NotImplementedError
+
+    def from_arrow(self, table) -> Any:
+        """Frame from a pyarrow Table with (a subset of) FRAME_COLUMNS."""
+        raise NotImplementedError
+
+    def concat(self, frames: List[Any]) -> Any:
+        raise NotImplementedError
+
+    def empty_like(self, frame: Any) -> Any:
+        raise NotImplementedError
+
+    def score_summary(self, frame: Any, threshold: float) -> Dict[str, float]:
+        """mean, max, count and qualified_rate of ``score``."""
+        raise NotImplementedError
+
+    def score_distribution(
+        self, frame: Any, threshold: float = QUALIFIED_THRESHOLD
+    ) -> Dict:
+        raise NotImplementedError
+
+    def correlation_matrix(self, frame: Any) -> Dict:
+        raise NotImplementedError
+
+    def score_types_stats(self, frame: Any) -> Dict:
+        raise NotImplementedError
+
+    def trends(self, frame: Any, time_range) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _frequency(start: datetime, end: datetime) -> str:
+        days = (end - start).days
+        return "D" if days > 30 else "6h" if days > 7 else "h"
+
+    @staticmethod
+    def _range_bounds(time_range) -> tuple:
+        # 有区间时按区间宽度 (取整到小时) 选择粒度
+        return (
+            time_range.start.replace(minute=0, second=0, microsecond=0),
+            time_range.end.replace(minute=0, second=0, microsecond=0),
+        )
+
+    @staticmethod
+    def _format_trends(
+        freq: str, times: List, means: List, maxes: List, counts: List
+    ) -> Dict[str, Any]:
+        # 每个序列是并行的 times / values 数组, 比逐点的 {time, value} 小得多
+        time_format = "%Y-%m-%d %H:%M" if freq in ["h", "6h"] else "%Y-%m-%d"
+        labels = [value.strftime(time_format) for value in times]
+        return {
+            "time_format": "YYYY-MM-DD HH:mm" if freq in ["h", "6h"] else "YYYY-MM-DD",
+            "avg_scores": {
+                "times": labels,
+                "values": [round(float(value), 2) for value in means],
+            },
+            "max_scores": {
+                "times": labels,
+                "values": [round(float(value), 2) for value in maxes],
+            },
+            "counts": {"times": labels, "values": [int(value) for value in counts]},
+        }
+
+    @staticmethod
+    def _empty_trends() -> Dict[str, Any]:
+        return {
+            "time_format": "YYYY-MM-DD HH:mm",
+            "avg_scores": {"times": [], "values": []},
+            "max_scores": {"times": [], "values": []},
+            "counts": {"times": [], "values": []},
+        }
+
+
+class PandasBackend(ComputeBackend):
+    name = "pandas"
+
+    def frame(self, columns: Dict[str, Sequence]) -> pd.DataFrame:
+        return pd.DataFrame(columns)
+
+    def from_arrow(self, table) -> pd.DataFrame:
+        # 与 Postgres 行构建的帧保持 datetime64[ns], 混合精度在 pandas 2.1 中无法拼接
+        return table.to_pandas(coerce_temporal_nanoseconds=True)
+
+    def concat(self, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        # 空的部分列类型为 object, 参与拼接会把数值列也变成 object
+        non_empty = [frame for frame in frames if len(frame)]
+        if len(non_empty) <= 1:
+            return non_empty[0] if non_empty else frames[0]
+        return pd.concat(non_empty, ignore_index=True)
+
+    def empty_like(self, frame: pd.DataFrame) -> pd.DataFrame:
+        return frame.iloc[0:0]
+
+    def score_summary(self, frame: pd.DataFrame, threshold: float) -> Dict[str, float]:
+        return {
+            "mean": StatisticsCalculator.safe_calc(frame["score"], lambda x: x.mean()),
+            "max": StatisticsCalculator.safe_calc(frame["score"], lambda x: x.max()),
+            "count": len(frame),
+            "qualified_rate": len(frame[frame["score"] > threshold])
+            / max(len(frame), 1),
+        }
+
+    def score_distribution(
+        self, frame: pd.DataFrame, threshold: float = QUALIFIED_THRESHOLD
+    ) -> Dict:
+        return StatisticsCalculator.get_score_distribution(frame, threshold)
+
+    def correlation_matrix(self, frame: pd.DataFrame) -> Dict:
+        return StatisticsCalculator.get_correlation_matrix(
+            frame[StatisticsCalculator.NUMERIC_COLUMNS]
+        )
+
+    def score_types_stats(self, frame: pd.DataFrame) -> Dict:
+        return StatisticsCalculator.get_score_types_stats(frame)
+
+    def trends(self, frame: pd.DataFrame, time_range) -> Dict[str, Any]:
+        created_at = pd.to_datetime(frame["created_at"])
+        if time_range.start is None or time_range.end is None:
+            if frame.empty:
+                return self._empty_trends()
+            freq = self._frequency(created_at.min(), created_at.max())
+        else:
+            freq = self._frequency(*self._range_bounds(time_range))
+
+        # 整列本地化, 不再逐行调用 pytz localize
+        if created_at.dt.tz is None:
+            created_at = created_at.dt.tz_localize(LOCAL_TZ)
+        else:
+            created_at = created_at.dt.tz_convert(LOCAL_TZ)
+
+        scores = pd.Series(frame["score"].to_numpy(), index=created_at)
+        buckets = (
+            scores.groupby(pd.Grouper(freq=freq))
+            .agg(["mean", "max", "count"])
+            .fillna(0)
+        )
+        return self._format_trends(
+            freq,
+            list(buckets.index),
+            buckets["mean"].tolist(),
+            buckets["max"].tolist(),
+            buckets["count"].tolist(),
+        )
+
+
+class PolarsBackend(ComputeBackend):
+    """Polars lazy query plans, executed on Polars' own thread pool.
+
+    Needs the optional ``polars`` package. ``analytics.threads`` caps the
+    pool; it only takes effect if set before Polars is first imported.
+    """
+
+    name = "polars"
+    EVERY = {"h": "1h", "6h": "6h", "D": "1d"}
+
+    def __init__(self, threads: Optional[int] = None):
+        threads = threads or analytics_config.get("threads")
+        if threads and not pl.loaded:
+            os.environ.setdefault("POLARS_MAX_THREADS", str(threads))
+        pl.load()
+        self.schema = {
+            "id": pl.Int64,
+            "created_at": pl.Datetime("us"),
+            "fingerprint": pl.Utf8,
+            **{name: pl.Float64 for name in StatisticsCalculator.NUMERIC_COLUMNS},
+            "unique_letters_count": pl.Int64,
+        }
+
+    def frame(self, columns: Dict[str, Sequence]) -> pl.DataFrame:
+        schema = {name: self.schema[name] for name in columns if name in self.schema}
+        return pl.DataFrame(columns, schema_overrides=schema, nan_to_null=True)
+
+    def from_arrow(self, table) -> pl.DataFrame:
+        return pl.from_arrow(table)
+
+    def concat(self, frames: List[pl.DataFrame]) -> pl.DataFrame:
+        non_empty = [frame for frame in frames if len(frame)]
+        if len(non_empty) <= 1:
+            return non_empty[0] if non_empty else frames[0]
+        return pl.concat(non_empty, how="vertical_relaxed")
+
+    def empty_like(self, frame: pl.DataFrame) -> pl.DataFrame:
+        return frame.clear()
+
+    def score_summary(self, frame: pl.DataFrame, threshold: float) -> Dict[str, float]:
+        score = pl.col("score")
+        row = (
+            frame.lazy()
+            .select(
+                score.mean().alias("mean"),
+                score.max().alias("max"),
+                (score > threshold).sum().alias("qualified"),
+            )
+            .collect()
+            .row(0, named=True)
+        )
+        count = frame.height
+        return {
+            "mean": _finite(row["mean"]),
+            "max": _finite(row["max"]),
+            "count": count,
+            "qualified_rate": (row["qualified"] or 0) / max(count, 1),
+        }
+
+    def score_distribution(
+        self, frame: pl.DataFrame, threshold: float = QUALIFIED_THRESHOLD
+    ) -> Dict:
+        # 直方图与 pandas 后端同样交给 numpy, 保证分箱边界一致
+        hist, bins = np.histogram(frame["score"].to_numpy(), bins=20)
+        score = pl.col("score")
+        row = (
+            frame.lazy()
+            .select(
+                score.mean().alias("mean"),
+                score.median().alias("median"),
+                score.std(ddof=0).alias("std"),
+                score.min().alias("min"),
+                score.max().alias("max"),
+                score.quantile(0.25, "linear").alias("q1"),
+                score.quantile(0.75, "linear").alias("q3"),
+                (score > threshold).sum().alias("qualified_count"),
+            )
+            .collect()
+            .row(0, named=True)
+        )
+        return {
+            "histogram": hist.tolist(),
+            "bins": bins.tolist(),
+            **{
+                name: _finite(row[name])
+                for name in ("mean", "median", "std", "min", "max", "q1", "q3")
+            },
+            "total_count": frame.height,
+            "qualified_count": int(row["qualified_count"] or 0),
+        }
+
+    def correlation_matrix(self, frame: pl.DataFrame) -> Dict:
+        columns = StatisticsCalculator.NUMERIC_COLUMNS
+        filled = frame.lazy().select(
+            pl.col(name).cast(pl.Float64).fill_null(0) for name in columns
+        )
+        # 对称矩阵只算上三角, 所有列对在同一个计划里并行求值
+        pairs = [(a, b) for i, a in enumerate(columns) for b in columns[i:]]
+        row = (
+            filled.select(pl.corr(a, b).alias(f"{a}|{b}") for a, b in pairs)
+            .collect()
+            .row(0)
+        )
+        values = {}
+        for (a, b), value in zip(pairs, row):
+            values[a, b] = values[b, a] = round(_finite(value), 3)
+        return {a: {b: values[a, b] for b in columns} for a in columns}
+
+    def score_types_stats(self, frame: pl.DataFrame) -> Dict:
+        expressions = []
+        for name in StatisticsCalculator.SCORE_COLUMNS:
+            value = pl.col(name).cast(pl.Float64).fill_null(0)
+            expressions += [
+                value.count().alias(f"{name}|count"),
+                value.mean().alias(f"{name}|mean"),
+                value.std(ddof=1).alias(f"{name}|std"),
+                value.min().alias(f"{name}|min"),
+                value.quantile(0.25, "linear").alias(f"{name}|25%"),
+                value.quantile(0.50, "linear").alias(f"{name}|50%"),
+                value.quantile(0.75, "linear").alias(f"{name}|75%"),
+                value.max().alias(f"{name}|max"),
+            ]
+        row = frame.lazy().select(expressions).collect().row(0, named=True)
+        stats: Dict[str, Dict[str, float]] = {
+            name: {} for name in StatisticsCalculator.SCORE_COLUMNS
+        }
+        for key, value in row.items():
+            name, stat = key.split("|")
+            stats[name][stat] = _finite(value)
+        return stats
+
+    def trends(self, frame: pl.DataFrame, time_range) -> Dict[str, Any]:
+        rows = (
+            frame.lazy()
+            .select("created_at", "score")
+            .filter(pl.col("created_at").is_not_null())
+        )
+        if time_range.start is None or time_range.end is None:
+            first, last = (
+                rows.select(
+                    pl.col("created_at").min().alias("first"),
+                    pl.col("created_at").max().alias("last"),
+                )
+                .collect()
+                .row(0)
+            )
+            if first is None:
+                return self._empty_trends()
+            freq = self._frequency(first, last)
+        else:
+            freq = self._frequency(*self._range_bounds(time_range))
+
+        # created_at 是上海本地时间 (无夏令时), 直接按墙上时间分桶与 pandas 本地化后分组一致
+        every = self.EVERY[freq]
+        buckets = (
+            rows.group_by(pl.col("created_at").dt.truncate(every).alias("bucket"))
+            .agg(
+                pl.col("score").mean().alias("mean"),
+                pl.col("score").max().alias("max"),
+                pl.col("score").count().alias("count"),
+            )
+            .collect()
+        )
+        if buckets.is_empty():
+            return self._empty_trends()
+        # 补齐没有数据的桶, 与 pd.Grouper 的输出一致
+        grid = pl.DataFrame(
+            {
+                "bucket": pl.datetime_range(
+                    buckets["bucket"].min(),
+                    buckets["bucket"].max(),
+                    every,
+                    time_unit=buckets.schema["bucket"].time_unit,
+                    eager=True,
+                )
+            }
+        )
+        buckets = grid.join(buckets, on="bucket", how="left").fill_null(0).fill_nan(0)
+        return self._format_trends(
+            freq,
+            buckets["bucket"].to_list(),
+            buckets["mean"].to_list(),
+            buckets["max"].to_list(),
+            buckets["count"].to_list(),
+        )
+
+
+BACKENDS = {
+    "pandas": PandasBackend,
+    "polars": PolarsBackend,
+}
+
+_backends: Dict[str, ComputeBackend] = {}
+
+
+def get_backend(name: Optional[str] = None) -> ComputeBackend:
+    """The backend named ``name``, by default ``analytics.backend`` (pandas)."""
+    name = name or analytics_config.get("backend", "pandas")
+    if name not in _backends:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown compute backend: {name}")
+        try:
+            backend = BACKENDS[name]()
+        except ImportError as e:
+            # 可选依赖缺失时回退到 pandas, 统计接口保持可用
+            debug.error(
+                "Compute backend %s is not available (%s), falling back to pandas",
+                name,
+                e,
+            )
+            backend = get_backend("pandas")
+        _backends[name] = backend
+    return _backends[name]
@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import pytz
+
+from ..config import current_config
+from ..utils.debug import debug
+from ..utils.lazy import np
+from ..utils.metrics import (
+    dashboard_stream_events_total,
+    dashboard_stream_subscribers,
+    gauge_function,
+)
+from .change_feed import Change, change_feed, epoch_seconds
+from .compute_backend import ComputeBackend
+from .hot_window import hot_window
+from .key_analyzer import KeyAnalyzer
+
+stream_config = current_config.get("stream", {})
+
+
+class StreamUnavailable(Exception):
+    pass
+
+
+def encode_event(event: str, data: Dict, event_id: Optional[int] = None) -> str:
+    """One Server-Sent Events frame."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class DashboardBroadcaster:
+    """Pushes what changed on today's dashboard to every open stream.
+
+    After each hot window refresh that added keys, one delta is computed
+    from the window for all subscribers: the new keys (newest first), the
+    new keys above the high-score threshold, today's summary counters and
+    the hourly trend buckets the new keys fell into. The delta is encoded
+    once and the same frame is queued for every subscriber; bursts of
+    inserts are merged into one delta every ``min_interval`` seconds.
+
+    Event ids are the highest key id the delta covers, so a reconnecting
+    client sends ``Last-Event-ID`` and receives a catch-up delta of its own.
+    A ``reset`` event tells clients to reload through the REST endpoints:
+    keys of today were updated or deleted, the client is ahead of the
+    window, or its queue overflowed (the stream then closes).
+    """
+
+    QUEUE_SIZE = stream_config.get("queue_size", 64)
+    HEARTBEAT_INTERVAL = stream_config.get("heartbeat_interval", 15)
+    MIN_INTERVAL = stream_config.get("min_interval", 1)
+    MAX_SUBSCRIBERS = stream_config.get("max_subscribers", 1000)
+    RETRY_MS = stream_config.get("retry_ms", 3000)
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # 已推送到的 key id; None 表示等热窗口首次加载后再取基线
+        self.last_id: Optional[int] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._wake = asyncio.Event()
+        self._reset_pending = False
+        gauge_function(dashboard_stream_subscribers, lambda: len(self._subscribers))
+
+    # ---- 时间范围 ----
+
+    @staticmethod
+    def _today() -> tuple:
+        local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+        start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start, start + timedelta(days=1) - timedelta(microseconds=1)
+
+    def available(self) -> bool:
+        start, end = self._today()
+        return self.enabled and hot_window.covers(start, end)
+
+    # ---- 增量 ----
+
+    def delta(self, after: int, through: int) -> Optional[Dict]:
+        """Today's changes from keys with ``after < id <= through``.
+
+        None when there are none.
+
+        The summary and trend buckets cover today's keys up to ``through``,
+        so an event labelled ``through`` never includes keys of the next one.
+        """
+        start, end = self._today()
+        if not hot_window.covers(start, end):
+            return None
+        new_created = hot_window.columns(
+            start, end, names=("created_at",), after=after, through=through
+        )["created_at"]
+        if not len(new_created):
+            return None
+
+        today = hot_window.columns(
+            start, end, names=("created_at", "score"), through=through
+        )
+        scores = today["score"]
+        scored = ~np.isnan(scores)
+        valid = scores[scored]
+        threshold = KeyAnalyzer.HIGH_SCORE_THRESHOLD
+        qualified = int(np.count_nonzero(valid > threshold))
+        # 与 REST summary 一致: 均值和最大值跳过没有分数的 key, 总数包含它们
+        summary = {
+            "mean": round(float(valid.mean()), 1) if len(valid) else 0,
+            "max": round(float(valid.max()), 1) if len(valid) else 0,
+            "count": int(len(scores)),
+            "qualified_count": qualified,
+            "qualified_rate": qualified / max(len(scores), 1),
+        }
+
+        # 只重算新 key 落入的小时桶, 与今日范围 trends 的小时粒度一致;
+        # 与 pandas 分组相同, 桶内只统计有分数的 key, 空桶的均值和最大值为 0
+        touched = np.unique(new_created.astype("datetime64[h]"))
+        buckets = today["created_at"][scored].astype("datetime64[h]")
+        in_touched = np.isin(buckets, touched)
+        index = np.searchsorted(touched, buckets[in_touched])
+        touched_scores = valid[in_touched]
+        counts = np.bincount(index, minlength=len(touched))
+        sums = np.bincount(index, weights=touched_scores, minlength=len(touched))
+        maxes = np.full(len(touched), -np.inf)
+        np.maximum.at(maxes, index, touched_scores)
+        maxes[counts == 0] = 0
+        trend = ComputeBackend._format_trends(
+            "h",
+            touched.astype("datetime64[s]").tolist(),
+            (sums / np.maximum(counts, 1)).tolist(),
+            maxes.tolist(),
+            counts.tolist(),
+        )
+
+        limit = KeyAnalyzer.DEFAULT_LIMIT
+        return {
+            "day": start.strftime("%Y-%m-%d"),
+            "recent": [
+                KeyAnalyzer._format_fields(*row)
+                for row in hot_window.recent(
+                    start, end, limit, after=after, through=through
+                )
+            ],
+            "high_score": [
+                KeyAnalyzer._format_fields(*row)
+                for row in hot_window.high_score(
+                    start, end, threshold, limit, after=after, through=through
+                )
+            ],
+            "summary": summary,
+            "trend": trend,
+        }
+
+    # ---- 订阅 ----
+
+    def notify(self):
+        self._wake.set()
+
+    def on_change(self, changes: List[Change]):
+        start, _ = self._today()
+        for change in changes:
+            if change.op in ("update", "delete", "truncate") and change.overlaps(
+                epoch_seconds(start), None
+            ):
+                self._reset_pending = True
+                self._wake.set()
+
+    def _broadcast(self, frame: str):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(queue)
+
+    def _drop(self, queue: asyncio.Queue):
+        # 消费太慢: 丢弃积压, 发 reset 后关闭连接, 客户端重连后走 REST 重新加载
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(encode_event("reset", {"reason": "overflow"}))
+        queue.put_nowait(None)
+        dashboard_stream_events_total.labels(event="dropped").inc()
+
+    def publish(self):
+        # 热窗口加载或重载中: 完成后 on_append 会再次唤醒
+        if hot_window.loading:
+            return
+        latest = hot_window.last_row_id
+        if self._reset_pending:
+            self._reset_pending = False
+            # 重载后的窗口作为新基线, 客户端通过 REST 重新加载
+            self.last_id = latest
+            self._broadcast(encode_event("reset", {"reason": "changed"}))
+            dashboard_stream_events_total.labels(event="reset").inc()
+            return
+        if self.last_id is None:
+            self.last_id = latest
+            return
+        if latest <= self.last_id:
+            return
+        after, self.last_id = self.last_id, latest
+        if not self._subscribers:
+            return
+        delta = self.delta(after, latest)
+        if delta is not None:
+            self._broadcast(encode_event("delta", delta, latest))
+            dashboard_stream_events_total.labels(event="delta").inc()
+
+    async def run(self):
+        """Background task: one delta per hot window append.
+
+        Each delta is fanned out to all subscribers.
+        """
+        while True:
+            try:
+                await self._wake.wait()
+                self._wake.clear()
+                self.publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Dashboard stream publish failed: %s", e)
+            # 合并突发写入: 间隔内到达的 key 归入下一个增量
+            await asyncio.sleep(self.MIN_INTERVAL)
+
+    def stream(self, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """SSE frames for one client.
+
+        Raises StreamUnavailable before the first frame.
+        """
+        if not self.available():
+            raise StreamUnavailable("Live dashboard is not available")
+        if len(self._subscribers) >= self.MAX_SUBSCRIBERS:
+            raise StreamUnavailable("Too many live dashboard subscribers")
+        return self._frames(last_event_id)
+
+    def _catch_up(self, queue: asyncio.Queue, last_event_id: int) -> Optional[str]:
+        if last_event_id > hot_window.last_row_id:
+            queue.put_nowait(encode_event("reset", {"reason": "ahead"}))
+            queue.put_nowait(None)
+            return None
+        if self.last_id is None or last_event_id >= self.last_id:
+            return None
+        # 只补到已广播的位置, 之后的 key 由队列中的下一个增量送达, 不会重复
+        delta = self.delta(last_event_id, self.last_id)
+        return encode_event("delta", delta, self.last_id) if delta is not None else None
+
+    async def _frames(self, last_event_id: Optional[int]) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue(self.QUEUE_SIZE)
+        self._subscribers.add(queue)
+        try:
+            # 注册与计算补发之间没有 await, 之后的增量都会进入队列, 不会漏掉
+            catch_up = (
+                self._catch_up(queue, last_event_id)
+                if last_event_id is not None
+                else None
+            )
+            yield f"retry: {self.RETRY_MS}\n\n"
+            if catch_up:
+                yield catch_up
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), self.HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    # 注释行作为心跳, 防止代理关闭空闲连接
+                    yield ": ping\n\n"
+                    continue
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self._subscribers.discard(queue)
+
+
+dashboard_broadcaster = DashboardBroadcaster(
+    enabled=stream_config.get("enabled", True) and hot_window.enabled
+)
+hot_window.on_append(dashboard_broadcaster.notify)
+change_feed.subscribe(dashboard_broadcaster.on_change)
@@ -0,0 +1,452 @@
+import asyncio
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import current_config
+from ..database import async_session, replica_router
+from ..models import KeyInfo
+from ..utils.debug import debug
+from .change_feed import Change, change_feed
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+search_config = current_config.get("search", {})
+
+
+class InvalidPatternError(ValueError):
+    pass
+
+
+def normalize_fingerprint(value: str) -> str:
+    # Fingerprints are often pasted grouped ("DEAD BEEF" / "DE:AD:BE:EF")
+    return re.sub(r"[\s:]", "", value).upper()
+
+
+# 索引 (Python re) 与回退查询 (Postgres regexp_match, ARE) 语义一致的正则子集:
+# 字面量、字符类、., 分组、分支、量词与 ^ $; 不支持反向引用、环视、\b 与内联标志
+_PORTABLE_AT = {sre_constants.AT_BEGINNING, sre_constants.AT_END}
+_NEWLINE = ord("\n")
+
+
+def _check_portable(parsed, repeated: bool = False, unbounded: bool = False) -> bool:
+    """Rejects constructs outside the portable subset.
+
+    Returns whether a match may contain a newline.
+    """
+    newline = False
+    for op, arg in parsed:
+        if op is sre_constants.LITERAL:
+            newline |= arg == _NEWLINE
+        elif op is sre_constants.NOT_LITERAL:
+            newline |= arg != _NEWLINE
+        elif op is sre_constants.ANY:
+            continue
+        elif op is sre_constants.IN:
+            for item_op, item in arg:
+                if item_op is sre_constants.NEGATE:
+                    newline = True
+                elif item_op is sre_constants.LITERAL:
+                    newline |= item == _NEWLINE
+                elif item_op is sre_constants.RANGE:
+                    newline |= item[0] <= _NEWLINE <= item[1]
+                elif item_op is sre_constants.CATEGORY:
+                    newline |= item in (
+                        sre_constants.CATEGORY_SPACE,
+                        sre_constants.CATEGORY_NOT_DIGIT,
+                        sre_constants.CATEGORY_NOT_WORD,
+                    )
+        elif op is sre_constants.BRANCH:
+            for branch in arg[1]:
+                newline |= _check_portable(branch, repeated, unbounded)
+        elif op is sre_constants.SUBPATTERN:
+            _group, add_flags, del_flags, body = arg
+            if add_flags or del_flags:
+                raise InvalidPatternError("Inline flags are not supported")
+            newline |= _check_portable(body, repeated, unbounded)
+        elif op is sre_constants.MAX_REPEAT or op is sre_constants.MIN_REPEAT:
+            low, high, body = arg
+            inner_unbounded = high == sre_constants.MAXREPEAT
+            # (A+)+ 之类的嵌套量词会灾难性回溯
+            if high > 1 and repeated and (unbounded or inner_unbounded):
+                raise InvalidPatternError("Nested repetition is not supported")
+            newline |= _check_portable(
+                body, repeated or high > 1, unbounded or inner_unbounded
+            )
+        elif op is sre_constants.AT:
+            if arg not in _PORTABLE_AT:
+                raise InvalidPatternError("Only the ^ and $ anchors are supported")
+        else:
+            raise InvalidPatternError(f"Unsupported regex construct: {str(op).lower()}")
+    return newline
+
+
+def compile_pattern(pattern: str) -> re.Pattern:
+    """Case-insensitive bytes regex.
+
+    Limited to the subset Postgres evaluates the same way.
+    """
+    try:
+        compiled = re.compile(pattern.encode("ascii"), re.IGNORECASE)
+        _check_portable(sre_parse.parse(pattern, re.IGNORECASE))
+    except (re.error, UnicodeEncodeError) as e:
+        raise InvalidPatternError(f"Invalid pattern: {e}") from e
+    return compiled
+
+
+def may_match_newline(pattern: str) -> bool:
+    return _check_portable(sre_parse.parse(pattern, re.IGNORECASE))
+
+
+def required_literals(pattern: str) -> List[str]:
+    """Upper-cased literal runs every match of ``pattern`` must contain.
+
+    Only the top level of the pattern is considered.
+    """
+    parsed = sre_parse.parse(pattern, re.IGNORECASE)
+
+    literals, run = [], ""
+    for op, arg in parsed:
+        if op is sre_constants.LITERAL:
+            run += chr(arg)
+            continue
+        if op is sre_constants.MAX_REPEAT or op is sre_constants.MIN_REPEAT:
+            low, high, item = arg
+            if len(item) == 1 and item[0][0] is sre_constants.LITERAL and low > 0:
+                # A{4} contributes AAAA; A{2,5} contributes AA and ends the run
+                run += chr(item[0][1]) * low
+                if low == high:
+                    continue
+        if op is sre_constants.AT:
+            continue
+        literals.append(run)
+        run = ""
+    literals.append(run)
+    return [literal.upper() for literal in literals if literal]
+
+
+class FingerprintIndex:
+    """In-process n-gram index over the 16-character key ID of each fingerprint.
+
+    Key IDs are stored back to back in one bytearray (``RECORD_SIZE`` bytes per
+    key, newline separated) so candidates can be verified, and patterns with no
+    usable literal scanned, by the C regex engine without building Python
+    strings. Two posting maps point into it:
+
+    * ``_tails``: last ``TAIL_SIZE`` characters -> positions, answers suffix
+      queries by reading a single bucket.
+    * ``_grams``: every distinct ``GRAM_SIZE``-gram -> positions, answers regex
+      queries through the literal runs the pattern requires.
+
+    Memory is roughly 16 + 1 + 8 + 4 + 4 * 14 = ~85 bytes per key, about
+    850 MB at 10M keys and held by every worker, so the index is opt-in via
+    ``search.ngram_index``; without it searches run in Postgres.
+    Targets at 10M keys: suffix p95 < 5 ms, regex with a literal of at least
+    ``GRAM_SIZE`` characters p95 < 50 ms. Literal-free regexes fall back to a
+    newest-first scan at roughly 1 us per key; callers run regex searches in
+    a thread, and a scan that exceeds ``regex_scan_seconds`` is abandoned
+    with InvalidPatternError. Every match is confined to one key ID: patterns
+    that can match the newline separator (``[^X]``, ``\s``) are checked one
+    record at a time. ``contains`` searches are served by the pg_trgm index
+    and target p95 < 50 ms for patterns of 6+ characters.
+
+    New keys are indexed when the change feed announces an insert, or every
+    ``refresh_interval`` seconds while it is not live. When it announces a
+    delete, the ids of its range that no longer exist lose their postings
+    and are skipped by scans; their records are reclaimed by a full reload
+    once they make up half the index, or after a truncate. Keys deleted
+    while the feed is not live are only dropped from results by
+    ``_fetch_by_ids``.
+    """
+
+    GRAM_SIZE = 3
+    TAIL_SIZE = 4
+    KEY_ID_LENGTH = 16
+    RECORD_SIZE = KEY_ID_LENGTH + 1
+    SCAN_CHUNK = 65536
+    SCAN_SECONDS = search_config.get("regex_scan_seconds", 2)
+    REFRESH_INTERVAL = search_config.get("refresh_interval", 30)
+    REFRESH_BATCH = search_config.get("refresh_batch", 50000)
+
+    def __init__(self):
+        self._row_ids = array("q")
+        self._records = bytearray()
+        self._grams: Dict[bytes, array] = defaultdict(lambda: array("I"))
+        self._tails: Dict[bytes, array] = defaultdict(lambda: array("I"))
+        # 已删除 key 的位置: 不再出现在倒排表中, 扫描时跳过
+        self._removed: Set[int] = set()
+        self._deleted: List[Tuple[int, int]] = []
+        self.last_row_id = 0
+        self.ready = False
+        self._reload = False
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._row_ids) - len(self._removed)
+
+    def memory_bytes(self) -> int:
+        postings = sum(p.itemsize * len(p) for p in self._grams.values())
+        postings += sum(p.itemsize * len(p) for p in self._tails.values())
+        return (
+            len(self._records) + self._row_ids.itemsize * len(self._row_ids) + postings
+        )
+
+    def add(self, row_id: int, fingerprint: Optional[str]):
+        # Same slice _format_key_info displays as the key ID
+        key_id = (fingerprint or "").upper()[24:40].encode("ascii", "replace")
+        key_id = key_id.ljust(self.KEY_ID_LENGTH, b" ")
+        position = len(self._row_ids)
+        self._row_ids.append(row_id)
+        self._records += key_id + b"\n"
+        self._tails[key_id[-self.TAIL_SIZE :]].append(position)
+        for gram in self._key_grams(key_id):
+            self._grams[gram].append(position)
+        self.last_row_id = max(self.last_row_id, row_id)
+
+    def _key_grams(self, key_id: bytes) -> Set[bytes]:
+        return {
+            key_id[i : i + self.GRAM_SIZE]
+            for i in range(self.KEY_ID_LENGTH - self.GRAM_SIZE + 1)
+        }
+
+    def _remove(self, positions: List[int]):
+        """Drops ``positions`` (ascending) from the posting lists.
+
+        Postings are sorted, so only the slice between the first and last
+        position is rewritten.
+        """
+        removed = set(positions)
+        tails: Set[bytes] = set()
+        grams: Set[bytes] = set()
+        for position in positions:
+            key_id = bytes(self._record(position))
+            tails.add(key_id[-self.TAIL_SIZE :])
+            grams.update(self._key_grams(key_id))
+        for postings, keys in ((self._tails, tails), (self._grams, grams)):
+            for key in keys:
+                posting = postings[key]
+                start = bisect_left(posting, positions[0])
+                end = bisect_right(posting, positions[-1])
+                posting[start:end] = array(
+                    "I", (p for p in posting[start:end] if p not in removed)
+                )
+                if not posting:
+                    del postings[key]
+        self._removed.update(removed)
+
+    async def _prune(self, db: AsyncSession, low: int, high: int) -> int:
+        """Removes indexed ids in ``[low, high]`` that no longer exist.
+
+        Returns how many were removed.
+        """
+        first = bisect_left(self._row_ids, low)
+        last = bisect_right(self._row_ids, high)
+        pruned = 0
+        # 按批次核对仍存在的 id, 大范围删除 (如去重) 也不会一次读入全部
+        for start in range(first, last, self.REFRESH_BATCH):
+            end = min(start + self.REFRESH_BATCH, last)
+            result = await db.execute(
+                select(KeyInfo.id).where(
+                    KeyInfo.id.between(self._row_ids[start], self._row_ids[end - 1])
+                )
+            )
+            existing = set(result.scalars().all())
+            positions = [
+                position
+                for position in range(start, end)
+                if self._row_ids[position] not in existing
+                and position not in self._removed
+            ]
+            if positions:
+                self._remove(positions)
+                pruned += len(positions)
+        return pruned
+
+    def _reset(self):
+        self._row_ids = array("q")
+        self._records = bytearray()
+        self._grams.clear()
+        self._tails.clear()
+        self._removed = set()
+        self._deleted = []
+        self.last_row_id = 0
+        self.ready = False
+
+    def on_change(self, changes: List[Change]):
+        for change in changes:
+            if change.op == "truncate":
+                self._reload = True
+            elif change.op == "delete" and change.max_id is not None:
+                self._deleted.append((change.min_id, change.max_id))
+        self._wake.set()
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Append keys inserted since the last refresh; returns how many were added."""
+        added = 0
+        async with self._lock:
+            if self._reload:
+                self._reload = False
+                self._reset()
+            deleted, self._deleted = self._deleted, []
+            if deleted:
+                # 删除后仍存在的 id 只能以主库为准, 副本可能尚未回放新插入的行
+                async with async_session() as primary:
+                    for low, high in deleted:
+                        await self._prune(primary, low, high)
+            if len(self._removed) > len(self._row_ids) // 2:
+                # 已删除的记录过半时整体重建, 回收记录与 id 占用的内存
+                self._reset()
+            while True:
+                result = await db.execute(
+                    select(KeyInfo.id, KeyInfo.fingerprint)
+                    .where(KeyInfo.id > self.last_row_id)
+                    .order_by(KeyInfo.id)
+                    .limit(self.REFRESH_BATCH)
+                )
+                rows = result.all()
+                for row in rows:
+                    self.add(row.id, row.fingerprint)
+                added += len(rows)
+                if len(rows) < self.REFRESH_BATCH:
+                    break
+            self.ready = True
+        return added
+
+    async def run(self):
+        """Background task: initial build, then incremental refresh."""
+        while True:
+            try:
+                started = time.perf_counter()
+                # 通知触发的增量读主库: 副本可能还没回放刚提交的行
+                factory = (
+                    async_session
+                    if change_feed.live and self.ready
+                    else replica_router.session_factory()
+                )
+                async with factory() as db:
+                    added = await self.refresh(db)
+                if added:
+                    debug.log(
+                        "Fingerprint index +%d keys (%d total, %.1f MB) in %.2fs",
+                        added,
+                        len(self),
+                        self.memory_bytes() / 1024 / 1024,
+                        time.perf_counter() - started,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Fingerprint index refresh failed: %s", e)
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), change_feed.poll_interval(self.REFRESH_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def _record(self, position: int) -> bytes:
+        offset = position * self.RECORD_SIZE
+        return self._records[offset : offset + self.KEY_ID_LENGTH]
+
+    def _collect(self, positions, predicate, limit: int) -> List[int]:
+        # Positions are in insertion (id) order; walk backwards for newest first
+        row_ids = []
+        for position in reversed(positions):
+            if predicate(self._record(position)):
+                row_ids.append(self._row_ids[position])
+                if len(row_ids) >= limit:
+                    break
+        return row_ids
+
+    def search_suffix(self, pattern: str, limit: int) -> List[int]:
+        suffix = pattern.encode("ascii")
+        if len(suffix) >= self.TAIL_SIZE:
+            positions = self._tails.get(suffix[-self.TAIL_SIZE :], ())
+            return self._collect(
+                positions, lambda key_id: key_id.endswith(suffix), limit
+            )
+        # Short suffix: every tail bucket ending with it matches outright
+        positions = []
+        for tail, bucket in self._tails.items():
+            if tail.endswith(suffix):
+                positions.extend(bucket[-limit:])
+        positions.sort(reverse=True)
+        return [self._row_ids[position] for position in positions[:limit]]
+
+    def search_regex(self, pattern: str, limit: int) -> List[int]:
+        compiled = compile_pattern(pattern)
+        grams = {
+            literal[i : i + self.GRAM_SIZE].encode("ascii")
+            for literal in required_literals(pattern)
+            for i in range(len(literal) - self.GRAM_SIZE + 1)
+        }
+        if not grams:
+            return self._scan(compiled, may_match_newline(pattern), limit)
+
+        postings = sorted(
+            (self._grams.get(gram, array("I")) for gram in grams), key=len
+        )
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return self._collect(
+            sorted(candidates), lambda key_id: compiled.search(key_id), limit
+        )
+
+    def _scan(self, compiled: re.Pattern, newline: bool, limit: int) -> List[int]:
+        # Newest chunk first so broad patterns stop early; rare ones pay a full scan.
+        # 在线程中运行: 分块复制记录, 不持有 bytearray 的缓冲区 (事件循环线程会追加)
+        matcher = re.compile(
+            rb"^[^\n]*?(?:" + compiled.pattern + rb")", re.MULTILINE | re.IGNORECASE
+        )
+        deadline = time.monotonic() + self.SCAN_SECONDS
+        row_ids = []
+        end = len(self._row_ids)
+        while end > 0 and len(row_ids) < limit:
+            if time.monotonic() > deadline:
+                raise InvalidPatternError(
+                    f"Pattern scan exceeded {self.SCAN_SECONDS}s; "
+                    f"include a literal of at least {self.GRAM_SIZE} characters"
+                )
+            start = max(0, end - self.SCAN_CHUNK)
+            chunk = bytes(
+                self._records[start * self.RECORD_SIZE : end * self.RECORD_SIZE]
+            )
+            if newline:
+                # 可能跨过换行分隔符的模式逐条记录匹配
+                offsets = range(0, len(chunk), self.RECORD_SIZE)
+                positions = [
+                    start + offset // self.RECORD_SIZE
+                    for offset in offsets
+                    if compiled.search(chunk[offset : offset + self.KEY_ID_LENGTH])
+                ]
+            else:
+                positions = [
+                    start + m.start() // self.RECORD_SIZE
+                    for m in matcher.finditer(chunk)
+                ]
+            row_ids.extend(
+                self._row_ids[position]
+                for position in reversed(positions)
+                if position not in self._removed
+            )
+            end = start
+        return row_ids[:limit]
+
+
+fingerprint_index = FingerprintIndex()
+change_feed.subscribe(fingerprint_index.on_change)
@@ -0,0 +1,451 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pytz
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import current_config
+from ..database import async_session, replica_router
+from ..models import KeyInfo
+from ..utils.debug import debug
+from ..utils.lazy import np
+from ..utils.metrics import gauge_function, hot_window_bytes, hot_window_keys
+from .change_feed import Change, change_feed, epoch_seconds
+
+hot_window_config = current_config.get("hot_window", {})
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+HEX_KEY_ID = re.compile(r"[0-9A-F]{16}")
+
+
+def to_micros(value: datetime) -> int:
+    return (value - EPOCH) // ONE_MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+class HotWindow:
+    """The last ``hours`` of keys, held by every worker as NumPy columns.
+
+    Statistics need 33 bytes per key: created_at as int64 microseconds of
+    local time, score as float64, the four letter scores as float32 and
+    unique_letters_count as uint8 (``MISSING_COUNT`` for NULL). The id and
+    the displayed key ID (16 hex characters packed into a uint64) add 16
+    bytes for the recent and high-score lists. Key IDs that are not 16 hex
+    characters are kept aside by row id.
+
+    Rows live in ``[start, end)`` of preallocated arrays, in id order.
+    Expired rows are dropped from the front. When the arrays fill up, the
+    live rows move to the front, and the arrays double in size if needed.
+    The initial load takes every key since the cutoff; after that, keys with
+    a higher id are appended as soon as the change feed announces an
+    insert, or every ``refresh_interval`` seconds while it is not live.
+    An update, delete or truncate inside the window reloads it.
+    ``covered_from`` is the earliest time from which the window holds
+    every key; ``position`` is the change feed position it reflects.
+    Callbacks registered with ``on_append`` run after each load and each
+    refresh that added keys.
+    """
+
+    HOURS = hot_window_config.get("hours", 48)
+    REFRESH_INTERVAL = hot_window_config.get("refresh_interval", 2)
+    REFRESH_BATCH = hot_window_config.get("refresh_batch", 50000)
+    INITIAL_CAPACITY = hot_window_config.get("initial_capacity", 1 << 18)
+    COLUMNS = (
+        ("id", "int64"),
+        ("created_at", "int64"),
+        ("score", "float64"),
+        ("repeat_letter_score", "float32"),
+        ("increasing_letter_score", "float32"),
+        ("decreasing_letter_score", "float32"),
+        ("magic_letter_score", "float32"),
+        ("unique_letters_count", "uint8"),
+        ("key_id", "uint64"),
+    )
+    # uint8 无法表示 NULL; 十六进制指纹最多 16 个不同字符, 不会与真实值冲突
+    MISSING_COUNT = 255
+    # columns() 默认返回的统计帧列
+    FRAME_NAMES = (
+        "id",
+        "created_at",
+        "repeat_letter_score",
+        "increasing_letter_score",
+        "decreasing_letter_score",
+        "magic_letter_score",
+        "score",
+        "unique_letters_count",
+    )
+    SOURCE_COLUMNS = (
+        KeyInfo.id,
+        KeyInfo.created_at,
+        KeyInfo.score,
+        KeyInfo.repeat_letter_score,
+        KeyInfo.increasing_letter_score,
+        KeyInfo.decreasing_letter_score,
+        KeyInfo.magic_letter_score,
+        KeyInfo.unique_letters_count,
+        KeyInfo.fingerprint,
+    )
+
+    def __init__(self, hours: float = HOURS, enabled: bool = True):
+        self.hours = hours
+        self.enabled = enabled
+        self._arrays: Dict[str, Any] = {}
+        self._start = 0
+        self._end = 0
+        self._odd_key_ids: Dict[int, str] = {}
+        self.covered_from: Optional[datetime] = None
+        self.last_row_id = 0
+        self.ready = False
+        self.position = 0
+        self._reload = False
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._append_callbacks: List[Callable[[], None]] = []
+        gauge_function(hot_window_keys, lambda: len(self))
+        gauge_function(hot_window_bytes, self.memory_bytes)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def memory_bytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays.values())
+
+    @classmethod
+    def bytes_per_key(cls) -> int:
+        return sum(np.dtype(dtype).itemsize for _, dtype in cls.COLUMNS)
+
+    def _column(self, name: str):
+        return self._arrays[name][self._start : self._end]
+
+    # ---- 写入 ----
+
+    def _reserve(self, count: int):
+        if not self._arrays:
+            capacity = max(self.INITIAL_CAPACITY, count)
+            self._arrays = {
+                name: np.empty(capacity, dtype=dtype) for name, dtype in self.COLUMNS
+            }
+            return
+        capacity = len(self._arrays["id"])
+        if self._end + count <= capacity:
+            return
+        live = len(self)
+        if live + count > capacity // 2:
+            capacity = max(capacity * 2, live + count)
+        arrays = {}
+        for name, dtype in self.COLUMNS:
+            array = (
+                np.empty(capacity, dtype=dtype)
+                if capacity != len(self._arrays[name])
+                else self._arrays[name]
+            )
+            # 活跃区间搬到数组开头; 同一数组内用 copy 避免重叠覆盖
+            array[:live] = self._arrays[name][self._start : self._end].copy()
+            arrays[name] = array
+        self._arrays, self._start, self._end = arrays, 0, live
+
+    def append(self, rows, cutoff: Optional[datetime] = None):
+        """Appends rows created at or after ``cutoff``.
+
+        Rows are in SOURCE_COLUMNS order, by ascending id.
+        """
+        if cutoff is not None:
+            rows = [row for row in rows if row[1] is not None and row[1] >= cutoff]
+        if not rows:
+            return
+        self._reserve(len(rows))
+        (
+            ids,
+            created,
+            score,
+            repeat,
+            increasing,
+            decreasing,
+            magic,
+            unique,
+            fingerprints,
+        ) = zip(*rows)
+        position = slice(self._end, self._end + len(rows))
+        self._arrays["id"][position] = ids
+        self._arrays["created_at"][position] = [to_micros(value) for value in created]
+        self._arrays["score"][position] = np.array(score, dtype="float64")
+        self._arrays["repeat_letter_score"][position] = np.array(
+            repeat, dtype="float64"
+        )
+        self._arrays["increasing_letter_score"][position] = np.array(
+            increasing, dtype="float64"
+        )
+        self._arrays["decreasing_letter_score"][position] = np.array(
+            decreasing, dtype="float64"
+        )
+        self._arrays["magic_letter_score"][position] = np.array(magic, dtype="float64")
+        self._arrays["unique_letters_count"][position] = [
+            self.MISSING_COUNT if value is None else value for value in unique
+        ]
+        self._arrays["key_id"][position] = [
+            self._pack_key_id(row_id, fp) for row_id, fp in zip(ids, fingerprints)
+        ]
+        self._end += len(rows)
+        self.last_row_id = max(self.last_row_id, ids[-1])
+
+    def _pack_key_id(self, row_id: int, fingerprint: Optional[str]) -> int:
+        # 与 _format_key_info 展示的 key ID 相同 (指纹第 24-40 位)
+        key_id = fingerprint.upper()[24:40] if fingerprint else "N/A"
+        if HEX_KEY_ID.fullmatch(key_id):
+            return int(key_id, 16)
+        self._odd_key_ids[row_id] = key_id
+        return 0
+
+    def _key_id(self, row_id: int, packed: int) -> str:
+        return self._odd_key_ids.get(row_id) or f"{packed:016X}"
+
+    def evict(self, cutoff: datetime):
+        created = self._column("created_at")
+        if len(created):
+            fresh = created >= to_micros(cutoff)
+            # 行按 id 排列, 时间基本递增; 乱序的旧行留到被后面的行一起淘汰, 查询靠掩码排除
+            dropped = int(np.argmax(fresh)) if fresh.any() else len(created)
+            if dropped:
+                if self._odd_key_ids:
+                    for row_id in self._column("id")[:dropped].tolist():
+                        self._odd_key_ids.pop(row_id, None)
+                self._start += dropped
+        self.covered_from = max(self.covered_from or cutoff, cutoff)
+
+    def _cutoff(self) -> datetime:
+        local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+        return local_now - timedelta(hours=self.hours)
+
+    def _reset(self):
+        self._arrays, self._start, self._end = {}, 0, 0
+        self._odd_key_ids.clear()
+        self.covered_from = None
+        self.last_row_id = 0
+        self.ready = False
+
+    def on_append(self, callback: Callable[[], None]):
+        self._append_callbacks.append(callback)
+
+    def on_change(self, changes: List[Change]):
+        for change in changes:
+            if (
+                change.op in ("update", "delete", "truncate")
+                and self.covered_from is not None
+            ):
+                if change.overlaps(epoch_seconds(self.covered_from), math.inf):
+                    self._reload = True
+        self._wake.set()
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Initial load, then keys inserted since the last refresh.
+
+        Returns how many were added.
+        """
+        added = 0
+        async with self._lock:
+            # 先取位置再查询: 之后到达的变化不算已反映
+            position = change_feed.position()
+            if self._reload:
+                self._reload = False
+                self._reset()
+            loaded = not self.ready
+            cutoff = self._cutoff()
+            if not self.ready:
+                query = select(*self.SOURCE_COLUMNS).where(KeyInfo.created_at >= cutoff)
+                self.covered_from = cutoff
+            else:
+                query = select(*self.SOURCE_COLUMNS)
+            while True:
+                result = await db.execute(
+                    query.where(KeyInfo.id > self.last_row_id)
+                    .order_by(KeyInfo.id)
+                    .limit(self.REFRESH_BATCH)
+                )
+                rows = result.all()
+                before = len(self)
+                self.append(rows, cutoff)
+                added += len(self) - before
+                if rows:
+                    self.last_row_id = max(self.last_row_id, rows[-1][0])
+                if len(rows) < self.REFRESH_BATCH:
+                    break
+            self.evict(cutoff)
+            self.ready = True
+            self.position = position
+        if added or loaded:
+            for callback in self._append_callbacks:
+                callback()
+        return added
+
+    async def run(self):
+        """Background task: initial load, then incremental refresh."""
+        while True:
+            try:
+                started = time.perf_counter()
+                first = not self.ready or self._reload
+                # 通知触发的增量读主库: 副本可能还没回放刚提交的行
+                factory = (
+                    async_session
+                    if change_feed.live and not first
+                    else replica_router.session_factory()
+                )
+                async with factory() as db:
+                    added = await self.refresh(db)
+                if first:
+                    debug.log(
+                        "Hot window loaded %d keys of the last %sh "
+                        "(%.1f MB, %.1f MB per million keys) in %.2fs",
+                        len(self),
+                        self.hours,
+                        self.memory_bytes() / 1024 / 1024,
+                        self.bytes_per_key() * 1e6 / 1024 / 1024,
+                        time.perf_counter() - started,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Hot window refresh failed: %s", e)
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), change_feed.poll_interval(self.REFRESH_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # ---- 查询 ----
+
+    @property
+    def loading(self) -> bool:
+        return self._reload or not self.ready
+
+    def covers(self, start: Optional[datetime], end: Optional[datetime]) -> bool:
+        return (
+            self.enabled
+            and self.ready
+            and start is not None
+            and end is not None
+            and start >= self.covered_from
+        )
+
+    def _positions(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        after: Optional[int] = None,
+        through: Optional[int] = None,
+    ):
+        ids = self._column("id")
+        # 行按 id 递增排列, 二分找到 after < id <= through 的范围
+        first = 0 if after is None else int(np.searchsorted(ids, after, side="right"))
+        last = (
+            len(ids)
+            if through is None
+            else int(np.searchsorted(ids, through, side="right"))
+        )
+        created = self._column("created_at")[first : max(first, last)]
+        if start is None:
+            return np.arange(first, first + len(created))
+        return first + np.flatnonzero(
+            (created >= to_micros(start)) & (created <= to_micros(end))
+        )
+
+    def columns(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        names: Sequence[str] = FRAME_NAMES,
+        after: Optional[int] = None,
+        through: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Numeric frame columns of the keys in ``[start, end]``.
+
+        Columns are float64, or datetime64[ns] for created_at.
+
+        Only keys with id > ``after`` and id <= ``through`` (either may be None).
+        """
+        positions = self._positions(start, end, after, through)
+        columns = {}
+        for name in names:
+            values = self._column(name)[positions]
+            if name == "created_at":
+                columns[name] = values.astype("datetime64[us]").astype("datetime64[ns]")
+            elif name == "id":
+                columns[name] = values
+            elif name == "unique_letters_count":
+                missing = values == self.MISSING_COUNT
+                if missing.any():
+                    # 与 Postgres 行构建的帧一致: 有 NULL 时为带 NaN 的 float64
+                    columns[name] = np.where(missing, np.nan, values)
+                else:
+                    columns[name] = values.astype("int64")
+            else:
+                columns[name] = values.astype("float64")
+        return columns
+
+    def _rows(
+        self, positions
+    ) -> List[Tuple[datetime, str, Optional[float], Optional[int]]]:
+        """(created_at, key ID, score, unique letters) rows.
+
+        NULLs are None, like rows read from Postgres.
+        """
+        ids = self._column("id")
+        rows = []
+        for position in positions:
+            score = float(self._column("score")[position])
+            unique = int(self._column("unique_letters_count")[position])
+            rows.append(
+                (
+                    from_micros(self._column("created_at")[position]),
+                    self._key_id(
+                        int(ids[position]), int(self._column("key_id")[position])
+                    ),
+                    None if math.isnan(score) else score,
+                    None if unique == self.MISSING_COUNT else unique,
+                )
+            )
+        return rows
+
+    def recent(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        limit: int,
+        after: Optional[int] = None,
+        through: Optional[int] = None,
+    ) -> List[Tuple]:
+        """Newest keys by id: (created_at, key ID, score, unique letters)."""
+        return self._rows(self._positions(start, end, after, through)[-limit:][::-1])
+
+    def high_score(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        threshold: float,
+        limit: int,
+        after: Optional[int] = None,
+        through: Optional[int] = None,
+    ) -> List[Tuple]:
+        positions = self._positions(start, end, after, through)
+        positions = positions[self._column("score")[positions] > threshold]
+        # 分数降序, 同分时新的在前
+        order = np.lexsort(
+            (-self._column("id")[positions], -self._column("score")[positions])
+        )
+        return self._rows(positions[order[:limit]])
+
+
+hot_window = HotWindow(enabled=hot_window_config.get("enabled", True))
+change_feed.subscribe(hot_window.on_change)
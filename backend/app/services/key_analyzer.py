@@ -1,14 +1,55 @@
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Sequence, Tuple
 from ..models import KeyInfo
 from datetime import datetime, timedelta
-from sqlalchemy import select
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import DBAPIError
 import pytz
 import json
+import base64
+import asyncio
+import binascii
+import time
+from ..config import current_config
 from ..utils.debug import debug
+from ..utils.lazy import np
+from ..utils.metrics import statistics_step_seconds
 from ..utils.redis import redis_client
+from ..utils.timing import record
+from ..utils.bulkhead import bulkheads, estimate_cost, row_estimator
+from ..utils.deadline import (
+    DeadlineExceeded,
+    apply_statement_timeout,
+    checkpoint,
+    is_statement_timeout,
+)
+from .change_feed import change_feed
+from .compute_backend import (
+    FRAME_COLUMNS,
+    QUALIFIED_THRESHOLD,
+    ComputeBackend,
+    StatisticsCalculator,
+    downsample_trends,
+    get_backend,
+)
+from .fingerprint_index import (
+    InvalidPatternError,
+    compile_pattern,
+    fingerprint_index,
+    normalize_fingerprint,
+)
+from .hot_window import hot_window
+from .rollups import key_rows, key_time_bounds, score_rows, score_totals
+from .score_index import ONE_MICROSECOND, score_index, score_index_config
+from .snapshot_store import SnapshotUnavailable, snapshot_store
+
+pagination_config = current_config.get("pagination", {})
+
+
+class InvalidCursorError(ValueError):
+    pass
 
 
 class TimeRange:
@@ -17,7 +58,9 @@ class TimeRange:
         self.end = end
 
     @classmethod
-    def from_timestamps(cls, start_ms: Optional[int], end_ms: Optional[int]) -> 'TimeRange':
+    def from_timestamps(
+        cls, start_ms: Optional[int], end_ms: Optional[int]
+    ) -> "TimeRange":
         utc = pytz.UTC
         if start_ms is None or end_ms is None:
             return cls(None, None)
@@ -25,101 +68,113 @@ class TimeRange:
         local_tz = pytz.timezone("Asia/Shanghai")
         end = datetime.fromtimestamp(end_ms / 1000).astimezone(local_tz)
         start = datetime.fromtimestamp(start_ms / 1000).astimezone(local_tz)
-        
+
         return cls(start.replace(tzinfo=None), end.replace(tzinfo=None))
 
+    def seconds(self) -> Optional[float]:
+        if self.start is None or self.end is None:
+            return None
+        return (self.end - self.start).total_seconds()
 
-class StatisticsCalculator:
-    NUMERIC_COLUMNS = [
-        "repeat_letter_score",
-        "increasing_letter_score",
-        "decreasing_letter_score",
-        "magic_letter_score",
-        "score",
-        "unique_letters_count",
-    ]
-    
-    SCORE_COLUMNS = [
-        "repeat_letter_score",
-        "increasing_letter_score",
-        "decreasing_letter_score",
-        "magic_letter_score",
-    ]
 
-    @staticmethod
-    def safe_calc(series: pd.Series, func: callable, default: float = 0.0) -> float:
-        try:
-            result = func(series)
-            return default if pd.isna(result) or np.isinf(result) else float(result)
-        except:
-            return default
+class PageCursor:
+    """Opaque keyset position: the sort value and id of the last row on a page."""
 
-    @staticmethod
-    def calculate_trend(current: float, previous: float) -> float:
-        if previous == 0:
-            return 0 if current == 0 else 1
-        try:
-            trend = (current - previous) / previous
-            if pd.isna(trend) or np.isinf(trend):
-                return 0.0
-            return max(min(float(trend), 10.0), -10.0)
-        except:
-            return 0.0
+    def __init__(self, kind: str, value: Any, key_id: int):
+        self.kind = kind
+        self.value = value
+        self.key_id = key_id
 
-    @classmethod
-    def get_score_distribution(cls, df: pd.DataFrame) -> Dict:
-        scores = df["score"].values
-        hist, bins = np.histogram(scores, bins=20)
-
-        stats = {
-            "mean": cls.safe_calc(scores, np.mean),
-            "median": cls.safe_calc(scores, np.median),
-            "std": cls.safe_calc(scores, np.std),
-            "min": cls.safe_calc(scores, np.min),
-            "max": cls.safe_calc(scores, np.max),
-            "q1": cls.safe_calc(scores, lambda x: np.percentile(x, 25)),
-            "q3": cls.safe_calc(scores, lambda x: np.percentile(x, 75)),
-        }
-
-        return {
-            "histogram": hist.tolist(),
-            "bins": bins.tolist(),
-            **stats,
-            "total_count": len(scores),
-            "qualified_count": int(np.sum(scores > 400)),
-        }
-
-    @classmethod
-    def get_correlation_matrix(cls, df: pd.DataFrame) -> Dict:
-        corr_matrix = df.fillna(0).corr().round(3)
-        corr_matrix = corr_matrix.replace([np.inf, -np.inf], 0).fillna(0)
-        return corr_matrix.to_dict()
+    def encode(self) -> str:
+        value = (
+            self.value.isoformat() if isinstance(self.value, datetime) else self.value
+        )
+        raw = json.dumps([self.kind, value, self.key_id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
 
     @classmethod
-    def get_score_types_stats(cls, df: pd.DataFrame) -> Dict:
-        stats = df[cls.SCORE_COLUMNS].fillna(0).describe()
-        return stats.replace([np.inf, -np.inf], 0).fillna(0).to_dict()
+    def decode(cls, token: str, kind: str) -> "PageCursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            token_kind, value, key_id = json.loads(raw)
+            if token_kind != kind or not isinstance(key_id, int):
+                raise ValueError(token_kind)
+            if kind == "created_at":
+                value = datetime.fromisoformat(value)
+            else:
+                value = float(value)
+        except (binascii.Error, ValueError, TypeError) as e:
+            raise InvalidCursorError(f"Invalid {kind} cursor") from e
+        return cls(kind, value, key_id)
 
 
 class KeyAnalyzer:
+    # 变更订阅未连接时的 TTL; 连接时由 change_feed 精确失效, TTL 为 change_feed.cache_ttl
     CACHE_EXPIRY = 300  # 5 minutes
-    HIGH_SCORE_THRESHOLD = 400
+    HIGH_SCORE_THRESHOLD = QUALIFIED_THRESHOLD
+    MAX_SWEEP_THRESHOLDS = score_index_config.get("max_thresholds", 1000)
     DEFAULT_LIMIT = 10
-
-    def __init__(self, db: AsyncSession):
+    PAGE_SIZE = pagination_config.get("default_page_size", DEFAULT_LIMIT)
+    MAX_PAGE_SIZE = pagination_config.get("max_page_size", 100)
+    # Order of the statistics response and of the compute steps
+    STATISTICS_PARTS = (
+        "score_distribution",
+        "correlation_matrix",
+        "summary_stats",
+        "score_types_stats",
+        "trends",
+    )
+    # Ranges ending at least this long ago are treated as immutable
+    PARTIAL_CACHE_SETTLE_SECONDS = 300
+    # Only the columns _format_key_info reads, plus id for the keyset tie-break
+    PAGE_COLUMNS = (
+        KeyInfo.id,
+        KeyInfo.created_at,
+        KeyInfo.fingerprint,
+        KeyInfo.score,
+        KeyInfo.unique_letters_count,
+    )
+
+    def __init__(self, db: AsyncSession, backend: Optional[ComputeBackend] = None):
         self.db = db
         self.utc = pytz.UTC
+        self.backend = backend or get_backend()
+        # 计算所依据数据的变更订阅位置, 写缓存时检查其后区间是否有变化
+        self.position = change_feed.position()
+
+    def _cache(
+        self,
+        cache_key: str,
+        value: Any,
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ):
+        change_feed.store(
+            cache_key, value, start, end, self.position, self.CACHE_EXPIRY
+        )
 
     def _format_key_info(self, key: KeyInfo) -> Dict:
-        created_at = key.created_at if key.created_at else datetime.now()
+        key_id = key.fingerprint.upper()[24:40] if key.fingerprint else "N/A"
+        return self._format_fields(
+            key.created_at, key_id, key.score, key.unique_letters_count
+        )
+
+    @staticmethod
+    def _format_fields(
+        created_at: Optional[datetime],
+        key_id: str,
+        score: Optional[float],
+        unique_letters_count: Optional[int],
+    ) -> Dict:
+        created_at = created_at if created_at else datetime.now()
         if created_at.tzinfo is None:
             local_tz = pytz.timezone("Asia/Shanghai")
             created_at = local_tz.localize(created_at)
         return {
             "created_at": created_at.strftime("%Y-%m-%d %H:%M"),
-            "fingerprint": key.fingerprint.upper()[24:40] if key.fingerprint else "N/A",
-            "score": key.score or 0,
-            "unique_letters_count": key.unique_letters_count or 0,
+            "fingerprint": key_id,
+            "score": score or 0,
+            "unique_letters_count": unique_letters_count or 0,
         }
 
     async def get_recent_keys(
@@ -127,19 +182,35 @@ class KeyAnalyzer:
     ) -> List[Dict]:
         cache_key = f"recent_keys:{start_time}:{end_time}"
         if cached_data := redis_client.get(cache_key):
-            debug.log("Recent keys cache hit")
+            debug.sample("cache_hit", "Recent keys cache hit")
             return cached_data
 
-        debug.log(f"Recent keys cache miss")
+        debug.sample("cache_miss", "Recent keys cache miss")
+        self.position = change_feed.position()
         time_range = TimeRange.from_timestamps(start_time, end_time)
-        
+        # 不限时间时不用热窗口: 补录的历史或无时间的 key 不在窗口中, 却可能有最大的 id
+        if hot_window.covers(time_range.start, time_range.end):
+            self.position = min(self.position, hot_window.position)
+            formatted_results = [
+                self._format_fields(*row)
+                for row in hot_window.recent(
+                    time_range.start, time_range.end, self.DEFAULT_LIMIT
+                )
+            ]
+            self._cache(cache_key, formatted_results, time_range.start, time_range.end)
+            return formatted_results
+
         query = select(KeyInfo).order_by(KeyInfo.id.desc())
         if time_range.start is not None and time_range.end is not None:
-            query = query.where(KeyInfo.created_at.between(time_range.start, time_range.end))
-        
+            query = query.where(
+                KeyInfo.created_at.between(time_range.start, time_range.end)
+            )
+
         result = await self.db.execute(query.limit(self.DEFAULT_LIMIT))
-        formatted_results = [self._format_key_info(key) for key in result.scalars().all()]
-        redis_client.set(cache_key, formatted_results, ttl=self.CACHE_EXPIRY)
+        formatted_results = [
+            self._format_key_info(key) for key in result.scalars().all()
+        ]
+        self._cache(cache_key, formatted_results, time_range.start, time_range.end)
         return formatted_results
 
     async def get_high_score_keys(
@@ -147,164 +218,587 @@ class KeyAnalyzer:
     ) -> List[Dict]:
         cache_key = f"high_score_keys:{start_time}:{end_time}"
         if cached_data := redis_client.get(cache_key):
-            debug.log("High score keys cache hit")
+            debug.sample("cache_hit", "High score keys cache hit")
             return cached_data
 
-        debug.log("High score keys cache miss")
-        query = select(KeyInfo).where(KeyInfo.score > self.HIGH_SCORE_THRESHOLD)
-
+        debug.sample("cache_miss", "High score keys cache miss")
+        self.position = change_feed.position()
         time_range = TimeRange.from_timestamps(start_time, end_time)
+        if hot_window.covers(time_range.start, time_range.end):
+            self.position = min(self.position, hot_window.position)
+            formatted_results = [
+                self._format_fields(*row)
+                for row in hot_window.high_score(
+                    time_range.start,
+                    time_range.end,
+                    self.HIGH_SCORE_THRESHOLD,
+                    self.DEFAULT_LIMIT,
+                )
+            ]
+            self._cache(cache_key, formatted_results, time_range.start, time_range.end)
+            return formatted_results
+
+        query = select(KeyInfo).where(KeyInfo.score > self.HIGH_SCORE_THRESHOLD)
         if time_range.start is not None and time_range.end is not None:
-            query = query.where(KeyInfo.created_at.between(time_range.start, time_range.end))
+            query = query.where(
+                KeyInfo.created_at.between(time_range.start, time_range.end)
+            )
 
-        result = await self.db.execute(query.order_by(KeyInfo.score.desc()).limit(self.DEFAULT_LIMIT))
-        formatted_results = [self._format_key_info(key) for key in result.scalars().all()]
-        redis_client.set(cache_key, formatted_results, ttl=self.CACHE_EXPIRY)
+        result = await self.db.execute(
+            query.order_by(KeyInfo.score.desc()).limit(self.DEFAULT_LIMIT)
+        )
+        formatted_results = [
+            self._format_key_info(key) for key in result.scalars().all()
+        ]
+        self._cache(cache_key, formatted_results, time_range.start, time_range.end)
         return formatted_results
 
-    async def _get_dataframe(self, time_range: TimeRange) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        current_query = select(KeyInfo)
+    async def get_recent_keys_page(
+        self,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return await self._get_keys_page(
+            KeyInfo.created_at,
+            cursor,
+            limit,
+            TimeRange.from_timestamps(start_time, end_time),
+        )
+
+    async def get_high_score_keys_page(
+        self,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return await self._get_keys_page(
+            KeyInfo.score,
+            cursor,
+            limit,
+            TimeRange.from_timestamps(start_time, end_time),
+            KeyInfo.score > self.HIGH_SCORE_THRESHOLD,
+        )
+
+    async def _get_keys_page(
+        self,
+        sort_column,
+        cursor: Optional[str],
+        limit: Optional[int],
+        time_range: TimeRange,
+        *filters,
+    ) -> Dict[str, Any]:
+        # Keyset pagination: every page is an index range scan on (sort_column, id)
+        # that starts right after the previous page, so page N costs the same as page 1.
+        page_size = max(1, min(limit or self.PAGE_SIZE, self.MAX_PAGE_SIZE))
+        kind = sort_column.key
+
+        query = select(*self.PAGE_COLUMNS).where(sort_column.isnot(None), *filters)
         if time_range.start is not None and time_range.end is not None:
-            current_query = current_query.where(
+            query = query.where(
                 KeyInfo.created_at.between(time_range.start, time_range.end)
             )
-        result = await self.db.execute(current_query)
-        
-        current_df = pd.DataFrame([{
-                    "id": row.id,
-            "created_at": row.created_at,
-                    "fingerprint": row.fingerprint,
-                    "repeat_letter_score": row.repeat_letter_score,
-                    "increasing_letter_score": row.increasing_letter_score,
-                    "decreasing_letter_score": row.decreasing_letter_score,
-                    "magic_letter_score": row.magic_letter_score,
-                    "score": row.score,
-                    "unique_letters_count": row.unique_letters_count,
-        } for row in result.scalars().all()])
-
-        if current_df.empty:
-            return current_df, current_df
+        if cursor:
+            after = PageCursor.decode(cursor, kind)
+            query = query.where(
+                tuple_(sort_column, KeyInfo.id) < tuple_(after.value, after.key_id)
+            )
 
-        if time_range.start is not None and time_range.end is not None:
-            previous_start = time_range.start - (time_range.end - time_range.start)
-            previous_query = select(KeyInfo).where(
-                KeyInfo.created_at.between(previous_start, time_range.start)
+        query = query.order_by(sort_column.desc(), KeyInfo.id.desc()).limit(
+            page_size + 1
+        )
+        rows = (await self.db.execute(query)).all()
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = PageCursor(kind, getattr(last, kind), last.id).encode()
+
+        return {
+            "items": [self._format_key_info(row) for row in rows],
+            "next_cursor": next_cursor,
+            "limit": page_size,
+        }
+
+    async def search_fingerprints(
+        self, pattern: str, mode: str = "contains", limit: Optional[int] = None
+    ) -> List[Dict]:
+        page_size = max(1, min(limit or self.PAGE_SIZE, self.MAX_PAGE_SIZE))
+        normalized = (
+            normalize_fingerprint(pattern) if mode != "regex" else pattern.strip()
+        )
+        if not normalized or len(normalized) > 64:
+            raise InvalidPatternError("Pattern must be between 1 and 64 characters")
+
+        fingerprint = func.upper(KeyInfo.fingerprint)
+        escaped = normalized.replace("/", "//").replace("%", "/%").replace("_", "/_")
+        if mode == "contains":
+            if len(normalized) < 3:
+                raise InvalidPatternError("Contains search needs at least 3 characters")
+            condition = fingerprint.like(f"%{escaped}%", escape="/")
+        elif mode == "suffix":
+            if (
+                fingerprint_index.ready
+                and len(normalized) <= fingerprint_index.KEY_ID_LENGTH
+            ):
+                return await self._fetch_by_ids(
+                    fingerprint_index.search_suffix(normalized, page_size)
+                )
+            condition = fingerprint.like(f"%{escaped}", escape="/")
+        elif mode == "regex":
+            compile_pattern(normalized)
+            if fingerprint_index.ready:
+                # 无字面量的模式要扫描整个索引, 放到线程里执行, 不阻塞事件循环
+                row_ids = await asyncio.to_thread(
+                    fingerprint_index.search_regex, normalized, page_size
+                )
+                return await self._fetch_by_ids(row_ids)
+            # Index still warming up: compile_pattern limits patterns to the subset
+            # Postgres evaluates the same way, so the key-ID semantics match
+            condition = func.substr(fingerprint, 25, 16).regexp_match(
+                normalized, flags="i"
             )
-            result = await self.db.execute(previous_query)
-            previous_df = pd.DataFrame([{
-                        "id": row.id,
-                        "created_at": row.created_at,
-                        "fingerprint": row.fingerprint,
-                        "repeat_letter_score": row.repeat_letter_score,
-                        "increasing_letter_score": row.increasing_letter_score,
-                        "decreasing_letter_score": row.decreasing_letter_score,
-                        "magic_letter_score": row.magic_letter_score,
-                        "score": row.score,
-                        "unique_letters_count": row.unique_letters_count,
-            } for row in result.scalars().all()])
         else:
-            previous_df = current_df
+            raise InvalidPatternError(f"Unsupported search mode: {mode}")
 
-        return current_df, previous_df
-
-    def _calculate_trends(self, df: pd.DataFrame, time_range: TimeRange) -> Dict[str, Any]:
-        local_tz = pytz.timezone("Asia/Shanghai")
+        query = select(*self.PAGE_COLUMNS).where(condition)
+        result = await self.db.execute(
+            query.order_by(KeyInfo.id.desc()).limit(page_size)
+        )
+        return [self._format_key_info(row) for row in result.all()]
+
+    async def _fetch_by_ids(self, row_ids: List[int]) -> List[Dict]:
+        if not row_ids:
+            return []
+        query = select(*self.PAGE_COLUMNS).where(KeyInfo.id.in_(row_ids))
+        result = await self.db.execute(query.order_by(KeyInfo.id.desc()))
+        return [self._format_key_info(row) for row in result.all()]
+
+    async def _execute_within_deadline(self, query):
+        # statement_timeout = 请求剩余时间, 客户端放弃后查询不会继续占用连接
+        await apply_statement_timeout(self.db, "statistics query")
+        try:
+            return await self.db.execute(query)
+        except DBAPIError as e:
+            if is_statement_timeout(e):
+                raise DeadlineExceeded(
+                    "Statistics query exceeded the request deadline"
+                ) from e
+            raise
+
+    def _frame(self, build, source) -> Any:
+        started = time.perf_counter()
+        frame = build(source)
+        elapsed = time.perf_counter() - started
+        statistics_step_seconds.labels(step="dataframe").observe(elapsed)
+        record("dataframe", elapsed)
+        return frame
+
+    def _rows_frame(self, rows) -> Any:
+        return self.backend.frame(
+            {name: [getattr(row, name) for row in rows] for name in FRAME_COLUMNS}
+        )
 
-        if time_range.start is None or time_range.end is None:
-            if df.empty:
-                return {
-                    "time_format": "YYYY-MM-DD HH:mm",
-                    "avg_scores": [],
-                    "max_scores": [],
-                    "counts": [],
-                }
-            
-            df["created_at"] = pd.to_datetime(df["created_at"])
-            start_time = df["created_at"].min()
-            end_time = df["created_at"].max()
+    async def _load(self, start: Optional[datetime], end: Optional[datetime]) -> Any:
+        # 最近的区间直接由内存热窗口构建
+        if hot_window.covers(start, end):
+            self.position = min(self.position, hot_window.position)
+            return self._frame(self.backend.frame, hot_window.columns(start, end))
+        # 已封存的历史日期从 Parquet 快照读取 (DuckDB), 只有未封存的部分查询 Postgres
+        frames = []
+        boundary = (
+            snapshot_store.covered_until(start) if snapshot_store.enabled else None
+        )
+        if boundary is not None:
+            started = time.perf_counter()
+            try:
+                table = await asyncio.to_thread(
+                    snapshot_store.read, start, end, boundary
+                )
+            except SnapshotUnavailable as e:
+                debug.error("Snapshot read failed, using Postgres: %s", e)
+                boundary = None
+            else:
+                elapsed = time.perf_counter() - started
+                statistics_step_seconds.labels(step="snapshot").observe(elapsed)
+                record("snapshot", elapsed)
+                frames.append(self._frame(self.backend.from_arrow, table))
+                if end is not None and end < boundary:
+                    return frames[0]
+                await checkpoint("open day query")
+
+        # 保留任务折叠的 key 与原始行一起读取
+        if boundary is not None:
+            query = key_rows(FRAME_COLUMNS, boundary, end)
+        elif start is not None and end is not None:
+            query = key_rows(FRAME_COLUMNS, start, end)
         else:
-            end_time = time_range.end.replace(minute=0, second=0, microsecond=0)
-            start_time = time_range.start.replace(minute=0, second=0, microsecond=0)
-            
-            end_time = local_tz.localize(end_time)
-            start_time = local_tz.localize(start_time)
-        
-        time_delta = end_time - start_time
-
-        freq = "D" if time_delta.days > 30 else "6h" if time_delta.days > 7 else "h"
-        time_format = "%Y-%m-%d %H:%M" if freq in ["h", "6h"] else "%Y-%m-%d"
-
-        df["created_at"] = pd.to_datetime(df["created_at"])
-        if df["created_at"].dt.tz is None:
-            df["created_at"] = df["created_at"].apply(lambda x: local_tz.localize(x))
+            query = key_rows(FRAME_COLUMNS)
+        result = await self._execute_within_deadline(query)
+        frames.append(self._frame(self._rows_frame, result.all()))
+        return self.backend.concat(frames)
+
+    async def _load_scores(
+        self, start: datetime, end: datetime, threshold: float = float("-inf")
+    ) -> Tuple[Any, Any, set]:
+        """created_at (datetime64[ns]) and score arrays of the keys in ``[start, end]``.
+
+        The keys are in no particular order.
+
+        Keys without a score get -inf: counted in the total, never qualified.
+        Folded hours whose scores are all at most ``threshold`` are read from
+        their key counts as -inf scores at the start of the hour; they are
+        returned as the third value and only valid for thresholds from
+        ``threshold`` up.
+        """
+        parts = []
+        summarized: set = set()
+        if hot_window.covers(start, end):
+            self.position = min(self.position, hot_window.position)
+            columns = hot_window.columns(start, end, names=("created_at", "score"))
+            parts.append((columns["created_at"], columns["score"]))
         else:
-            df["created_at"] = df["created_at"].dt.tz_convert(local_tz)
+            boundary = (
+                snapshot_store.covered_until(start) if snapshot_store.enabled else None
+            )
+            if boundary is not None:
+                try:
+                    table = await asyncio.to_thread(
+                        snapshot_store.read,
+                        start,
+                        end,
+                        boundary,
+                        ("created_at", "score"),
+                    )
+                except SnapshotUnavailable as e:
+                    debug.error("Snapshot read failed, using Postgres: %s", e)
+                    boundary = None
+                else:
+                    parts.append(
+                        (
+                            table.column("created_at")
+                            .to_numpy()
+                            .astype("datetime64[ns]"),
+                            table.column("score")
+                            .to_numpy(zero_copy_only=False)
+                            .astype("float64"),
+                        )
+                    )
+            if boundary is None or end >= boundary:
+                query = score_rows(boundary or start, end, threshold)
+                rows = (await self._execute_within_deadline(query)).all()
+                weights = np.array([row[2] for row in rows], dtype="int64")
+                parts.append(
+                    (
+                        np.repeat(
+                            np.array([row[0] for row in rows], dtype="datetime64[ns]"),
+                            weights,
+                        ),
+                        np.repeat(
+                            np.array([row[1] for row in rows], dtype="float64"), weights
+                        ),
+                    )
+                )
+                summarized = {row[0] for row in rows if row[3]}
+        created_at = np.concatenate([part[0] for part in parts])
+        scores = np.concatenate([part[1] for part in parts])
+        scores[np.isnan(scores)] = -np.inf
+        return created_at, scores, summarized
+
+    async def _load_summary(
+        self, start: datetime, end: datetime, threshold: float
+    ) -> Dict[str, float]:
+        """``backend.score_summary`` of the keys in ``[start, end]``.
+
+        No frame is built.
+
+        Postgres answers with ``score_totals``, so whole folded hours are read
+        from their aggregates instead of expanding their arrays.
+        """
+        # (key 数, 有分数的 key 数, 分数之和, 最大分数, 合格数)
+        totals = []
+
+        def add(scores):
+            scored = scores[~np.isnan(scores)]
+            totals.append(
+                (
+                    len(scores),
+                    len(scored),
+                    float(scored.sum()),
+                    float(scored.max()) if len(scored) else None,
+                    int((scored > threshold).sum()),
+                )
+            )
 
-        df = df.set_index("created_at")
-        hourly_stats = (
-            df.groupby(pd.Grouper(freq=freq))
-            .agg({"score": ["mean", "max", "count"]})
-            .fillna(0)
-        )
+        if hot_window.covers(start, end):
+            self.position = min(self.position, hot_window.position)
+            add(hot_window.columns(start, end, names=("score",))["score"])
+        else:
+            boundary = (
+                snapshot_store.covered_until(start) if snapshot_store.enabled else None
+            )
+            if boundary is not None:
+                try:
+                    table = await asyncio.to_thread(
+                        snapshot_store.read, start, end, boundary, ("score",)
+                    )
+                except SnapshotUnavailable as e:
+                    debug.error("Snapshot read failed, using Postgres: %s", e)
+                    boundary = None
+                else:
+                    add(
+                        table.column("score")
+                        .to_numpy(zero_copy_only=False)
+                        .astype("float64")
+                    )
+            if boundary is None or end >= boundary:
+                row = (
+                    await self._execute_within_deadline(
+                        score_totals(boundary or start, end, threshold)
+                    )
+                ).one()
+                totals.append(
+                    (int(row[0]), int(row[1]), float(row[2]), row[3], int(row[4]))
+                )
+
+        count = sum(part[0] for part in totals)
+        scored = sum(part[1] for part in totals)
+        highest = [part[3] for part in totals if part[3] is not None]
+        return {
+            "mean": sum(part[2] for part in totals) / scored if scored else 0.0,
+            "max": float(max(highest)) if highest else 0.0,
+            "count": count,
+            "qualified_rate": sum(part[4] for part in totals) / max(count, 1),
+        }
+
+    async def get_threshold_sweep(
+        self,
+        thresholds: Sequence[float],
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Qualified counts and rates (score > threshold) for every threshold.
 
+        The range is read in one pass.
+        """
+        self.position = change_feed.position()
+        time_range = TimeRange.from_timestamps(start_time, end_time)
+        start, end = time_range.start, time_range.end
+        if start is None or end is None:
+            # 不限时间: 从最早到最新的 key
+            start, end = (await self.db.execute(key_time_bounds())).one()
+
+        pieces = score_index.pieces(start, end) if start is not None else []
+        sorted_scores: List[Any] = [
+            score_index.get(piece.hour) if piece.hour else None for piece in pieces
+        ]
+        missing = [
+            index for index, scores in enumerate(sorted_scores) if scores is None
+        ]
+        score_index.record(len(pieces) - len(missing), len(missing))
+        if missing:
+            # 连续缺失的小时合并为一次读取
+            runs: List[List[int]] = []
+            for index in missing:
+                if runs and runs[-1][-1] == index - 1:
+                    runs[-1].append(index)
+                else:
+                    runs.append([index])
+            bulkhead = bulkheads["statistics"]
+            width = sum(
+                (pieces[index].end - pieces[index].start).total_seconds()
+                for index in missing
+            )
+            lowest = min(thresholds, default=float("-inf"))
+            async with bulkhead.admit(estimate_cost(bulkhead, width)):
+                for run in runs:
+                    await checkpoint("score index load")
+                    created_at, scores, summarized = await self._load_scores(
+                        pieces[run[0]].start,
+                        pieces[run[-1]].end - ONE_MICROSECOND,
+                        lowest,
+                    )
+                    order = np.argsort(created_at, kind="stable")
+                    created_at, scores = created_at[order], scores[order]
+                    edges = np.array(
+                        [pieces[index].start for index in run] + [pieces[run[-1]].end],
+                        dtype="datetime64[ns]",
+                    )
+                    bounds = np.searchsorted(created_at, edges, side="left")
+                    for offset, index in enumerate(run):
+                        piece_scores = np.sort(
+                            scores[bounds[offset] : bounds[offset + 1]]
+                        )
+                        sorted_scores[index] = piece_scores
+                        # 由聚合得出的小时只对不低于 lowest 的合格线有效, 不放入索引
+                        if (
+                            pieces[index].hour is not None
+                            and pieces[index].hour not in summarized
+                        ):
+                            score_index.put(
+                                pieces[index].hour, piece_scores, self.position
+                            )
+
+        total, counts = score_index.sweep(sorted_scores, thresholds)
         return {
-            "time_format": f"YYYY-MM-DD HH:mm" if freq in ["h", "6h"] else "YYYY-MM-DD",
-            "avg_scores": [
+            "total_count": total,
+            "thresholds": [
                 {
-                    "time": idx.strftime(time_format),
-                    "value": round(float(row[("score", "mean")]), 2)
+                    "threshold": threshold,
+                    "qualified_count": int(count),
+                    "qualified_rate": int(count) / max(total, 1),
                 }
-                for idx, row in hourly_stats.iterrows()
-                if not pd.isna(row[("score", "mean")])
+                for threshold, count in zip(thresholds, counts.tolist())
             ],
-            "max_scores": [
-                {
-                    "time": idx.strftime(time_format),
-                    "value": round(float(row[("score", "max")]), 2)
-                }
-                for idx, row in hourly_stats.iterrows()
-                if not pd.isna(row[("score", "max")])
-            ],
-            "counts": [
-                {
-                    "time": idx.strftime(time_format),
-                    "value": int(row[("score", "count")])
-                }
-                for idx, row in hourly_stats.iterrows()
-                if not pd.isna(row[("score", "count")])
-            ]
         }
 
+    async def _get_dataframe(
+        self,
+        time_range: TimeRange,
+        include_previous: bool = True,
+        threshold: float = HIGH_SCORE_THRESHOLD,
+    ) -> Tuple[Any, Optional[Dict[str, float]]]:
+        """The current period's frame and the previous period's score summary.
+
+        The summary is None unless ``include_previous`` is set.
+        """
+        current_df = await self._load(time_range.start, time_range.end)
+
+        if len(current_df) == 0 or not include_previous:
+            return current_df, None
+
+        await checkpoint("previous period query")
+        if time_range.start is not None and time_range.end is not None:
+            # 上一周期只用于环比, 由可合并的聚合得出, 不构建 DataFrame
+            previous_start = time_range.start - (time_range.end - time_range.start)
+            previous_stats = await self._load_summary(
+                previous_start, time_range.start, threshold
+            )
+        else:
+            previous_stats = self.backend.score_summary(current_df, threshold)
+
+        return current_df, previous_stats
+
     async def get_statistics(
-        self, start_time: Optional[int] = None, end_time: Optional[int] = None
+        self,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        max_points: Optional[int] = None,
+        threshold: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        threshold = self.HIGH_SCORE_THRESHOLD if threshold is None else float(threshold)
+        result = await self._get_statistics(start_time, end_time, threshold)
+        # 缓存完整的趋势, 降采样在响应时进行, 各种 max_points 共用一份缓存
+        return {**result, "trends": downsample_trends(result["trends"], max_points)}
+
+    async def _get_statistics(
+        self, start_time: Optional[int], end_time: Optional[int], threshold: float
     ) -> Dict[str, Any]:
-        cache_key = f"statistics:{start_time}:{end_time}"
+        # v2: 趋势序列改为并行数组, 旧格式的缓存不再读取
+        cache_key = f"statistics:v2:{start_time}:{end_time}"
+        if threshold != self.HIGH_SCORE_THRESHOLD:
+            # 合格数与合格率随合格线变化; 默认合格线沿用原来的缓存键
+            cache_key += f":t{threshold!r}"
         if cached_data := redis_client.get(cache_key):
-            debug.log("Statistics cache hit")
+            debug.sample("cache_hit", "Statistics cache hit")
             return cached_data
 
-        debug.log("Statistics cache miss")
+        debug.sample("cache_miss", "Statistics cache miss")
+        self.position = change_feed.position()
         time_range = TimeRange.from_timestamps(start_time, end_time)
-        current_df, previous_df = await self._get_dataframe(time_range)
+        # 当前与上一周期各扫描一次, 按两倍区间估算成本
+        bulkhead = bulkheads["statistics"]
+        width = time_range.seconds()
+        async with bulkhead.admit(estimate_cost(bulkhead, width and width * 2)):
+            return await self._compute_statistics(cache_key, time_range, threshold)
+
+    def _partial_cache_key(
+        self, cache_key: str, time_range: TimeRange
+    ) -> Optional[str]:
+        # 只有已结束的历史区间数据不再变化, 分步结果才能安全地拼接复用
+        if time_range.end is None:
+            return None
+        local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+        if time_range.end > local_now - timedelta(
+            seconds=self.PARTIAL_CACHE_SETTLE_SECONDS
+        ):
+            return None
+        return f"{cache_key}:part"
+
+    async def _compute_statistics(
+        self, cache_key: str, time_range: TimeRange, threshold: float
+    ) -> Dict[str, Any]:
+        part_key = self._partial_cache_key(cache_key, time_range)
+        # 汇总的环比依赖上一周期, 缓存失效按两个周期的范围判断
+        depends_from = time_range.start
+        if time_range.start is not None and time_range.end is not None:
+            depends_from = time_range.start - (time_range.end - time_range.start)
+        parts: Dict[str, Any] = {}
+        if part_key:
+            for name in self.STATISTICS_PARTS:
+                cached_part = redis_client.get(f"{part_key}:{name}")
+                if cached_part is not None:
+                    parts[name] = cached_part
+            if parts:
+                debug.log("Statistics partial cache hit: %s", sorted(parts))
+
+        current_df, previous_stats = await self._get_dataframe(
+            time_range,
+            include_previous="summary_stats" not in parts,
+            threshold=threshold,
+        )
+        if time_range.seconds():
+            row_estimator.observe(len(current_df), time_range.seconds())
 
-        if current_df.empty:
+        if len(current_df) == 0:
             return self._get_empty_statistics()
 
-        current_stats = {
-            "mean": StatisticsCalculator.safe_calc(current_df["score"], lambda x: x.mean()),
-            "max": StatisticsCalculator.safe_calc(current_df["score"], lambda x: x.max()),
-            "count": len(current_df),
-            "qualified_rate": len(current_df[current_df["score"] > self.HIGH_SCORE_THRESHOLD]) / max(len(current_df), 1),
+        steps = {
+            "summary_stats": lambda: self._summary_from(
+                self.backend.score_summary(current_df, threshold), previous_stats
+            ),
+            "score_distribution": lambda: self.backend.score_distribution(
+                current_df, threshold
+            ),
+            "correlation_matrix": lambda: self.backend.correlation_matrix(current_df),
+            "score_types_stats": lambda: self.backend.score_types_stats(current_df),
+            "trends": lambda: self.backend.trends(current_df, time_range),
         }
+        for name in self.STATISTICS_PARTS:
+            if name in parts:
+                continue
+            # 每步之间让出事件循环: 客户端断开时取消在这里生效
+            await checkpoint(name)
+            started = time.perf_counter()
+            parts[name] = steps[name]()
+            elapsed = time.perf_counter() - started
+            statistics_step_seconds.labels(step=name).observe(elapsed)
+            record(name, elapsed)
+            if part_key:
+                self._cache(
+                    f"{part_key}:{name}", parts[name], depends_from, time_range.end
+                )
+
+        result = {name: parts[name] for name in self.STATISTICS_PARTS}
+        self._cache(cache_key, result, depends_from, time_range.end)
+        return result
 
-        previous_stats = {
-            "mean": StatisticsCalculator.safe_calc(previous_df["score"], lambda x: x.mean()),
-            "max": StatisticsCalculator.safe_calc(previous_df["score"], lambda x: x.max()),
-            "count": len(previous_df),
-            "qualified_rate": len(previous_df[previous_df["score"] > self.HIGH_SCORE_THRESHOLD]) / max(len(previous_df), 1),
-        }
+    def _summary_stats(
+        self, current_df: Any, previous_df: Any, threshold: float = HIGH_SCORE_THRESHOLD
+    ) -> Dict[str, Any]:
+        return self._summary_from(
+            self.backend.score_summary(current_df, threshold),
+            self.backend.score_summary(previous_df, threshold),
+        )
 
-        summary_stats = {
+    @staticmethod
+    def _summary_from(
+        current_stats: Dict[str, float], previous_stats: Dict[str, float]
+    ) -> Dict[str, Any]:
+        return {
             "score": {
                 "mean": round(float(current_stats["mean"]), 1),
                 "max": round(float(current_stats["max"]), 1),
@@ -325,35 +819,34 @@ class KeyAnalyzer:
             }
         }
 
-        numeric_df = current_df[StatisticsCalculator.NUMERIC_COLUMNS]
-        result = {
-            "score_distribution": StatisticsCalculator.get_score_distribution(current_df),
-            "correlation_matrix": StatisticsCalculator.get_correlation_matrix(numeric_df),
-            "summary_stats": summary_stats,
-            "score_types_stats": StatisticsCalculator.get_score_types_stats(current_df),
-            "trends": self._calculate_trends(current_df, time_range),
-        }
-
-        redis_client.set(cache_key, result, ttl=self.CACHE_EXPIRY)
-        return result
-
     def _get_empty_statistics(self) -> Dict[str, Any]:
         return {
             "score_distribution": {
-                "histogram": [], "bins": [], "mean": 0, "median": 0,
-                "std": 0, "min": 0, "max": 0, "q1": 0, "q3": 0,
-                "total_count": 0, "qualified_count": 0,
+                "histogram": [],
+                "bins": [],
+                "mean": 0,
+                "median": 0,
+                "std": 0,
+                "min": 0,
+                "max": 0,
+                "q1": 0,
+                "q3": 0,
+                "total_count": 0,
+                "qualified_count": 0,
             },
             "correlation_matrix": {},
             "summary_stats": {
                 "score": {
-                    "mean": 0, "max": 0, "count": 0, "qualified_rate": 0,
-                    "mean_trend": 0, "max_trend": 0, "count_trend": 0, "qualified_trend": 0,
+                    "mean": 0,
+                    "max": 0,
+                    "count": 0,
+                    "qualified_rate": 0,
+                    "mean_trend": 0,
+                    "max_trend": 0,
+                    "count_trend": 0,
+                    "qualified_trend": 0,
                 }
             },
             "score_types_stats": {},
-            "trends": {
-                "time_format": "YYYY-MM-DD HH:mm",
-                "avg_scores": [], "max_scores": [], "counts": [],
-            },
+            "trends": self.backend._empty_trends(),
         }
@@ -0,0 +1,206 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+import anyio
+import pytz
+from sqlalchemy import literal_column, select
+
+from ..config import current_config
+from ..database import replica_router
+from ..models import KeyInfo
+from ..utils.debug import debug
+from .key_analyzer import TimeRange
+from .rollups import key_rows
+
+export_config = current_config.get("export", {})
+
+EXPORT_COLUMNS = (
+    KeyInfo.id,
+    KeyInfo.created_at,
+    KeyInfo.fingerprint,
+    KeyInfo.repeat_letter_score,
+    KeyInfo.increasing_letter_score,
+    KeyInfo.decreasing_letter_score,
+    KeyInfo.magic_letter_score,
+    KeyInfo.score,
+    KeyInfo.unique_letters_count,
+)
+FIELD_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+
+class ExportFormatError(ValueError):
+    pass
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands buffered bytes back on drain()."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class _CsvEncoder:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(FIELD_NAMES)
+
+    def encode(self, rows) -> bytes:
+        self._writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in rows
+        )
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def close(self) -> bytes:
+        return self.encode([])
+
+
+class _NdjsonEncoder:
+    def encode(self, rows) -> bytes:
+        return "".join(
+            json.dumps(dict(row._mapping), default=datetime.isoformat) + "\n"
+            for row in rows
+        ).encode()
+
+    def close(self) -> bytes:
+        return b""
+
+
+class _ParquetEncoder:
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("id", pa.int64()),
+                ("created_at", pa.timestamp("us")),
+                ("fingerprint", pa.string()),
+                ("repeat_letter_score", pa.float64()),
+                ("increasing_letter_score", pa.float64()),
+                ("decreasing_letter_score", pa.float64()),
+                ("magic_letter_score", pa.float64()),
+                ("score", pa.float64()),
+                ("unique_letters_count", pa.int32()),
+            ]
+        )
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+
+    def encode(self, rows) -> bytes:
+        # One cursor partition becomes exactly one row group
+        columns = list(zip(*rows)) if rows else [[] for _ in FIELD_NAMES]
+        table = self._pa.Table.from_arrays(
+            [
+                self._pa.array(values, type=field.type)
+                for values, field in zip(columns, self._schema)
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_table(table, row_group_size=max(len(rows), 1))
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+class KeyExporter:
+    BATCH_SIZE = export_config.get("batch_size", 10000)
+    FORMATS: Dict[str, tuple] = {
+        "csv": ("text/csv", _CsvEncoder),
+        "ndjson": ("application/x-ndjson", _NdjsonEncoder),
+        "parquet": ("application/vnd.apache.parquet", _ParquetEncoder),
+    }
+
+    def __init__(self, fmt: str, time_range: TimeRange, include_folded: bool = False):
+        if fmt not in self.FORMATS:
+            raise ExportFormatError(f"Unsupported export format: {fmt}")
+        self.fmt = fmt
+        self.time_range = time_range
+        # 连同保留任务折叠的 key 一起导出 (id 与指纹为空), 用于需要完整统计的快照
+        self.include_folded = include_folded
+        self.media_type, encoder_class = self.FORMATS[fmt]
+        try:
+            self.encoder = encoder_class()
+        except ImportError as e:
+            raise ExportFormatError(f"{fmt} export is not available: {e}") from e
+
+    @property
+    def filename(self) -> str:
+        start = (
+            self.time_range.start.strftime("%Y%m%d%H%M")
+            if self.time_range.start
+            else "all"
+        )
+        end = (
+            self.time_range.end.strftime("%Y%m%d%H%M") if self.time_range.end else "now"
+        )
+        return f"key_infos_{start}_{end}.{self.fmt}"
+
+    def _query(self):
+        bounded = self.time_range.start is not None and self.time_range.end is not None
+        if self.include_folded:
+            query = key_rows(
+                FIELD_NAMES,
+                *((self.time_range.start, self.time_range.end) if bounded else ()),
+            )
+            query = query.order_by(literal_column("created_at"), literal_column("id"))
+            return query.execution_options(yield_per=self.BATCH_SIZE)
+        query = select(*EXPORT_COLUMNS).order_by(KeyInfo.created_at, KeyInfo.id)
+        if bounded:
+            query = query.where(
+                KeyInfo.created_at.between(self.time_range.start, self.time_range.end)
+            )
+        return query.execution_options(yield_per=self.BATCH_SIZE)
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        # The session is owned by the generator rather than a request dependency so
+        # its lifetime matches the response body. AsyncSession.stream() runs the
+        # query through an asyncpg server-side cursor; only one partition of
+        # BATCH_SIZE rows is held in memory at a time.
+        encoder = self.encoder
+        end_ms = None
+        if self.time_range.end is not None:
+            local_end = pytz.timezone("Asia/Shanghai").localize(self.time_range.end)
+            end_ms = int(local_end.timestamp() * 1000)
+        db = replica_router.session_factory(end_ms)()
+        exported = 0
+        try:
+            result = await db.stream(self._query())
+            async for partition in result.partitions():
+                exported += len(partition)
+                yield encoder.encode(partition)
+            yield encoder.close()
+            debug.log("Exported %s keys as %s", exported, self.fmt)
+        except BaseException:
+            debug.warn("Export aborted after %s keys", exported)
+            raise
+        finally:
+            # A client disconnect cancels the response task; closing the session
+            # must not be cancelled itself or the cursor and connection leak.
+            with anyio.CancelScope(shield=True):
+                await db.close()
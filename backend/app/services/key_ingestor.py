@@ -0,0 +1,183 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pytz
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import current_config
+from ..models import ArchivedFingerprint, KeyInfo, normalized_fingerprint
+from ..utils.bloom import create_bloom_filter
+from ..utils.debug import debug
+from ..utils.metrics import key_ingest_total
+from .fingerprint_index import normalize_fingerprint
+from .snapshot_store import snapshot_store
+
+dedup_config = current_config.get("dedup", {})
+
+
+class KeyIn(BaseModel):
+    fingerprint: str
+    created_at: Optional[datetime] = None
+    repeat_letter_score: Optional[float] = None
+    increasing_letter_score: Optional[float] = None
+    decreasing_letter_score: Optional[float] = None
+    magic_letter_score: Optional[float] = None
+    score: Optional[float] = None
+    unique_letters_count: Optional[int] = None
+
+
+class KeyIngestor:
+    """Batch ingestion with three layers of fingerprint deduplication.
+
+    1. Duplicates inside the batch are dropped in memory.
+    2. The shared Bloom filter rejects fingerprints it has seen before without
+       touching the database. With ``verify_bloom_hits`` (the default) the
+       hits are confirmed by one batched lookup, trading a round trip for never
+       losing a new key to a false positive; with it off they are skipped
+       unchecked and reported as ``bloom_unverified`` rather than as
+       duplicates (false positive rate bounded by ``bloom_error_rate``).
+    3. Everything else goes through INSERT ... ON CONFLICT DO NOTHING against
+       the unique index on the normalized fingerprint (the same
+       ``normalize_fingerprint`` form used here and by ``dedupe-keys``), which
+       is the source of truth, after dropping fingerprints the retention job
+       has archived.
+    """
+
+    BATCH_SIZE = dedup_config.get("batch_size", 1000)
+    VERIFY_BLOOM_HITS = dedup_config.get("verify_bloom_hits", True)
+    _bloom = None
+    _bloom_loaded = False
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @classmethod
+    def bloom(cls):
+        if not cls._bloom_loaded:
+            cls._bloom = create_bloom_filter("fingerprints", dedup_config)
+            cls._bloom_loaded = True
+        return cls._bloom
+
+    async def ingest(self, keys: List[KeyIn]) -> Dict[str, Any]:
+        outcomes = {
+            "inserted": 0,
+            "duplicate_in_batch": 0,
+            "bloom_rejected": 0,
+            "bloom_false_positive": 0,
+            "bloom_unverified": 0,
+            "archived": 0,
+            "db_conflict": 0,
+        }
+        local_tz = pytz.timezone("Asia/Shanghai")
+        now = datetime.now(local_tz).replace(tzinfo=None)
+
+        rows: Dict[str, Dict] = {}
+        for key in keys:
+            fingerprint = normalize_fingerprint(key.fingerprint)
+            if not fingerprint:
+                continue
+            if fingerprint in rows:
+                outcomes["duplicate_in_batch"] += 1
+                continue
+            row = key.model_dump()
+            row["fingerprint"] = fingerprint
+            if row["created_at"] is None:
+                row["created_at"] = now
+            elif row["created_at"].tzinfo is not None:
+                row["created_at"] = (
+                    row["created_at"].astimezone(local_tz).replace(tzinfo=None)
+                )
+            rows[fingerprint] = row
+
+        bloom = self.bloom()
+        fingerprints = list(rows)
+        if bloom is not None and fingerprints:
+            hits = [
+                fp
+                for fp, seen in zip(fingerprints, bloom.contains_many(fingerprints))
+                if seen
+            ]
+            if hits and self.VERIFY_BLOOM_HITS:
+                existing = await self.db.execute(
+                    select(normalized_fingerprint(KeyInfo.fingerprint)).where(
+                        normalized_fingerprint(KeyInfo.fingerprint).in_(hits)
+                    )
+                )
+                stored = set(existing.scalars().all())
+                outcomes["bloom_false_positive"] = len(hits) - len(stored)
+                outcomes["bloom_rejected"] = len(stored)
+                hits = stored
+            else:
+                # 未核实的命中可能是误判, 与确认的重复分开计数
+                outcomes["bloom_unverified"] = len(hits)
+            for fingerprint in hits:
+                rows.pop(fingerprint, None)
+
+        # 已被保留任务移出 key_infos 的指纹不再受唯一索引保护
+        if rows:
+            archived = await self.db.execute(
+                select(ArchivedFingerprint.fingerprint).where(
+                    ArchivedFingerprint.fingerprint.in_(list(rows))
+                )
+            )
+            for fingerprint in archived.scalars().all():
+                rows.pop(fingerprint, None)
+                outcomes["archived"] += 1
+
+        candidates = list(rows.values())
+        for offset in range(0, len(candidates), self.BATCH_SIZE):
+            batch = candidates[offset : offset + self.BATCH_SIZE]
+            result = await self.db.execute(
+                insert(KeyInfo)
+                .values(batch)
+                .on_conflict_do_nothing(
+                    index_elements=[normalized_fingerprint(KeyInfo.fingerprint)]
+                )
+                .returning(KeyInfo.id)
+            )
+            inserted = len(result.all())
+            outcomes["inserted"] += inserted
+            outcomes["db_conflict"] += len(batch) - inserted
+        await self.db.commit()
+
+        # 补录到已封存日期的数据让对应快照失效, 下一轮导出重写
+        if snapshot_store.enabled and outcomes["inserted"]:
+            snapshot_store.invalidate({row["created_at"].date() for row in candidates})
+
+        # Conflicting fingerprints are in the table too; teach the filter both
+        if bloom is not None and candidates:
+            bloom.add_many(row["fingerprint"] for row in candidates)
+
+        for outcome, count in outcomes.items():
+            if count:
+                key_ingest_total.labels(outcome=outcome).inc(count)
+        debug.log("Ingested %s keys: %s", len(keys), outcomes)
+        return {"received": len(keys), **outcomes}
+
+    @classmethod
+    async def rebuild_bloom(cls, db: AsyncSession, batch_size: int = 50000) -> int:
+        bloom = cls.bloom()
+        if bloom is None:
+            return 0
+        bloom.clear()
+        loaded = 0
+        result = await db.stream(
+            select(normalized_fingerprint(KeyInfo.fingerprint))
+            .where(KeyInfo.fingerprint.isnot(None))
+            .execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions():
+            bloom.add_many(row[0] for row in partition)
+            loaded += len(partition)
+        result = await db.stream(
+            select(ArchivedFingerprint.fingerprint).execution_options(
+                yield_per=batch_size
+            )
+        )
+        async for partition in result.partitions():
+            bloom.add_many(row[0] for row in partition)
+            loaded += len(partition)
+        return loaded
@@ -0,0 +1,275 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+import pytz
+from sqlalchemy import Integer, String, any_, cast, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from ..config import BASE_DIR, current_config
+from ..database import async_session
+from ..models import ArchivedFingerprint, KeyInfo, KeyInfoRollup
+from ..utils.debug import debug
+from ..utils.metrics import retention_batch_seconds, retention_keys_total
+from .compute_backend import QUALIFIED_THRESHOLD
+from .fingerprint_index import normalize_fingerprint
+from .key_exporter import EXPORT_COLUMNS, FIELD_NAMES, _ParquetEncoder
+from .rollups import AGGREGATE_FIELDS, HOUR, ROLLUP_FIELDS, floor_hour, merged_rollup
+
+retention_config = current_config.get("retention", {})
+
+
+class RetentionJob:
+    """Moves aged low-score keys out of ``key_infos`` into hourly rollups.
+
+    Keys created more than ``min_age_days`` ago with a score of at most
+    ``keep_above`` (the high-score threshold) or no score are folded, oldest
+    hour first, in transactions of at most ``batch_size`` rows. Each
+    transaction locks its rows (``SKIP LOCKED``, so ingestion and concurrent
+    runs are not blocked), writes them to a zstd Parquet file under
+    ``archive_path``, inserts one ``key_info_rollups`` row with their values
+    and aggregates, records their fingerprints in ``archived_fingerprints``
+    and deletes them. Keys above the threshold always stay raw. Once an
+    hour's batches are done its rollup rows are merged into one, so each
+    run rewrites an hour at most once.
+
+    The archive file is synced before the commit: a failed commit leaves a
+    file whose rows are archived again by the next run, so files may repeat
+    rows (unique by id) but never miss one.
+    """
+
+    MIN_AGE_DAYS = retention_config.get("min_age_days", 28)
+    KEEP_ABOVE = retention_config.get("keep_above", QUALIFIED_THRESHOLD)
+    BATCH_SIZE = retention_config.get("batch_size", 5000)
+    PAUSE_SECONDS = retention_config.get("pause_seconds", 0.2)
+    INTERVAL = retention_config.get("interval", 3600)
+
+    def __init__(self, archive_path: str, enabled: bool = False):
+        self.archive_path = archive_path
+        self.enabled = enabled
+
+    def cutoff(self) -> datetime:
+        """Keys created before this local time are aged.
+
+        It is always an hour boundary, so only whole hours fold.
+        """
+        local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+        return floor_hour(local_now - timedelta(days=self.MIN_AGE_DAYS))
+
+    def _foldable(self, cutoff: datetime):
+        return KeyInfo.created_at < cutoff, or_(
+            KeyInfo.score.is_(None), KeyInfo.score <= self.KEEP_ABOVE
+        )
+
+    # ---- 归档文件 ----
+
+    def _archive_file(self, hour: datetime, first_id: int, last_id: int) -> str:
+        return os.path.join(
+            self.archive_path,
+            f"date={hour.date().isoformat()}",
+            f"keys-{hour:%H}-{first_id}-{last_id}.parquet",
+        )
+
+    def _archive(self, hour: datetime, rows) -> str:
+        path = self._archive_file(hour, rows[0].id, rows[-1].id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        encoder = _ParquetEncoder()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(encoder.encode(rows))
+                f.write(encoder.close())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    # ---- 折叠 ----
+
+    async def pending(self) -> int:
+        """Keys the next run would fold."""
+        async with async_session() as db:
+            query = (
+                select(func.count())
+                .select_from(KeyInfo)
+                .where(*self._foldable(self.cutoff()))
+            )
+            return (await db.execute(query)).scalar_one()
+
+    async def _next_hour(
+        self, after: Optional[datetime], cutoff: datetime
+    ) -> Optional[datetime]:
+        query = select(func.min(KeyInfo.created_at)).where(*self._foldable(cutoff))
+        if after is not None:
+            query = query.where(KeyInfo.created_at >= after)
+        async with async_session() as db:
+            first = (await db.execute(query)).scalar_one_or_none()
+        return floor_hour(first) if first is not None else None
+
+    async def fold_batch(self, hour: datetime, cutoff: datetime) -> int:
+        """One transaction: archive, fold and delete aged keys of ``hour``.
+
+        Handles at most ``batch_size`` keys.
+        """
+        started = time.perf_counter()
+        async with async_session() as db:
+            rows = (
+                await db.execute(
+                    select(*EXPORT_COLUMNS)
+                    .where(
+                        KeyInfo.created_at >= hour,
+                        KeyInfo.created_at < hour + HOUR,
+                        *self._foldable(cutoff),
+                    )
+                    .order_by(KeyInfo.id)
+                    .limit(self.BATCH_SIZE)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not rows:
+                return 0
+            path = await asyncio.to_thread(self._archive, hour, rows)
+
+            columns = dict(zip(FIELD_NAMES, zip(*rows)))
+            scores = [value for value in columns["score"] if value is not None]
+            # 每批新插入一行, 不改写同一小时已有的行 (rows 按 id 排序, 首行即批次最小 id)
+            await db.execute(
+                insert(KeyInfoRollup).values(
+                    hour=hour,
+                    first_id=rows[0].id,
+                    key_count=len(rows),
+                    score_count=len(scores),
+                    score_sum=float(sum(scores)),
+                    score_max=max(scores) if scores else None,
+                    **{name: list(columns[name]) for name in ROLLUP_FIELDS},
+                )
+            )
+            fingerprints = sorted(
+                {
+                    normalize_fingerprint(value)
+                    for value in columns["fingerprint"]
+                    if value
+                }
+            )
+            if fingerprints:
+                await db.execute(
+                    insert(ArchivedFingerprint)
+                    .from_select(
+                        ["fingerprint"],
+                        select(func.unnest(cast(fingerprints, ARRAY(String)))),
+                    )
+                    .on_conflict_do_nothing()
+                )
+            await db.execute(
+                delete(KeyInfo).where(
+                    KeyInfo.id == any_(cast(list(columns["id"]), ARRAY(Integer)))
+                )
+            )
+            await db.commit()
+
+        elapsed = time.perf_counter() - started
+        retention_batch_seconds.observe(elapsed)
+        retention_keys_total.inc(len(rows))
+        debug.log(
+            "Folded %d keys of %s into rollups, archived to %s in %.2fs",
+            len(rows),
+            hour,
+            path,
+            elapsed,
+        )
+        return len(rows)
+
+    async def merge_hour(self, hour: datetime) -> int:
+        """Merges the rollup rows of ``hour`` into its lowest-keyed one.
+
+        Returns how many rows were merged.
+        """
+        rollups = KeyInfoRollup.__table__
+        async with async_session() as db:
+            first_ids = (
+                (
+                    await db.execute(
+                        select(rollups.c.first_id)
+                        .where(rollups.c.hour == hour)
+                        .order_by(rollups.c.first_id)
+                        .with_for_update(skip_locked=True)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            if len(first_ids) < 2:
+                return 0
+            merged = merged_rollup(hour, first_ids).subquery()
+            await db.execute(
+                update(rollups)
+                .where(rollups.c.hour == hour, rollups.c.first_id == first_ids[0])
+                .values(
+                    {name: merged.c[name] for name in ROLLUP_FIELDS + AGGREGATE_FIELDS}
+                )
+            )
+            await db.execute(
+                delete(rollups).where(
+                    rollups.c.hour == hour, rollups.c.first_id.in_(first_ids[1:])
+                )
+            )
+            await db.commit()
+        return len(first_ids)
+
+    async def run_once(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """Folds every aged hour, or ``max_batches`` transactions.
+
+        Returns counts of hours, batches and keys.
+        """
+        cutoff = self.cutoff()
+        totals = {"hours": 0, "batches": 0, "keys": 0}
+        after = None
+        while max_batches is None or totals["batches"] < max_batches:
+            hour = await self._next_hour(after, cutoff)
+            if hour is None:
+                break
+            totals["hours"] += 1
+            hour_keys = 0
+            while max_batches is None or totals["batches"] < max_batches:
+                folded = await self.fold_batch(hour, cutoff)
+                totals["batches"] += 1
+                totals["keys"] += folded
+                hour_keys += folded
+                # 每批之间让出数据库, 不与在线查询和入库争抢
+                await asyncio.sleep(self.PAUSE_SECONDS)
+                if folded < self.BATCH_SIZE:
+                    break
+            if hour_keys:
+                # 本轮写入的批次与之前的行合并, 查询时每小时只读一行
+                await self.merge_hour(hour)
+            after = hour + HOUR
+        return totals
+
+    async def run(self):
+        """Background task folding aged keys every ``interval`` seconds."""
+        while True:
+            try:
+                totals = await self.run_once()
+                if totals["keys"]:
+                    debug.log(
+                        "Retention folded %d keys from %d hours in %d batches",
+                        totals["keys"],
+                        totals["hours"],
+                        totals["batches"],
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Retention run failed: %s", e)
+            await asyncio.sleep(self.INTERVAL)
+
+
+retention_job = RetentionJob(
+    os.path.join(BASE_DIR, retention_config.get("archive_path", "data/archive")),
+    enabled=retention_config.get("enabled", False),
+)
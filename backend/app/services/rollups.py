@@ -0,0 +1,251 @@
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import (
+    Boolean,
+    Integer,
+    and_,
+    cast,
+    column,
+    false,
+    func,
+    literal,
+    not_,
+    null,
+    select,
+    true,
+    union_all,
+)
+
+from ..models import KeyInfo, KeyInfoRollup
+
+HOUR = timedelta(hours=1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# key_info_rollups 中按 key 保存的列, 即 key_infos 除 id 与指纹之外的列
+ROLLUP_FIELDS = (
+    "created_at",
+    "repeat_letter_score",
+    "increasing_letter_score",
+    "decreasing_letter_score",
+    "magic_letter_score",
+    "score",
+    "unique_letters_count",
+)
+
+# 每行的可合并聚合: key 数, 有分数的 key 数, 分数之和与最大值
+AGGREGATE_FIELDS = ("key_count", "score_count", "score_sum", "score_max")
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _unnested(names: Sequence[str]):
+    """The rollup arrays of ``names`` (in ROLLUP_FIELDS) expanded side by side.
+
+    The result is the table ``folded``.
+    """
+    rollups = KeyInfoRollup.__table__
+    keys = KeyInfo.__table__
+    return (
+        func.unnest(*[rollups.c[name] for name in names])
+        .table_valued(*[column(name, keys.c[name].type) for name in names])
+        .render_derived(name="folded")
+    )
+
+
+def _whole_hours(start: datetime, end: datetime):
+    """Rollup rows whose hour lies entirely inside ``[start, end]``."""
+    rollups = KeyInfoRollup.__table__
+    return and_(
+        rollups.c.hour >= start, rollups.c.hour + (HOUR - ONE_MICROSECOND) <= end
+    )
+
+
+def _summarized(start: datetime, end: datetime, threshold: float):
+    """Rollup rows answered from their aggregates.
+
+    These are whole hours with no score above ``threshold``.
+    """
+    rollups = KeyInfoRollup.__table__
+    return and_(
+        _whole_hours(start, end),
+        func.coalesce(rollups.c.score_max, threshold) <= threshold,
+    )
+
+
+def merged_rollup(hour: datetime, first_ids: Sequence[int]):
+    """One row's values for the rollup rows ``first_ids`` of ``hour``.
+
+    The arrays are concatenated and the aggregates merged. All aggregates
+    run over the same expanded rows, so the arrays stay aligned.
+    """
+    rollups = KeyInfoRollup.__table__
+    folded = _unnested(ROLLUP_FIELDS)
+    return (
+        select(
+            *[func.array_agg(folded.c[name]).label(name) for name in ROLLUP_FIELDS],
+            func.count().label("key_count"),
+            func.count(folded.c.score).label("score_count"),
+            func.coalesce(func.sum(folded.c.score), 0).label("score_sum"),
+            func.max(folded.c.score).label("score_max"),
+        )
+        .select_from(rollups.join(folded, true()))
+        .where(rollups.c.hour == hour, rollups.c.first_id.in_(first_ids))
+    )
+
+
+def folded_rows(
+    names: Sequence[str],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    *conditions,
+):
+    """Keys folded into ``key_info_rollups`` in ``[start, end]``, one row per key.
+
+    ``id`` and ``fingerprint`` are NULL; they are only kept in the archive
+    files. Only the arrays of ``names`` are expanded; ``conditions`` further
+    restrict the rollup rows.
+    """
+    rollups = KeyInfoRollup.__table__
+    keys = KeyInfo.__table__
+    expanded = [name for name in names if name in ROLLUP_FIELDS]
+    if start is not None or end is not None:
+        expanded = list(dict.fromkeys(expanded + ["created_at"]))
+    folded = _unnested(expanded)
+    query = (
+        select(
+            *[
+                (
+                    folded.c[name]
+                    if name in ROLLUP_FIELDS
+                    else cast(null(), keys.c[name].type).label(name)
+                )
+                for name in names
+            ]
+        )
+        .select_from(rollups.join(folded, true()))
+        .where(*conditions)
+    )
+    # 先按小时主键裁剪, 只展开相关的行
+    if start is not None:
+        query = query.where(
+            rollups.c.hour >= floor_hour(start), folded.c.created_at >= start
+        )
+    if end is not None:
+        query = query.where(rollups.c.hour <= end, folded.c.created_at <= end)
+    return query
+
+
+def key_rows(
+    names: Sequence[str],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Raw and folded keys in ``[start, end]`` as columns ``names``.
+
+    Either bound may be None. One statement, so both tables are read from
+    the same snapshot while the retention job moves keys from one to the
+    other. Used where every key's values are needed: exact quantiles and
+    histogram edges of the current period, exports and snapshots.
+    """
+    raw = select(*[KeyInfo.__table__.c[name] for name in names])
+    if start is not None:
+        raw = raw.where(KeyInfo.created_at >= start)
+    if end is not None:
+        raw = raw.where(KeyInfo.created_at <= end)
+    return union_all(raw, folded_rows(names, start, end))
+
+
+def score_rows(start: datetime, end: datetime, threshold: float):
+    """(created_at, score, weight, summarized) of the keys in ``[start, end]``.
+
+    Used for counts above ``threshold``. Raw keys, and folded keys of
+    partial hours or of hours with a score above ``threshold``, come one row
+    per key (weight 1). Whole hours whose scores are all at most
+    ``threshold`` come as one row per rollup row: created_at is the hour,
+    score NULL, weight its key count and ``summarized`` true. Their keys
+    count in the total but never above ``threshold``.
+    """
+    rollups = KeyInfoRollup.__table__
+    summarized = _summarized(start, end, threshold)
+    raw = select(
+        KeyInfo.created_at,
+        KeyInfo.score,
+        literal(1, Integer).label("weight"),
+        literal(False, Boolean).label("summarized"),
+    ).where(KeyInfo.created_at >= start, KeyInfo.created_at <= end)
+    expanded = folded_rows(
+        ("created_at", "score"), start, end, not_(summarized)
+    ).add_columns(literal(1, Integer).label("weight"), false().label("summarized"))
+    hours = select(
+        rollups.c.hour.label("created_at"),
+        cast(null(), KeyInfo.__table__.c.score.type).label("score"),
+        rollups.c.key_count.label("weight"),
+        true().label("summarized"),
+    ).where(summarized)
+    return union_all(raw, expanded, hours)
+
+
+def score_totals(start: datetime, end: datetime, threshold: float):
+    """One row (key_count, scored, total, highest, qualified) of ``[start, end]``.
+
+    ``key_count`` counts every key and ``scored`` those with a score; ``total``
+    and ``highest`` are the sum and maximum of the scores, ``qualified`` the
+    keys above ``threshold``. Whole folded hours with no score above
+    ``threshold`` are read from their aggregates, the rest key by key.
+    """
+    rollups = KeyInfoRollup.__table__
+    summarized = _summarized(start, end, threshold)
+    raw = select(
+        func.count().label("key_count"),
+        func.count(KeyInfo.score).label("scored"),
+        func.sum(KeyInfo.score).label("total"),
+        func.max(KeyInfo.score).label("highest"),
+        func.count().filter(KeyInfo.score > threshold).label("qualified"),
+    ).where(KeyInfo.created_at >= start, KeyInfo.created_at <= end)
+    folded = folded_rows(("score",), start, end, not_(summarized)).subquery()
+    expanded = select(
+        func.count(),
+        func.count(folded.c.score),
+        func.sum(folded.c.score),
+        func.max(folded.c.score),
+        func.count().filter(folded.c.score > threshold),
+    )
+    hours = select(
+        func.sum(rollups.c.key_count),
+        func.sum(rollups.c.score_count),
+        func.sum(rollups.c.score_sum),
+        func.max(rollups.c.score_max),
+        literal(0, Integer),
+    ).where(summarized)
+    parts = union_all(raw, expanded, hours).subquery()
+    return select(
+        func.coalesce(func.sum(parts.c.key_count), 0),
+        func.coalesce(func.sum(parts.c.scored), 0),
+        func.coalesce(func.sum(parts.c.total), 0),
+        func.max(parts.c.highest),
+        func.coalesce(func.sum(parts.c.qualified), 0),
+    )
+
+
+def key_time_bounds():
+    """Earliest and latest created_at over raw and folded keys.
+
+    Folded keys count from the start of their first hour to the end of
+    their last one, which is enough for cutting ranges into days and hours.
+    """
+    rollups = KeyInfoRollup.__table__
+    return select(
+        func.least(
+            select(func.min(KeyInfo.created_at)).scalar_subquery(),
+            select(func.min(rollups.c.hour)).scalar_subquery(),
+        ),
+        func.greatest(
+            select(func.max(KeyInfo.created_at)).scalar_subquery(),
+            select(
+                func.max(rollups.c.hour) + (HOUR - ONE_MICROSECOND)
+            ).scalar_subquery(),
+        ),
+    )
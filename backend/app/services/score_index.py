@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Sequence, Tuple
+
+import pytz
+
+from ..config import current_config
+from ..utils.lazy import np
+from ..utils.metrics import gauge_function, score_index_buckets_total, score_index_bytes
+from .change_feed import Change, change_feed, epoch_seconds
+
+score_index_config = current_config.get("score_index", {})
+
+HOUR = timedelta(hours=1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+
+class Piece:
+    """``[start, end)`` of a queried range.
+
+    ``hour`` is set when it is a whole, settled local hour.
+    """
+
+    __slots__ = ("start", "end", "hour")
+
+    def __init__(self, start: datetime, end: datetime, hour: Optional[datetime]):
+        self.start = start
+        self.end = end
+        self.hour = hour
+
+
+class ScoreIndex:
+    """Sorted score arrays per local hour, for qualified counts at any threshold.
+
+    A range is cut at hour boundaries. Each whole hour that ended more than
+    ``settle_seconds`` ago is kept as a sorted float64 array of its scores,
+    so the keys above a threshold are ``len - searchsorted(threshold)``: a
+    sweep of T thresholds over B hours costs O(B × T × log n) once the hours
+    are indexed. The partial hours at either end and hours still receiving
+    keys are loaded and sorted per request.
+
+    Hours are dropped when the change feed reports a change inside them;
+    hours indexed while the feed is not live expire after ``fallback_ttl``
+    seconds. The index holds at most ``max_bytes`` of scores, evicting the
+    least recently used hours.
+    """
+
+    MAX_BYTES = score_index_config.get("max_bytes", 64 << 20)
+    SETTLE_SECONDS = score_index_config.get("settle_seconds", 300)
+    FALLBACK_TTL = score_index_config.get("fallback_ttl", 300)
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        # 小时起点 -> (升序分数, 过期时刻; 订阅在线时为 None)
+        self._hours: "OrderedDict[datetime, Tuple[Any, Optional[float]]]" = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        gauge_function(score_index_bytes, lambda: self._bytes)
+
+    def __len__(self) -> int:
+        return len(self._hours)
+
+    def memory_bytes(self) -> int:
+        return self._bytes
+
+    # ---- 区间切分 ----
+
+    def pieces(self, start: datetime, end: datetime) -> List[Piece]:
+        """``[start, end]`` cut at hour boundaries, as half-open pieces."""
+        local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+        settled = local_now - timedelta(seconds=self.SETTLE_SECONDS)
+        stop = end + ONE_MICROSECOND
+        pieces = []
+        cursor = start
+        while cursor < stop:
+            hour = cursor.replace(minute=0, second=0, microsecond=0)
+            piece_end = min(hour + HOUR, stop)
+            whole = cursor == hour and piece_end == hour + HOUR and piece_end <= settled
+            pieces.append(
+                Piece(cursor, piece_end, hour if whole and self.enabled else None)
+            )
+            cursor = piece_end
+        return pieces
+
+    # ---- 缓存 ----
+
+    def get(self, hour: datetime):
+        entry = self._hours.get(hour)
+        if entry is None:
+            return None
+        scores, expires = entry
+        if expires is not None and time.monotonic() >= expires:
+            self._drop(hour)
+            return None
+        self._hours.move_to_end(hour)
+        return scores
+
+    def put(self, hour: datetime, scores, position: int):
+        """Keeps the sorted ``scores`` of ``hour``.
+
+        They were computed from data as of change feed ``position``.
+        """
+        if scores.nbytes > self.MAX_BYTES:
+            return
+        expires = None
+        if not change_feed.live:
+            expires = time.monotonic() + self.FALLBACK_TTL
+        elif change_feed.stale(position, hour, hour + HOUR - ONE_MICROSECOND):
+            return
+        self._drop(hour)
+        self._hours[hour] = (scores, expires)
+        self._bytes += scores.nbytes
+        while self._bytes > self.MAX_BYTES:
+            self._drop(next(iter(self._hours)))
+
+    def _drop(self, hour: datetime):
+        entry = self._hours.pop(hour, None)
+        if entry is not None:
+            self._bytes -= entry[0].nbytes
+
+    def clear(self):
+        self._hours.clear()
+        self._bytes = 0
+
+    def on_change(self, changes: List[Change]):
+        if any(change.everything for change in changes):
+            self.clear()
+            return
+        for hour in list(self._hours):
+            start = epoch_seconds(hour)
+            if any(change.overlaps(start, start + 3600 - 1e-6) for change in changes):
+                self._drop(hour)
+
+    # ---- 计数 ----
+
+    @staticmethod
+    def count_above(sorted_scores, thresholds) -> Any:
+        """Scores strictly above each threshold (the "qualified" rule)."""
+        return len(sorted_scores) - np.searchsorted(
+            sorted_scores, thresholds, side="right"
+        )
+
+    def sweep(
+        self, sorted_pieces: Sequence[Any], thresholds: Sequence[float]
+    ) -> Tuple[int, Any]:
+        """Total keys and per-threshold qualified counts over the pieces' scores."""
+        targets = np.asarray(thresholds, dtype="float64")
+        counts = np.zeros(len(targets), dtype="int64")
+        total = 0
+        for scores in sorted_pieces:
+            total += len(scores)
+            if len(scores):
+                counts += self.count_above(scores, targets)
+        return total, counts
+
+    def record(self, hits: int, loaded: int):
+        if hits:
+            score_index_buckets_total.labels(result="hit").inc(hits)
+        if loaded:
+            score_index_buckets_total.labels(result="loaded").inc(loaded)
+
+
+score_index = ScoreIndex(enabled=score_index_config.get("enabled", True))
+change_feed.subscribe(score_index.on_change)
@@ -0,0 +1,321 @@
+import asyncio
+import fcntl
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Sequence, Set
+
+import pytz
+
+from ..config import BASE_DIR, current_config
+from ..database import replica_router
+from ..utils.debug import debug
+from ..utils.lazy import LazyModule
+from .change_feed import Change, change_feed, epoch_seconds
+from .compute_backend import FRAME_COLUMNS
+from .rollups import key_time_bounds
+
+snapshot_config = current_config.get("snapshots", {})
+
+duckdb = LazyModule("duckdb")
+
+
+class SnapshotUnavailable(RuntimeError):
+    pass
+
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+class SnapshotStore:
+    """Sealed days of ``key_infos`` as Parquet files, queried with embedded DuckDB.
+
+    A day is sealed once it ended ``seal_after_minutes`` ago; the export
+    job then writes it to ``<path>/date=YYYY-MM-DD/keys.parquet`` (one
+    file per local day, sorted by created_at, zstd). ``_origin`` records
+    the first day with data, so open ranges know where full coverage
+    starts. The files on disk are the source of truth and are shared by
+    all workers; each process rescans the directory every few seconds.
+    Keys folded into hourly rollups by the retention job are exported with
+    the raw rows (without id and fingerprint), so a day's statistics read
+    from its file are complete.
+
+    Keys ingested later into a sealed day invalidate that day's file, and
+    the next export pass writes it again. So do rows written, changed or
+    deleted by anything else, as announced by the change feed. A day that
+    changes while it is being exported has no file to drop yet: invalidation
+    leaves a ``.stale`` marker in the day's directory (seen by every
+    worker), and the export discards its copy when the marker appears or the
+    change feed reports a change to the day after the export started.
+    """
+
+    SEAL_AFTER = timedelta(minutes=snapshot_config.get("seal_after_minutes", 60))
+    EXPORT_INTERVAL = snapshot_config.get("export_interval", 600)
+    MAX_DAYS_PER_PASS = snapshot_config.get("max_days_per_pass", 30)
+    SCAN_INTERVAL = 5
+    PREFIX = "date="
+
+    def __init__(self, path: str, enabled: bool = False):
+        self.path = path
+        self.enabled = enabled
+        self._days: Set[date] = set()
+        self._origin: Optional[date] = None
+        self._scanned_at = 0.0
+        self._connection = None
+        self._connection_lock = threading.Lock()
+
+    # ---- 目录扫描 ----
+
+    def _day_path(self, day: date) -> str:
+        return os.path.join(
+            self.path, f"{self.PREFIX}{day.isoformat()}", "keys.parquet"
+        )
+
+    def _stale_path(self, day: date) -> str:
+        return os.path.join(self.path, f"{self.PREFIX}{day.isoformat()}", ".stale")
+
+    def _last_sealed(self) -> date:
+        local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+        return (local_now - self.SEAL_AFTER).date() - timedelta(days=1)
+
+    def _origin_path(self) -> str:
+        return os.path.join(self.path, "_origin")
+
+    def _scan(self, force: bool = False):
+        if not force and time.monotonic() - self._scanned_at < self.SCAN_INTERVAL:
+            return
+        days = set()
+        try:
+            for name in os.listdir(self.path):
+                if name.startswith(self.PREFIX) and os.path.exists(
+                    os.path.join(self.path, name, "keys.parquet")
+                ):
+                    days.add(date.fromisoformat(name[len(self.PREFIX) :]))
+            with open(self._origin_path()) as f:
+                origin = date.fromisoformat(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            origin = None
+        self._days, self._origin = days, origin
+        self._scanned_at = time.monotonic()
+
+    @property
+    def days(self) -> Set[date]:
+        self._scan()
+        return self._days
+
+    def covered_until(self, start: Optional[datetime]) -> Optional[datetime]:
+        """Exclusive end of the snapshot-covered prefix of a range from ``start``.
+
+        ``start=None`` is an open range, covered from the first day with
+        data. Returns None when the range's first day has no snapshot.
+        """
+        days = self.days
+        day = start.date() if start is not None else self._origin
+        if day is None or day not in days:
+            return None
+        while day in days:
+            day += timedelta(days=1)
+        return _midnight(day)
+
+    # ---- 查询 ----
+
+    def _cursor(self):
+        with self._connection_lock:
+            if self._connection is None:
+                settings = {
+                    "threads": snapshot_config.get("duckdb_threads")
+                    or os.cpu_count()
+                    or 1
+                }
+                if snapshot_config.get("duckdb_memory_limit"):
+                    settings["memory_limit"] = snapshot_config["duckdb_memory_limit"]
+                self._connection = duckdb.connect(config=settings)
+        # 每次查询一个游标: 同一连接的游标可以在不同线程里并发使用
+        return self._connection.cursor()
+
+    def read(
+        self,
+        start: Optional[datetime],
+        end: Optional[datetime],
+        boundary: datetime,
+        columns: Sequence[str] = FRAME_COLUMNS,
+    ):
+        """Rows of ``[start, min(end, boundary))`` as an Arrow table.
+
+        Blocking; run it in a thread.
+        """
+        first = start.date() if start is not None else self._origin
+        files = []
+        day = first
+        while _midnight(day) < boundary:
+            files.append(self._day_path(day))
+            day += timedelta(days=1)
+
+        conditions, parameters = ["created_at < ?"], [files, boundary]
+        if start is not None:
+            conditions.append("created_at >= ?")
+            parameters.append(start)
+        if end is not None and end < boundary:
+            conditions.append("created_at <= ?")
+            parameters.append(end)
+        query = (
+            f"SELECT {', '.join(columns)} FROM read_parquet(?) "
+            f"WHERE {' AND '.join(conditions)}"
+        )
+        try:
+            return self._cursor().execute(query, parameters).to_arrow_table()
+        except duckdb.Error as e:
+            # 文件在扫描之后被失效删除等情况: 调用方回退到 Postgres
+            self._scanned_at = 0.0
+            raise SnapshotUnavailable(str(e)) from e
+
+    # ---- 导出 ----
+
+    async def _find_origin(self) -> Optional[date]:
+        async with replica_router.session_factory()() as db:
+            first = (await db.execute(key_time_bounds())).one()[0]
+        if first is None:
+            return None
+        self._write_atomic(self._origin_path(), first.date().isoformat().encode())
+        return first.date()
+
+    def _write_atomic(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _discard(self, path: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def export_day(self, day: date) -> bool:
+        """Writes the day's snapshot.
+
+        Returns False when the day changed during the export; the next pass
+        retries it.
+        """
+        # 延迟导入: key_exporter 依赖 key_analyzer, 而 key_analyzer 依赖本模块
+        from .key_analyzer import TimeRange
+        from .key_exporter import KeyExporter
+
+        start = _midnight(day)
+        exporter = KeyExporter(
+            "parquet",
+            TimeRange(start, start + timedelta(days=1, microseconds=-1)),
+            include_folded=True,
+        )
+        path = self._day_path(day)
+        stale = self._stale_path(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先清除旧标记并记下变更订阅位置, 导出期间的变化都会被发现
+        self._discard(stale)
+        position = change_feed.position()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                async for chunk in exporter.stream():
+                    f.write(chunk)
+            end = start + timedelta(days=1, microseconds=-1)
+            if os.path.exists(stale) or change_feed.changed_since(position, start, end):
+                debug.log("Snapshot of %s changed during export, discarded", day)
+                return False
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        # 检查与替换之间写入的标记: invalidate 先写标记再删文件, 这里再检查一次即可覆盖
+        if os.path.exists(stale):
+            self._discard(path)
+            return False
+        return True
+
+    async def export_pending(self) -> int:
+        """Exports sealed days that have no snapshot yet, oldest first.
+
+        Returns how many were exported.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".export.lock"), "w") as lock:
+            # 多个 worker 时只有一个在导出, 其余跳过本轮
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            self._scan(force=True)
+            origin = self._origin or await self._find_origin()
+            if origin is None:
+                return 0
+            last_sealed = self._last_sealed()
+            exported = attempted = 0
+            day = origin
+            while day <= last_sealed and attempted < self.MAX_DAYS_PER_PASS:
+                if day not in self._days:
+                    attempted += 1
+                    exported += await self.export_day(day)
+                day += timedelta(days=1)
+            self._scan(force=True)
+            return exported
+
+    def invalidate(self, days: Iterable[date]):
+        """Drops the snapshots of days that received new keys.
+
+        This includes days being exported.
+        """
+        self._scan(force=True)
+        last_sealed = self._last_sealed()
+        for day in set(days):
+            if self._origin is not None and day < self._origin:
+                self._discard(self._origin_path())
+            if day > last_sealed and day not in self._days:
+                continue
+            # 先写标记再删文件: 正在导出该日期的进程据此丢弃它的副本
+            self._write_atomic(self._stale_path(day), b"")
+            if self._discard(self._day_path(day)):
+                debug.log("Snapshot of %s invalidated", day)
+        self._scanned_at = 0.0
+
+    def on_change(self, changes: List[Change]):
+        if not self.enabled:
+            return
+        # resync 说不出哪些日期变了; 重连期间的补录由 KeyIngestor 自己失效
+        changes = [change for change in changes if change.op != "resync"]
+        stale = set()
+        for day in self.days:
+            start = epoch_seconds(_midnight(day))
+            if any(change.overlaps(start, start + 86400 - 1e-6) for change in changes):
+                stale.add(day)
+        if stale:
+            self.invalidate(stale)
+
+    async def run(self):
+        """Background task exporting sealed days."""
+        while True:
+            try:
+                started = time.perf_counter()
+                exported = await self.export_pending()
+                if exported:
+                    debug.log(
+                        "Exported %d sealed days to %s in %.2fs",
+                        exported,
+                        self.path,
+                        time.perf_counter() - started,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug.error("Snapshot export failed: %s", e)
+            await asyncio.sleep(self.EXPORT_INTERVAL)
+
+
+snapshot_store = SnapshotStore(
+    os.path.join(BASE_DIR, snapshot_config.get("path", "data/snapshots")),
+    enabled=snapshot_config.get("enabled", False),
+)
+change_feed.subscribe(snapshot_store.on_change)
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import math
+import mmap
+import os
+from typing import Iterable, List, Sequence, Tuple
+
+from .debug import debug
+from .redis import redis_client
+
+
+def _hash_pair(item: str) -> Tuple[int, int]:
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    return (
+        int.from_bytes(digest[:8], "little"),
+        int.from_bytes(digest[8:], "little") | 1,
+    )
+
+
+class BloomSlice:
+    """Fixed-size Bloom filter parameters for one slice of a scalable filter."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(
+            8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        )
+        self.num_hashes = max(1, int(math.ceil(math.log2(1 / error_rate))))
+
+    def positions(self, hashes: Tuple[int, int]) -> List[int]:
+        # Kirsch-Mitzenmacher double hashing
+        h1, h2 = hashes
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+
+class RedisBitStore:
+    """Slices stored as Redis bitmaps; one BITFIELD command per item and slice."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _slice_key(self, index: int) -> str:
+        return redis_client._get_key(f"bloom:{self.name}:{index}")
+
+    def _meta_key(self) -> str:
+        return redis_client._get_key(f"bloom:{self.name}:meta")
+
+    def load_counts(self) -> List[int]:
+        # Shared by all workers: one count:<slice> field per slice
+        meta = redis_client.client.hgetall(self._meta_key())
+        counts = {int(field.split(":")[1]): int(value) for field, value in meta.items()}
+        return [counts[i] for i in range(len(counts))]
+
+    def add_slice(self, index: int, slice_: BloomSlice):
+        redis_client.client.hsetnx(self._meta_key(), f"count:{index}", 0)
+
+    def test(self, queries: Sequence[Tuple[int, List[int]]]) -> List[bool]:
+        pipe = redis_client.client.pipeline(transaction=False)
+        for index, positions in queries:
+            args = []
+            for position in positions:
+                args += ["GET", "u1", position]
+            pipe.execute_command("BITFIELD", self._slice_key(index), *args)
+        return [all(bits) for bits in pipe.execute()]
+
+    def set(self, index: int, items_positions: Sequence[List[int]]):
+        pipe = redis_client.client.pipeline(transaction=False)
+        for positions in items_positions:
+            args = []
+            for position in positions:
+                args += ["SET", "u1", position, 1]
+            pipe.execute_command("BITFIELD", self._slice_key(index), *args)
+        pipe.hincrby(self._meta_key(), f"count:{index}", len(items_positions))
+        pipe.execute()
+
+    def clear(self):
+        redis_client.client.delete(self._meta_key())
+        redis_client.clear_prefix(f"bloom:{self.name}:")
+
+
+class MmapBitStore:
+    """Slices stored as memory-mapped files, shared by workers on the same host.
+
+    Bit updates are unsynchronised read-modify-write on a byte, so concurrent
+    workers can occasionally lose a bit. That only produces a false negative,
+    which the database unique index still catches.
+    """
+
+    def __init__(self, name: str, directory: str):
+        self.name = name
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._maps: List[mmap.mmap] = []
+        self._counts: List[int] = []
+
+    def _path(self, suffix: str) -> str:
+        return os.path.join(self.directory, f"{self.name}.{suffix}")
+
+    def load_counts(self) -> List[int]:
+        try:
+            with open(self._path("meta.json")) as f:
+                self._counts = json.load(f)["counts"]
+        except (OSError, ValueError, KeyError):
+            self._counts = []
+        return list(self._counts)
+
+    def _save_counts(self):
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"counts": self._counts}, f)
+
+    def _map(self, index: int, slice_: BloomSlice) -> mmap.mmap:
+        while len(self._maps) <= index:
+            size = (slice_.num_bits + 7) // 8
+            with open(self._path(f"{len(self._maps)}.bits"), "a+b") as f:
+                if os.fstat(f.fileno()).st_size < size:
+                    f.truncate(size)
+                self._maps.append(mmap.mmap(f.fileno(), size))
+        return self._maps[index]
+
+    def add_slice(self, index: int, slice_: BloomSlice):
+        self._map(index, slice_)
+        if len(self._counts) <= index:
+            self._counts.append(0)
+            self._save_counts()
+
+    def test(self, queries: Sequence[Tuple[int, List[int]]]) -> List[bool]:
+        return [
+            all(self._maps[index][p >> 3] & (1 << (p & 7)) for p in positions)
+            for index, positions in queries
+        ]
+
+    def set(self, index: int, items_positions: Sequence[List[int]]):
+        bits = self._maps[index]
+        for positions in items_positions:
+            for p in positions:
+                bits[p >> 3] |= 1 << (p & 7)
+        self._counts[index] += len(items_positions)
+        self._save_counts()
+
+    def clear(self):
+        for bits in self._maps:
+            bits.close()
+        self._maps, self._counts = [], []
+        for entry in os.listdir(self.directory):
+            if entry.startswith(f"{self.name}."):
+                os.remove(os.path.join(self.directory, entry))
+
+
+class ScalableBloomFilter:
+    """Scalable Bloom filter (Almeida et al. 2007).
+
+    When the newest slice reaches its capacity a new one is added with
+    ``growth`` times the capacity and ``tightening`` times the error rate.
+    Slice error rates form a geometric series summing to ``error_rate``, so
+    the compound false-positive rate stays below it however many items are
+    added. Slice counts live in the store, so workers sharing a store also
+    share the slice layout.
+    """
+
+    def __init__(
+        self,
+        store,
+        initial_capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        growth: int = 2,
+        tightening: float = 0.5,
+    ):
+        self.store = store
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.slices: List[BloomSlice] = []
+        self.counts: List[int] = []
+        self._sync()
+
+    def _sync(self):
+        self.counts = self.store.load_counts()
+        for index in range(len(self.slices), max(len(self.counts), 1)):
+            self._add_slice(index)
+
+    def _add_slice(self, index: int):
+        slice_ = BloomSlice(
+            self.initial_capacity * self.growth**index,
+            self.error_rate * (1 - self.tightening) * self.tightening**index,
+        )
+        self.slices.append(slice_)
+        self.store.add_slice(index, slice_)
+        if len(self.counts) <= index:
+            self.counts.append(0)
+
+    def contains_many(self, items: Sequence[str]) -> List[bool]:
+        if not items:
+            return []
+        self._sync()
+        hashes = [_hash_pair(item) for item in items]
+        queries = [
+            (index, slice_.positions(h))
+            for h in hashes
+            for index, slice_ in enumerate(self.slices)
+        ]
+        results = self.store.test(queries)
+        per_item = len(self.slices)
+        return [
+            any(results[i * per_item : (i + 1) * per_item]) for i in range(len(items))
+        ]
+
+    def add_many(self, items: Iterable[str]):
+        pending = [_hash_pair(item) for item in items]
+        self._sync()
+        while pending:
+            index = len(self.slices) - 1
+            slice_ = self.slices[index]
+            room = max(slice_.capacity - self.counts[index], 0)
+            if room == 0:
+                self._add_slice(index + 1)
+                continue
+            batch, pending = pending[:room], pending[room:]
+            self.store.set(index, [slice_.positions(h) for h in batch])
+            self.counts[index] += len(batch)
+
+    def clear(self):
+        self.store.clear()
+        self.slices, self.counts = [], []
+        self._sync()
+
+
+def create_bloom_filter(name: str, config: dict):
+    backend = config.get("bloom_backend", "redis")
+    if backend == "none":
+        return None
+    if backend == "redis" and not redis_client.enabled:
+        debug.warn("Redis unavailable, falling back to mmap Bloom filter")
+        backend = "mmap"
+    store = (
+        RedisBitStore(name)
+        if backend == "redis"
+        else MmapBitStore(name, config.get("mmap_path", "data/bloom"))
+    )
+    return ScalableBloomFilter(
+        store,
+        initial_capacity=config.get("bloom_capacity", 1_000_000),
+        error_rate=config.get("bloom_error_rate", 0.001),
+    )
@@ -0,0 +1,191 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from ..config import current_config
+from .deadline import remaining
+from .metrics import (
+    bulkhead_in_use,
+    bulkhead_queue_depth,
+    bulkhead_rejected_total,
+    bulkhead_wait_seconds,
+    gauge_function,
+)
+
+admission_config = current_config.get("admission", {})
+
+
+class BulkheadFullError(RuntimeError):
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} is at capacity, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Bulkhead:
+    """Weighted concurrency limit for one endpoint, with a bounded FIFO queue.
+
+    Each request holds ``cost`` of ``capacity`` units while it runs (costs
+    are clamped to the capacity, so one huge request can still run alone).
+    Requests that do not fit wait in arrival order; when ``max_queue`` are
+    already waiting, or a request has waited ``max_wait`` seconds, it gets
+    BulkheadFullError carrying a Retry-After estimate derived from recent
+    hold times. Waiting holds no database connection: sessions check one
+    out on their first query.
+    """
+
+    def __init__(self, name: str, capacity: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_use = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._hold_seconds = 1.0  # EWMA of how long a unit of cost is held
+        gauge_function(
+            bulkhead_queue_depth.labels(endpoint=name), lambda: len(self._waiters)
+        )
+        gauge_function(bulkhead_in_use.labels(endpoint=name), lambda: self.in_use)
+
+    @classmethod
+    def from_config(cls, name: str, defaults: dict) -> "Bulkhead":
+        cfg = {**defaults, **admission_config.get(name, {})}
+        return cls(name, cfg["capacity"], cfg["max_queue"], cfg["max_wait"])
+
+    def retry_after(self) -> int:
+        backlog = self.in_use + sum(cost for cost, _ in self._waiters)
+        return max(1, math.ceil(self._hold_seconds * backlog / self.capacity))
+
+    def _reject(self, reason: str):
+        bulkhead_rejected_total.labels(endpoint=self.name, reason=reason).inc()
+        raise BulkheadFullError(self.name, self.retry_after())
+
+    def _abandon(self, cost: int, future: asyncio.Future):
+        future.cancel()
+        try:
+            self._waiters.remove((cost, future))
+        except ValueError:
+            pass
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if self.in_use + cost > self.capacity:
+                break
+            self._waiters.popleft()
+            self.in_use += cost
+            future.set_result(None)
+
+    async def acquire(self, cost: int = 1) -> Callable[[], None]:
+        """Waits for ``cost`` units; returns the (idempotent) release callback."""
+        cost = min(max(1, cost), self.capacity)
+        queued_at = time.perf_counter()
+        if not self._waiters and self.in_use + cost <= self.capacity:
+            self.in_use += cost
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self._reject("queue_full")
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((cost, future))
+            # Never queue past the request's own deadline
+            left = remaining()
+            max_wait = (
+                self.max_wait if left is None else max(0.0, min(self.max_wait, left))
+            )
+            try:
+                await asyncio.wait_for(asyncio.shield(future), max_wait)
+            except asyncio.TimeoutError:
+                if not future.done():
+                    self._abandon(cost, future)
+                    self._reject("timeout")
+            except asyncio.CancelledError:
+                if future.done():
+                    # Granted just as the caller went away: hand the units back
+                    self.in_use -= cost
+                self._abandon(cost, future)
+                raise
+        started = time.perf_counter()
+        bulkhead_wait_seconds.labels(endpoint=self.name).observe(started - queued_at)
+
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.in_use -= cost
+            held = (time.perf_counter() - started) / cost
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+            self._wake()
+
+        return release
+
+    @asynccontextmanager
+    async def admit(self, cost: int = 1):
+        release = await self.acquire(cost)
+        try:
+            yield
+        finally:
+            release()
+
+
+class RowEstimator:
+    """Estimates rows in a time range from the density seen by earlier queries."""
+
+    def __init__(self, rows_per_hour: float):
+        self.rows_per_second = rows_per_hour / 3600
+
+    def estimate(self, seconds: Optional[float]) -> Optional[float]:
+        return None if seconds is None else self.rows_per_second * max(seconds, 0)
+
+    def observe(self, rows: int, seconds: float):
+        if seconds > 0:
+            self.rows_per_second = 0.7 * self.rows_per_second + 0.3 * rows / seconds
+
+
+BULKHEAD_DEFAULTS: Dict[str, dict] = {
+    "statistics": {"capacity": 8, "max_queue": 16, "max_wait": 5},
+    "export": {"capacity": 4, "max_queue": 4, "max_wait": 2},
+    "search": {"capacity": 8, "max_queue": 32, "max_wait": 3},
+}
+
+bulkheads = {
+    name: Bulkhead.from_config(name, cfg) for name, cfg in BULKHEAD_DEFAULTS.items()
+}
+row_estimator = RowEstimator(admission_config.get("assumed_rows_per_hour", 10000))
+ROWS_PER_COST_UNIT = admission_config.get("rows_per_cost_unit", 100000)
+
+
+def estimate_cost(bulkhead: Bulkhead, seconds: Optional[float]) -> int:
+    """Cost units for scanning a time range; an open range costs the whole bulkhead."""
+    rows = row_estimator.estimate(seconds)
+    if rows is None:
+        return bulkhead.capacity
+    return math.ceil(rows / ROWS_PER_COST_UNIT)
+
+
+async def guard_stream(
+    release: Callable[[], None], stream: AsyncIterator[bytes]
+) -> AsyncIterator[bytes]:
+    """Holds a bulkhead permit until a streamed body finishes or is abandoned.
+
+    The wrapper is started before it is returned, so even if the response is
+    never sent the event loop's async-generator finalizer still runs
+    ``release``.
+    """
+
+    async def body():
+        try:
+            yield b""
+            async for chunk in stream:
+                yield chunk
+        finally:
+            release()
+
+    iterator = body()
+    await iterator.__anext__()
+    return iterator
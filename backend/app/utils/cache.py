@@ -19,11 +19,11 @@ def cache(prefix: str, ttl: Optional[int] = None):
             # 尝试从缓存获取
             cached_result = redis_client.get(cache_key)
             if cached_result is not None:
-                debug.log(f"Cache hit for function {func.__name__}")
+                debug.sample("cache_hit", "Cache hit for function %s", func.__name__)
                 return json.loads(cached_result)
 
             # 执行函数
-            debug.log(f"Cache miss for function {func.__name__}")
+            debug.sample("cache_miss", "Cache miss for function %s", func.__name__)
             result = await func(*args, **kwargs)
 
             # 缓存结果
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import current_config
+from ..database import set_statement_timeout
+from .metrics import request_deadline_exceeded_total
+
+deadline_config = current_config.get("deadlines", {})
+
+# Absolute time.monotonic() by which the current request must finish
+request_deadline: ContextVar[Optional[float]] = ContextVar(
+    "request_deadline", default=None
+)
+
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when it has no deadline."""
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check(stage: str):
+    left = remaining()
+    if left is not None and left <= 0:
+        request_deadline_exceeded_total.labels(stage=stage).inc()
+        raise DeadlineExceeded(f"Request deadline exceeded before {stage}")
+
+
+async def checkpoint(stage: str):
+    """Yields to the loop so a pending cancellation lands, then checks the deadline.
+
+    Called between CPU-bound steps, which otherwise run to completion even
+    after the client has gone.
+    """
+    await asyncio.sleep(0)
+    check(stage)
+
+
+async def apply_statement_timeout(session: AsyncSession, stage: str = "query"):
+    """Caps the session's current transaction at the time the request has left."""
+    left = remaining()
+    if left is None:
+        return
+    check(stage)
+    await set_statement_timeout(session, max(1, int(left * 1000)))
+
+
+def is_statement_timeout(error: Exception) -> bool:
+    return (
+        isinstance(error, DBAPIError)
+        and getattr(error.orig, "sqlstate", None) == QUERY_CANCELED_SQLSTATE
+    )
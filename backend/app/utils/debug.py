@@ -1,21 +1,59 @@
-from ..config import current_config
+import logging
+from typing import Dict, Optional
+
+from .logger import app_logger, logging_config
 
 
 class Debug:
-    def __init__(self):
-        self.enabled = current_config["debug"]
+    """Facade over the ``app`` logger, kept for the existing call sites.
 
-    def log(self, *args):
-        if self.enabled:
-            print("[DEBUG]", *args)
+    Messages take %-style arguments, which are only merged when the record
+    passes the level check: ``debug.log("Cache hit for key: %s", key)``.
+    ``sample`` is for per-request events such as cache hits; it emits one
+    in ``logging.sample_every[event]`` records and tags it with that rate.
+    """
 
-    def error(self, *args):
-        if self.enabled:
-            print("[ERROR]", *args)
+    def __init__(self, logger: logging.Logger, sample_every: Dict[str, int]):
+        self.logger = logger
+        # 级别在启动时确定, 这里缓存以免热路径每次都查
+        self.enabled = logger.isEnabledFor(logging.DEBUG)
+        self.sample_every = sample_every
+        self._seen: Dict[str, int] = {}
+
+    def _emit(self, level: int, msg: str, args: tuple, extra: Optional[dict] = None):
+        # 直接构造记录, 跳过 Logger._log 中逐帧查找调用位置的开销
+        self.logger.handle(
+            self.logger.makeRecord(
+                self.logger.name, level, "", 0, msg, args, None, None, extra
+            )
+        )
 
-    def warn(self, *args):
+    def log(self, msg: str, *args):
         if self.enabled:
-            print("[WARN]", *args)
+            self._emit(logging.DEBUG, msg, args)
+
+    def sample(self, event: str, msg: str, *args):
+        if not self.enabled:
+            return
+        every = self.sample_every.get(event, 1)
+        seen = self._seen.get(event, 0)
+        self._seen[event] = seen + 1
+        if seen % every == 0:
+            self._emit(
+                logging.DEBUG, msg, args, {"event": event, "sample_every": every}
+            )
+
+    def error(self, msg: str, *args, exc_info=False):
+        self.logger.error(msg, *args, exc_info=exc_info)
+
+    def warn(self, msg: str, *args):
+        self.logger.warning(msg, *args)
 
 
-debug = Debug()
+debug = Debug(
+    app_logger,
+    logging_config.get(
+        "sample_every",
+        {"cache_hit": 100, "cache_miss": 10, "cache_set": 10, "cache_disabled": 1000},
+    ),
+)
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from passlib.context import CryptContext
+
+from ..config import current_config
+from .metrics import (
+    password_hash_queue_seconds,
+    password_hash_rejected_total,
+    password_hash_seconds,
+)
+
+auth_config = current_config.get("auth", {})
+
+
+class PasswordHasherBusyError(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so ``workers`` threads give that many hashes in
+    parallel while the loop keeps serving other requests. At most
+    ``max_pending`` calls may wait or run at once; beyond that callers get
+    PasswordHasherBusyError immediately instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._pending = 0
+
+    async def _run(self, op: str, fn: Callable, *args):
+        if self._pending >= self.max_pending:
+            password_hash_rejected_total.labels(op=op).inc()
+            raise PasswordHasherBusyError("Too many concurrent password operations")
+
+        queued_at = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            password_hash_queue_seconds.labels(op=op).observe(started - queued_at)
+            try:
+                return fn(*args)
+            finally:
+                password_hash_seconds.labels(op=op).observe(
+                    time.perf_counter() - started
+                )
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(
+            "verify", self.context.verify, plain_password, hashed_password
+        )
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+
+password_hasher = PasswordHasher(
+    workers=auth_config.get("hash_workers", 4),
+    max_pending=auth_config.get("hash_max_pending", 64),
+)
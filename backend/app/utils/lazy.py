@@ -0,0 +1,38 @@
+import importlib
+from types import ModuleType
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access.
+
+    Used for the analytics stack (pandas, numpy, optionally polars), which
+    costs most of the import time of ``app.main`` and is only needed by the
+    statistics path.
+    Modules using it need ``from __future__ import annotations`` so that
+    annotations such as ``pd.DataFrame`` are not evaluated at import.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+pl = LazyModule("polars")
@@ -1,32 +1,82 @@
+import atexit
 import logging
-import sys
-from logging.handlers import RotatingFileHandler
 import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+from pythonjsonlogger import jsonlogger
 
-def setup_logger(name: str, log_file: str, level=logging.INFO):
-    formatter = logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+from ..config import current_config
 
-    handler = RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=5)
-    handler.setFormatter(formatter)
+logging_config = current_config.get("logging", {})
 
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
+JSON_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
 
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    logger.addHandler(handler)
-    logger.addHandler(console_handler)
 
-    return logger
+class DeferredQueueHandler(QueueHandler):
+    """Queues records without running the formatter in the caller's thread.
+
+    The base class copies and formats every record before queueing it; here
+    only the ``%`` merge of msg and args happens on the caller (args may be
+    mutated later), JSON encoding and I/O are left to the listener thread.
+    The ``app`` logger has no other handler, so the record is not copied.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _build_handlers(config: dict):
+    if config.get("json", True):
+        formatter = jsonlogger.JsonFormatter(
+            JSON_FORMAT, rename_fields={"levelname": "level", "name": "logger"}
+        )
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+        )
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = config.get("file")
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        handlers.append(
+            RotatingFileHandler(
+                log_file,
+                maxBytes=config.get("max_bytes", 10 * 1024 * 1024),
+                backupCount=config.get("backup_count", 5),
+            )
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def setup_logging(config: dict) -> QueueListener:
+    """Routes the ``app`` logger through a queue to a background writer thread."""
+    level = config.get("level") or ("DEBUG" if current_config["debug"] else "INFO")
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    logger = logging.getLogger("app")
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.handlers[:] = [DeferredQueueHandler(log_queue)]
+    # SQLAlchemy 以类所在模块命名连接池日志 (app.database.InstrumentedPool), 只保留警告
+    logging.getLogger("app.database").setLevel(logging.WARNING)
 
+    listener = QueueListener(
+        log_queue, *_build_handlers(config), respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
 
-# 创建日志目录
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
 
-# 设置不同的日志记录器
-app_logger = setup_logger("app", "logs/app.log")
-access_logger = setup_logger("access", "logs/access.log")
-error_logger = setup_logger("error", "logs/error.log")
+log_listener = setup_logging(logging_config)
+app_logger = logging.getLogger("app")
@@ -0,0 +1,299 @@
+import asyncio
+import os
+from typing import Callable, List, Tuple
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    make_asgi_app,
+    multiprocess,
+)
+
+# 多 worker 部署时设置 PROMETHEUS_MULTIPROC_DIR (启动前清空该目录),
+# 各进程把样本写入其中, /metrics 汇总所有进程
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# 入库去重: outcome = inserted / duplicate_in_batch / bloom_rejected /
+# bloom_false_positive / bloom_unverified / archived / db_conflict
+key_ingest_total = Counter(
+    "key_ingest_total",
+    "Keys received by the ingest endpoint, by deduplication outcome",
+    ["outcome"],
+)
+
+# 数据库连接池
+db_pool_checkout_wait_seconds = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(
+        0.0005,
+        0.001,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+    ),
+)
+db_pool_connections = Gauge(
+    "db_pool_connections",
+    "Connections in the shared engine pool, by state",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+
+# 只读副本路由
+replica_lag_seconds = Gauge(
+    "db_replica_lag_seconds",
+    "Last sampled replication lag per read replica (-1 when unreachable)",
+    ["replica"],
+    multiprocess_mode="livemax",
+)
+db_read_route_total = Counter(
+    "db_read_route_total",
+    "Analytics read sessions by the database they were routed to",
+    ["target"],
+)
+
+# 密码哈希线程池
+password_hash_queue_seconds = Histogram(
+    "password_hash_queue_seconds",
+    "Time a bcrypt call waited for a hashing thread",
+    ["op"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+password_hash_seconds = Histogram(
+    "password_hash_seconds",
+    "Time spent inside bcrypt",
+    ["op"],
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2),
+)
+password_hash_rejected_total = Counter(
+    "password_hash_rejected_total",
+    "bcrypt calls rejected because the hashing queue was full",
+    ["op"],
+)
+auth_verification_total = Counter(
+    "auth_verification_total",
+    "Login password checks by how they were resolved",
+    ["result"],
+)
+auth_token_cache_total = Counter(
+    "auth_token_cache_total",
+    "Bearer token resolutions by path (hit, claims, db, revoked, invalid)",
+    ["result"],
+)
+
+# 限流
+rate_limit_total = Counter(
+    "rate_limit_total",
+    "Rate limiter decisions by budget, outcome and backend (redis or local fallback)",
+    ["route", "result", "backend"],
+)
+
+# 重查询隔离 (bulkhead)
+bulkhead_queue_depth = Gauge(
+    "bulkhead_queue_depth",
+    "Requests waiting for admission, per endpoint",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+bulkhead_in_use = Gauge(
+    "bulkhead_in_use",
+    "Cost units held by running requests, per endpoint",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+bulkhead_wait_seconds = Histogram(
+    "bulkhead_wait_seconds",
+    "Time admitted requests waited in the bulkhead queue",
+    ["endpoint"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+bulkhead_rejected_total = Counter(
+    "bulkhead_rejected_total",
+    "Requests answered 503 by admission control (queue_full or timeout)",
+    ["endpoint", "reason"],
+)
+
+# 请求截止时间与断开取消
+request_deadline_exceeded_total = Counter(
+    "request_deadline_exceeded_total",
+    "Requests stopped because their deadline passed, by stage",
+    ["stage"],
+)
+request_cancelled_total = Counter(
+    "request_cancelled_total",
+    "Requests cancelled because the client disconnected, by route prefix",
+    ["route"],
+)
+
+# HTTP 请求
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by method, route template and status code",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+# Redis 缓存, family = 键的第一段 (statistics / recent_keys / high_score_keys / user / ...)
+# 命中率: rate(cache_requests_total{result="hit"}) / rate(cache_requests_total{op="get"})
+cache_operation_seconds = Histogram(
+    "cache_operation_seconds",
+    "Redis cache get/set latency by key family",
+    ["family", "op"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+cache_requests_total = Counter(
+    "cache_requests_total",
+    "Redis cache operations by key family and result (hit, miss, stored, error)",
+    ["family", "op", "result"],
+)
+
+# 数据库查询
+db_query_duration_seconds = Histogram(
+    "db_query_duration_seconds",
+    "Statement execution time by database, statement type and table",
+    ["database", "statement", "table"],
+    buckets=(
+        0.0005,
+        0.001,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+    ),
+)
+db_rows_fetched_total = Counter(
+    "db_rows_fetched_total",
+    "Rows returned or affected by statements, by database, statement type and table",
+    ["database", "statement", "table"],
+)
+
+# pandas 统计计算
+statistics_step_seconds = Histogram(
+    "statistics_step_seconds",
+    "Time spent in each statistics compute step",
+    ["step"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# 内存热窗口 (最近 N 小时的 key)
+hot_window_keys = Gauge(
+    "hot_window_keys",
+    "Keys held in the in-memory hot window",
+    multiprocess_mode="livemax",
+)
+hot_window_bytes = Gauge(
+    "hot_window_bytes",
+    "Bytes allocated for the hot window's column arrays, summed over workers",
+    multiprocess_mode="livesum",
+)
+
+# 变更订阅 (LISTEN/NOTIFY) 与缓存精确失效
+change_feed_events_total = Counter(
+    "change_feed_events_total",
+    "key_infos change notifications handled, by operation "
+    "(insert, update, delete, truncate, resync)",
+    ["op"],
+)
+change_feed_live = Gauge(
+    "change_feed_live",
+    "1 while the change feed listener is connected; the minimum over workers",
+    multiprocess_mode="livemin",
+)
+cache_invalidations_total = Counter(
+    "cache_invalidations_total",
+    "Cached ranges deleted because rows in their range changed",
+)
+
+# 仪表盘实时推送 (SSE)
+dashboard_stream_subscribers = Gauge(
+    "dashboard_stream_subscribers",
+    "Open live dashboard streams, summed over workers",
+    multiprocess_mode="livesum",
+)
+dashboard_stream_events_total = Counter(
+    "dashboard_stream_events_total",
+    "Live dashboard events published (delta, reset) "
+    "and subscribers dropped for falling behind",
+    ["event"],
+)
+
+# 分数排序索引 (阈值扫描)
+score_index_bytes = Gauge(
+    "score_index_bytes",
+    "Bytes of sorted per-hour scores held by the threshold sweep index, "
+    "summed over workers",
+    multiprocess_mode="livesum",
+)
+score_index_buckets_total = Counter(
+    "score_index_buckets_total",
+    "Hour buckets used by threshold sweeps, "
+    "by whether they were indexed (hit) or loaded",
+    ["result"],
+)
+
+# 保留任务: 折叠归档的 key 数与各批次耗时
+retention_keys_total = Counter(
+    "retention_keys_total",
+    "Aged keys folded into hourly rollups, archived and deleted by the retention job",
+)
+retention_batch_seconds = Histogram(
+    "retention_batch_seconds",
+    "Duration of one retention transaction (lock, archive, fold, delete, commit)",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+
+# Function-backed gauges are read at scrape time in the scraping process,
+# which in multiprocess mode is not the process that owns the state, so
+# there they are sampled into the shared files periodically instead.
+_sampled_gauges: List[Tuple[Gauge, Callable[[], float]]] = []
+GAUGE_SAMPLE_INTERVAL = 5
+
+
+def gauge_function(child: Gauge, fn: Callable[[], float]):
+    if MULTIPROCESS:
+        _sampled_gauges.append((child, fn))
+    else:
+        child.set_function(fn)
+
+
+async def sample_gauges():
+    """Background task for multiprocess mode; a no-op loop otherwise."""
+    while _sampled_gauges:
+        for child, fn in _sampled_gauges:
+            child.set(fn())
+        await asyncio.sleep(GAUGE_SAMPLE_INTERVAL)
+
+
+def metrics_app():
+    if not MULTIPROCESS:
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
+def mark_process_dead():
+    # live* 模式的 gauge 需要在进程退出时清理, 否则已退出 worker 的值仍被汇总
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,75 +1,156 @@
 from redis.client import Redis
 from typing import Optional, Any
 import json
+import time
 from ..config import current_config
 from .debug import debug
+from .metrics import cache_operation_seconds, cache_requests_total
+from .timing import record
 
 redis_config = current_config.get("redis", {})
 if not redis_config:
     debug.error("Redis configuration is empty")
 
+# 指标按键的第一段分组; 其他键归入 other, 避免标签基数失控
+KEY_FAMILIES = {"statistics", "recent_keys", "high_score_keys", "user", "token", "auth"}
+
+
+def key_family(key: str) -> str:
+    family = key.split(":", 1)[0]
+    return family if family in KEY_FAMILIES else "other"
+
 
 class RedisClient:
-    def __init__(self):
-        self.enabled = True
-        try:
-            host = redis_config.get("host")
-            port = redis_config.get("port")
-            if not host or not port:
-                raise ValueError(f"Invalid Redis config - host: {host}, port: {port}")
+    """Synchronous Redis cache client.
+
+    Nothing touches the network at import: the connection is checked by
+    ``connect()``, which the application lifespan runs off the event loop
+    during warm-up. Scripts and the CLI that never call it connect on the
+    first read of ``enabled``.
 
-            self.client = Redis(
+    ``fast_client`` is a second connection pool to the same server whose
+    commands time out after ``socket_timeout`` seconds (100 ms by default).
+    Per-request checks that have a local fallback, such as the rate limiter,
+    use it so a Redis that stops answering raises instead of stalling the
+    worker. ``client`` keeps blocking reads, which pub/sub listeners need.
+    """
+
+    def __init__(self):
+        self._enabled: Optional[bool] = None
+        self.client: Optional[Redis] = None
+        self.fast_client: Optional[Redis] = None
+        host = redis_config.get("host")
+        port = redis_config.get("port")
+        if host and port:
+            settings = dict(
                 host=host,
                 port=port,
                 password=redis_config.get("password"),
                 db=redis_config.get("db", 0),
                 decode_responses=True,
+                socket_connect_timeout=redis_config.get("connect_timeout", 2),
+            )
+            self.client = Redis(**settings)
+            timeout = redis_config.get("socket_timeout", 0.1)
+            self.fast_client = Redis(
+                **{
+                    **settings,
+                    "socket_connect_timeout": timeout,
+                    "socket_timeout": timeout,
+                }
             )
+        else:
+            debug.error("Invalid Redis config - host: %s, port: %s", host, port)
+            self._enabled = False
+        self.prefix = redis_config.get("prefix", "key_analyzer:")
+        self.ttl = redis_config.get("ttl", 3600)  # 默认缓存1小时
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            self.connect()
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value: bool):
+        self._enabled = value
+
+    def connect(self) -> bool:
+        if self.client is None:
+            return False
+        try:
             # 测试连接
             self.client.ping()
-            debug.log(f"Redis connected successfully to {host}:{port}")
+            debug.log(
+                "Redis connected successfully to %s:%s",
+                redis_config.get("host"),
+                redis_config.get("port"),
+            )
+            self._enabled = True
         except Exception as e:
-            debug.error(f"Redis connection failed: {str(e)}")
-            debug.error(f"Redis config: {redis_config}")
-            self.enabled = False
-        self.prefix = redis_config.get("prefix", "key_analyzer:")
-        self.ttl = redis_config.get("ttl", 3600)  # 默认缓存1小时
-        debug.log(f"Redis initialized with prefix: {self.prefix}, ttl: {self.ttl}")
+            debug.error("Redis connection failed: %s", e)
+            debug.error("Redis config: %s", redis_config)
+            self._enabled = False
+        debug.log("Redis initialized with prefix: %s, ttl: %s", self.prefix, self.ttl)
+        return self._enabled
 
     def _get_key(self, key: str) -> str:
         return f"{self.prefix}{key}"
 
     def get(self, key: str) -> Optional[Any]:
         if not self.enabled:
-            debug.log("Redis is disabled")
+            debug.sample("cache_disabled", "Redis is disabled")
             return None
+        family = key_family(key)
+        started = time.perf_counter()
         try:
             data = self.client.get(self._get_key(key))
+            elapsed = time.perf_counter() - started
+            cache_operation_seconds.labels(family, "get").observe(elapsed)
+            record("redis", elapsed)
             if data:
-                debug.log(f"Cache hit for key: {key}, value length: {len(data)}")
+                cache_requests_total.labels(family, "get", "hit").inc()
+                debug.sample(
+                    "cache_hit",
+                    "Cache hit for key: %s, value length: %s",
+                    key,
+                    len(data),
+                )
                 return json.loads(data)
-            debug.log(f"Cache miss for key: {key}")
+            cache_requests_total.labels(family, "get", "miss").inc()
+            debug.sample("cache_miss", "Cache miss for key: %s", key)
             return None
         except Exception as e:
-            debug.error(f"Redis get error for key {key}: {str(e)}")
+            cache_requests_total.labels(family, "get", "error").inc()
+            debug.error("Redis get error for key %s: %s", key, e)
             return None
 
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         if not self.enabled:
-            debug.log("Redis is disabled")
+            debug.sample("cache_disabled", "Redis is disabled")
             return False
+        family = key_family(key)
+        started = time.perf_counter()
         try:
             key = self._get_key(key)
             data = json.dumps(value)
-            debug.log(f"Attempting to cache data with key: {key}, size: {len(data)}")
             self.client.set(key, data, ex=ttl or self.ttl)
-            debug.log(
-                f"Successfully cached data with key: {key}, ttl: {ttl or self.ttl}"
+            elapsed = time.perf_counter() - started
+            cache_operation_seconds.labels(family, "set").observe(elapsed)
+            record("redis", elapsed)
+            cache_requests_total.labels(family, "set", "stored").inc()
+            debug.sample(
+                "cache_set",
+                "Cached key: %s, size: %s, ttl: %s",
+                key,
+                len(data),
+                ttl or self.ttl,
             )
             return True
         except Exception as e:
-            debug.error(f"Redis set error for key {key}: {str(e)}")
-            debug.error(f"Failed data: {str(value)[:100]}...")
+            cache_requests_total.labels(family, "set", "error").inc()
+            debug.error("Redis set error for key %s: %s", key, e)
+            debug.error("Failed data: %.100s...", value)
             return False
 
     def delete(self, key: str) -> bool:
@@ -77,10 +158,10 @@ class RedisClient:
             return False
         try:
             self.client.delete(self._get_key(key))
-            debug.log(f"Cache delete: {key}")
+            debug.log("Cache delete: %s", key)
             return True
         except Exception as e:
-            debug.error(f"Redis delete error: {e}")
+            debug.error("Redis delete error: %s", e)
             return False
 
     def clear_prefix(self, prefix: str) -> bool:
@@ -91,10 +172,10 @@ class RedisClient:
             keys = self.client.keys(pattern)
             if keys:
                 self.client.delete(*keys)
-                debug.log(f"Cache clear pattern: {pattern}")
+                debug.log("Cache clear pattern: %s", pattern)
             return True
         except Exception as e:
-            debug.error(f"Redis clear pattern error: {e}")
+            debug.error("Redis clear pattern error: %s", e)
             return False
 
 
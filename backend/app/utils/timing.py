@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+# name -> [total seconds, count] for the current request; None outside one
+request_spans: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar(
+    "request_spans", default=None
+)
+
+
+def record(name: str, seconds: float):
+    spans = request_spans.get()
+    if spans is None:
+        return
+    entry = spans.get(name)
+    if entry is None:
+        spans[name] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def span(name: str):
+    if request_spans.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def server_timing(spans: Dict[str, List[float]], total: float) -> bytes:
+    """Server-Timing header value; repeated spans are summed and their count shown."""
+    parts = []
+    for name, (seconds, count) in spans.items():
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if count > 1:
+            part += f';desc="{count}x"'
+        parts.append(part)
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class; records JSON rendering as the ``json`` span."""
+
+    def render(self, content) -> bytes:
+        with span("json"):
+            return super().render(content)
@@ -0,0 +1,201 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .debug import debug
+from .redis import redis_client
+
+
+class TokenCache:
+    """Per-process cache of verified access tokens, with revocation broadcast.
+
+    Entries are keyed by the SHA-256 of the token (the raw token is never
+    stored) and live until the token's own ``exp``, so a hit never outlives
+    the signature check it replaces. The cache is an LRU bounded by
+    ``max_entries``.
+
+    Revoking a token or disabling a user is recorded in two Redis sorted sets
+    (scored by when the record stops mattering) and announced on a pub/sub
+    channel. Every worker runs ``listen()`` in a daemon thread: it reloads both
+    sets on each (re)subscribe, so workers started later or reconnecting after
+    a blip still see earlier events, then applies events as they arrive.
+    Without Redis, revocations only reach the current process.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self._disabled: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def _key(self, name: str) -> str:
+        return redis_client._get_key(f"auth:{name}")
+
+    def get(self, token_hash: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None:
+                return None
+            user_data, exp = entry
+            if exp <= now:
+                del self._entries[token_hash]
+                return None
+            self._entries.move_to_end(token_hash)
+            return user_data
+
+    def put(self, token_hash: str, user_data: dict, exp: float):
+        with self._lock:
+            self._entries[token_hash] = (user_data, exp)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, token_hash: str) -> bool:
+        return self._revoked.get(token_hash, 0) > time.time()
+
+    def is_disabled(self, username: str) -> bool:
+        return self._disabled.get(username, 0) > time.time()
+
+    def _apply(self, event: dict):
+        kind = event.get("type")
+        with self._lock:
+            if kind == "revoke_token":
+                self._revoked[event["token_hash"]] = event["until"]
+                self._entries.pop(event["token_hash"], None)
+            elif kind == "disable_user":
+                self._disabled[event["username"]] = event["until"]
+                for token_hash, (user_data, _) in list(self._entries.items()):
+                    if user_data["username"] == event["username"]:
+                        del self._entries[token_hash]
+            elif kind == "enable_user":
+                self._disabled.pop(event["username"], None)
+            now = time.time()
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+            self._disabled = {k: v for k, v in self._disabled.items() if v > now}
+
+    def _publish(self, event: dict, record: Optional[Tuple[str, str, float]] = None):
+        # 先在本进程生效, 再写入 Redis 并广播给其他 worker
+        self._apply(event)
+        if not redis_client.enabled:
+            return
+        try:
+            pipe = redis_client.client.pipeline()
+            if record is not None:
+                name, member, score = record
+                if score:
+                    pipe.zadd(self._key(name), {member: score})
+                else:
+                    pipe.zrem(self._key(name), member)
+            pipe.publish(self._key("events"), json.dumps(event))
+            pipe.execute()
+        except Exception as e:
+            debug.error("Auth event publish failed: %s", e)
+
+    def revoke_token(self, token_hash: str, exp: float):
+        event = {"type": "revoke_token", "token_hash": token_hash, "until": exp}
+        self._publish(event, ("revoked_tokens", token_hash, exp))
+
+    def disable_user(self, username: str, until: float):
+        """``until``: when the newest token issued before the disable expires."""
+        event = {"type": "disable_user", "username": username, "until": until}
+        self._publish(event, ("disabled_users", username, until))
+
+    def enable_user(self, username: str):
+        event = {"type": "enable_user", "username": username}
+        self._publish(event, ("disabled_users", username, 0))
+
+    def _reload(self):
+        now = time.time()
+        pipe = redis_client.client.pipeline()
+        for name in ("revoked_tokens", "disabled_users"):
+            pipe.zremrangebyscore(self._key(name), "-inf", now)
+            pipe.zrangebyscore(self._key(name), now, "+inf", withscores=True)
+        _, revoked, _, disabled = pipe.execute()
+        with self._lock:
+            self._revoked = dict(revoked)
+            self._disabled = dict(disabled)
+            for token_hash in self._revoked:
+                self._entries.pop(token_hash, None)
+            for token_hash, (user_data, _) in list(self._entries.items()):
+                if user_data["username"] in self._disabled:
+                    del self._entries[token_hash]
+
+    def listen(self):
+        """Blocking subscriber loop; run in a daemon thread via ``start()``."""
+        while True:
+            try:
+                pubsub = redis_client.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._key("events"))
+                self._reload()
+                for message in pubsub.listen():
+                    self._apply(json.loads(message["data"]))
+            except Exception as e:
+                debug.error("Auth event subscription lost: %s", e)
+                time.sleep(1)
+
+    def start(self):
+        if not redis_client.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self.listen, name="auth-events", daemon=True
+        )
+        self._thread.start()
+
+
+class VerificationCache:
+    """Per-process record of recent successful password checks.
+
+    Repeat logins skip bcrypt.
+
+    Entries are HMAC-SHA256 digests of username, password and stored hash,
+    keyed with random bytes generated when the process starts. Neither the
+    key nor the digests leave the process, so nothing readable from Redis or
+    the repository lets anyone test password guesses at HMAC speed. The
+    stored hash is part of the message, so a password change invalidates old
+    entries. Bounded LRU; entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._secret = os.urandom(32)
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def digest(self, username: str, password: str, hashed_password: str) -> str:
+        message = "\0".join((username, password, hashed_password)).encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def contains(self, digest: str) -> bool:
+        with self._lock:
+            expires = self._entries.get(digest)
+            if expires is None:
+                return False
+            if expires <= time.monotonic():
+                del self._entries[digest]
+                return False
+            self._entries.move_to_end(digest)
+            return True
+
+    def add(self, digest: str):
+        with self._lock:
+            self._entries[digest] = time.monotonic() + self.ttl
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest: str):
+        with self._lock:
+            self._entries.pop(digest, None)
@@ -0,0 +1,97 @@
+"""Per-request cost of resolving the bearer token in get_current_user.
+
+    cd backend
+    python -m benchmarks.bench_auth_overhead --requests 20000
+
+Before this change every request paid a Redis GET on ``token:{token}`` and,
+on a miss, a JWT decode plus a database session. ``before/redis-hit`` times
+that GET (skipped without Redis); ``before/decode`` is the decode alone, a
+lower bound for the miss path since the database round trip is left out.
+``after/claims`` is a first request with a fresh token (decode, no database),
+``after/hit`` every later one.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import timedelta
+
+from jose import jwt
+
+from app.auth import (
+    ALGORITHM,
+    SECRET_KEY,
+    create_access_token,
+    get_current_user,
+    token_cache,
+    user_claims,
+)
+from app.utils.redis import redis_client
+
+
+class BenchUser:
+    username = "bench"
+    email = "bench@example.com"
+    full_name = "Bench User"
+    disabled = False
+
+
+def report(name: str, samples: list):
+    samples.sort()
+    print(
+        f"{name:<18} mean {statistics.mean(samples) * 1e6:8.1f} us  "
+        f"p50 {samples[len(samples) // 2] * 1e6:8.1f} us  "
+        f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e6:8.1f} us"
+    )
+
+
+async def main(args):
+    expires = timedelta(minutes=30)
+    token = create_access_token(user_claims(BenchUser()), expires)
+
+    if redis_client.enabled:
+        cache_key = redis_client._get_key(f"token:{token}")
+        redis_client.client.set(cache_key, json.dumps({"username": "bench"}), ex=60)
+        samples = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            json.loads(redis_client.client.get(cache_key))
+            samples.append(time.perf_counter() - started)
+        redis_client.client.delete(cache_key)
+        report("before/redis-hit", samples)
+    else:
+        print("before/redis-hit   skipped (Redis unavailable)")
+
+    samples = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        samples.append(time.perf_counter() - started)
+    report("before/decode", samples)
+
+    tokens = [
+        create_access_token(user_claims(BenchUser()), expires)
+        for _ in range(args.requests)
+    ]
+    token_cache.max_entries = max(token_cache.max_entries, len(tokens))
+    samples = []
+    for fresh in tokens:
+        started = time.perf_counter()
+        await get_current_user(fresh)
+        samples.append(time.perf_counter() - started)
+    report("after/claims", samples)
+
+    samples = []
+    for cached in tokens:
+        started = time.perf_counter()
+        await get_current_user(cached)
+        samples.append(time.perf_counter() - started)
+    report("after/hit", samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,438 @@
+"""Load test replaying the dashboard's traffic against app.main:app.
+
+    cd backend
+    docker compose -f ../docker-compose.yml up -d postgres redis
+    alembic upgrade head
+    # in-process (ASGI transport, runs the app lifespan itself)
+    python -m benchmarks.bench_dashboard_load --users 20 --duration 60 --create-user --seed-rows 200k
+    # against a running server
+    python -m benchmarks.bench_dashboard_load --url http://localhost:8000 --rate 15 --duration 60
+
+Each virtual user logs in like the frontend (POST /api/auth/token, then
+GET /api/users/me) and then refreshes the dashboard. A refresh is the three
+concurrent calls KeyAnalysis.vue makes: /api/keys/recent,
+/api/keys/high-score and /api/statistics. The range is chosen per refresh
+from ``--mix``:
+
+- ``today``: local midnight to now. /keys/recent uses the last 24 hours,
+  like getRecentKeys. The end is the current millisecond, so the window
+  slides and its cache keys change on every refresh, as in production.
+- ``week``: a custom range of the last seven whole days, which is stable
+  and cacheable.
+- ``all``: no range.
+
+Closed loop (default): ``--users`` users refresh back to back, with
+``--think`` seconds between refreshes. Open loop: ``--rate`` refreshes per
+second arrive as a Poisson process, each on a random user's session,
+however slow the server gets.
+
+Reported: p50/p95/p99 latency per endpoint and per refresh, throughput,
+status counts, the Redis cache hit ratio and DB pool checkout wait. The
+last two are diffs of /metrics scraped before and after. Raise
+rate_limit or set rate_limit.enabled to false for the bench user, or the
+run measures 429s.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import pytz
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.bench_key_analyzer import parse_size, seed
+from benchmarks.results import Results
+from benchmarks.synthetic import SyntheticKeys
+
+LOCAL_TZ = pytz.timezone("Asia/Shanghai")
+DASHBOARD_FAMILIES = ("statistics", "recent_keys", "high_score_keys")
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+# KeyAnalysis.vue 按趋势图宽度请求降采样后的点数
+TREND_MAX_POINTS = 600
+
+
+def _ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def dashboard_params(kind: str) -> Tuple[Optional[dict], Optional[dict]]:
+    """(params for /keys/recent, params for /keys/high-score and /statistics)."""
+    now = datetime.now(LOCAL_TZ)
+    if kind == "all":
+        return None, None
+    if kind == "today":
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return (
+            {"start": _ms(now - timedelta(hours=24)), "end": _ms(now)},
+            {"start": _ms(midnight), "end": _ms(now)},
+        )
+    if kind == "week":
+        first = (now - timedelta(days=6)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        last = now.replace(hour=23, minute=59, second=59, microsecond=999000)
+        params = {"start": _ms(first), "end": _ms(last)}
+        return params, params
+    raise ValueError(f"Unknown range kind: {kind}")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def observe(
+        self,
+        name: str,
+        seconds: float,
+        status: Optional[int] = None,
+        failed: bool = False,
+    ):
+        self.latencies[name].append(seconds)
+        if failed:
+            self.errors[name] += 1
+        elif status is not None:
+            self.statuses[f"{name} {status}"] += 1
+
+
+class VirtualUser:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        recorder: Recorder,
+        username: str,
+        password: str,
+    ):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.headers: Dict[str, str] = {}
+
+    async def _call(
+        self, name: str, method: str, url: str, **kwargs
+    ) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(
+                method, url, headers=self.headers, **kwargs
+            )
+        except httpx.HTTPError:
+            self.recorder.observe(name, time.perf_counter() - started, failed=True)
+            return None
+        self.recorder.observe(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def login(self) -> bool:
+        response = await self._call(
+            "login",
+            "POST",
+            "/api/auth/token",
+            data={"username": self.username, "password": self.password},
+        )
+        if response is None or response.status_code != 200:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        await self._call("users/me", "GET", "/api/users/me")
+        return True
+
+    async def refresh(self, kind: str):
+        recent_params, range_params = dashboard_params(kind)
+        started = time.perf_counter()
+        await asyncio.gather(
+            self._call("keys/recent", "GET", "/api/keys/recent", params=recent_params),
+            self._call(
+                "keys/high-score", "GET", "/api/keys/high-score", params=range_params
+            ),
+            self._call(
+                "statistics",
+                "GET",
+                "/api/statistics",
+                params={**(range_params or {}), "max_points": TREND_MAX_POINTS},
+            ),
+        )
+        self.recorder.observe(f"refresh[{kind}]", time.perf_counter() - started)
+
+
+async def scrape(client: httpx.AsyncClient) -> Dict[Tuple[str, Tuple], float]:
+    response = await client.get("/metrics/")
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    return samples
+
+
+def metric_delta(before: dict, after: dict, name: str, **labels) -> float:
+    total = 0.0
+    for (sample_name, sample_labels), value in after.items():
+        if sample_name != name:
+            continue
+        label_map = dict(sample_labels)
+        if all(label_map.get(key) == wanted for key, wanted in labels.items()):
+            total += value - before.get((sample_name, sample_labels), 0.0)
+    return total
+
+
+def histogram_quantile(
+    before: dict, after: dict, name: str, quantile: float
+) -> Optional[float]:
+    """Upper bucket bound reached by ``quantile`` of the observations made during the run."""
+    buckets = defaultdict(float)
+    for (sample_name, sample_labels), value in after.items():
+        if sample_name == f"{name}_bucket":
+            buckets[float(dict(sample_labels)["le"])] += value - before.get(
+                (sample_name, sample_labels), 0.0
+            )
+    total = buckets.get(float("inf"), 0.0)
+    if not total:
+        return None
+    for bound in sorted(buckets):
+        if buckets[bound] >= quantile * total:
+            return bound
+    return None
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def closed_loop(
+    users: List[VirtualUser], kinds, weights, duration: float, think: float
+):
+    stop_at = time.perf_counter() + duration
+
+    async def run(user: VirtualUser):
+        while time.perf_counter() < stop_at:
+            await user.refresh(random.choices(kinds, weights)[0])
+            if think:
+                await asyncio.sleep(random.expovariate(1 / think))
+
+    await asyncio.gather(*(run(user) for user in users))
+
+
+async def open_loop(
+    users: List[VirtualUser], kinds, weights, duration: float, rate: float
+):
+    stop_at = time.perf_counter() + duration
+    in_flight = set()
+    while time.perf_counter() < stop_at:
+        task = asyncio.create_task(
+            random.choice(users).refresh(random.choices(kinds, weights)[0])
+        )
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+        await asyncio.sleep(random.expovariate(rate))
+    await asyncio.gather(*in_flight)
+
+
+async def prepare_database(args):
+    from sqlalchemy import select
+
+    from app import models
+    from app.auth import get_password_hash
+    from app.database import async_session
+
+    if args.create_user:
+        async with async_session() as db:
+            exists = (
+                await db.execute(
+                    select(models.User).where(models.User.username == args.username)
+                )
+            ).scalar_one_or_none()
+            if exists is None:
+                db.add(
+                    models.User(
+                        id=str(uuid.uuid4()),
+                        username=args.username,
+                        hashed_password=get_password_hash(args.password),
+                    )
+                )
+                await db.commit()
+    if args.seed_rows:
+        # 合成数据截止到当前时刻, today/week 区间内都有数据
+        keys_per_hour = args.seed_rows / (24 * 30)
+        start = datetime.now(LOCAL_TZ).replace(tzinfo=None) - timedelta(days=30)
+        await seed(
+            SyntheticKeys(seed=args.seed, start=start, keys_per_hour=keys_per_hour),
+            args.seed_rows,
+        )
+
+
+async def drive(client: httpx.AsyncClient, args) -> Tuple[Recorder, float, dict, dict]:
+    recorder = Recorder()
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    users = [
+        VirtualUser(client, recorder, args.username, args.password)
+        for _ in range(args.users)
+    ]
+    logged_in = await asyncio.gather(*(user.login() for user in users))
+    users = [user for user, ok in zip(users, logged_in) if ok]
+    if not users:
+        raise SystemExit(
+            "No virtual user could log in; check --username/--password or pass --create-user"
+        )
+
+    before = await scrape(client)
+    started = time.perf_counter()
+    if args.rate:
+        await open_loop(users, kinds, weights, args.duration, args.rate)
+    else:
+        await closed_loop(users, kinds, weights, args.duration, args.think)
+    elapsed = time.perf_counter() - started
+    after = await scrape(client)
+    return recorder, elapsed, before, after
+
+
+def report(recorder: Recorder, elapsed: float, before: dict, after: dict, args):
+    results = Results(
+        "dashboard_load",
+        {
+            key: getattr(args, key)
+            for key in ("url", "users", "rate", "think", "duration", "mix")
+        },
+    )
+    print()
+    for name in sorted(recorder.latencies):
+        samples = recorder.latencies[name]
+        print(
+            f"{name:<20} n={len(samples):<6} {len(samples) / elapsed:7.1f}/s  "
+            f"p50 {percentile(samples, 0.50) * 1000:8.1f} ms  "
+            f"p95 {percentile(samples, 0.95) * 1000:8.1f} ms  "
+            f"p99 {percentile(samples, 0.99) * 1000:8.1f} ms"
+        )
+        results.rows.append(
+            {
+                "name": name,
+                "rows": None,
+                "count": len(samples),
+                "throughput_per_s": len(samples) / elapsed,
+                "median_ms": statistics.median(samples) * 1000,
+                "p95_ms": percentile(samples, 0.95) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+            }
+        )
+
+    print("\nstatus codes:", dict(sorted(recorder.statuses.items())))
+    if recorder.errors:
+        print("transport errors:", dict(recorder.errors))
+
+    cache = {}
+    for family in DASHBOARD_FAMILIES:
+        hits = metric_delta(
+            before, after, "cache_requests_total", family=family, op="get", result="hit"
+        )
+        misses = metric_delta(
+            before,
+            after,
+            "cache_requests_total",
+            family=family,
+            op="get",
+            result="miss",
+        )
+        cache[family] = hits / (hits + misses) if hits + misses else None
+        shown = f"{cache[family]:.1%}" if cache[family] is not None else "n/a"
+        print(
+            f"cache hit ratio {family:<16} {shown}  ({hits:.0f} hits, {misses:.0f} misses)"
+        )
+
+    waits = metric_delta(before, after, "db_pool_checkout_wait_seconds_count")
+    wait_sum = metric_delta(before, after, "db_pool_checkout_wait_seconds_sum")
+    wait_p95 = histogram_quantile(before, after, "db_pool_checkout_wait_seconds", 0.95)
+    if waits:
+        print(
+            f"db checkout wait       mean {wait_sum / waits * 1000:.2f} ms over {waits:.0f} checkouts, "
+            f"p95 <= {wait_p95 * 1000:.1f} ms"
+        )
+    results.parameters.update(
+        {
+            "elapsed_seconds": elapsed,
+            "statuses": dict(recorder.statuses),
+            "cache_hit_ratio": cache,
+            "db_checkout_wait_mean_ms": wait_sum / waits * 1000 if waits else None,
+            "db_checkout_wait_p95_ms": (
+                wait_p95 * 1000 if wait_p95 is not None else None
+            ),
+        }
+    )
+    results.write(args.output)
+
+
+async def main(args):
+    random.seed(args.seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.url:
+        async with httpx.AsyncClient(
+            base_url=args.url, timeout=args.timeout, limits=limits
+        ) as client:
+            outcome = await drive(client, args)
+    else:
+        from app.main import app
+
+        await prepare_database(args)
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench", timeout=args.timeout
+            ) as client:
+                outcome = await drive(client, args)
+    report(*outcome, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--url", default=None, help="server to drive; in-process ASGI when omitted"
+    )
+    parser.add_argument(
+        "--users", type=int, default=10, help="virtual users (closed-loop concurrency)"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=0, help="open loop: refreshes per second"
+    )
+    parser.add_argument(
+        "--think",
+        type=float,
+        default=1.0,
+        help="closed loop: mean seconds between refreshes",
+    )
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--mix", default="today=0.7,week=0.2,all=0.1")
+    parser.add_argument("--username", default="bench")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument(
+        "--create-user",
+        action="store_true",
+        help="in-process: create the user if missing",
+    )
+    parser.add_argument(
+        "--seed-rows",
+        type=parse_size,
+        default=0,
+        help="in-process: seed synthetic keys up to now",
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument(
+        "--output", default=None, help="results file (default benchmarks/results/)"
+    )
+    asyncio.run(main(parser.parse_args()))
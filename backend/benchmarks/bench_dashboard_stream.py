@@ -0,0 +1,125 @@
+"""Live dashboard push: cost of one delta and of fanning it out.
+
+    cd backend
+    python -m benchmarks.bench_dashboard_stream --keys 100k,1M --subscribers 1,100,1000
+
+The shared hot window is filled with synthetic keys spread over its hours,
+ending now, and the last ``--batch`` keys are treated as the newly
+ingested ones. For each size the benchmark reports:
+
+- ``delta``: computing one delta (new keys, today's summary, touched trend
+  buckets) from the window;
+- ``publish``: one delta encoded once and queued for every subscriber, as
+  the broadcaster does;
+- ``per-subscriber delta``: the same work done once per subscriber, which
+  is what each client polling the REST endpoints would cost.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+import pytz
+
+from app.services.dashboard_stream import DashboardBroadcaster, encode_event
+from app.services.hot_window import hot_window
+from benchmarks.bench_hot_window import SOURCE_NAMES
+from benchmarks.bench_key_analyzer import parse_size
+from benchmarks.results import Results, timed
+from benchmarks.synthetic import SyntheticKeys
+
+
+def fill(n: int, args):
+    local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+    cutoff = local_now - timedelta(hours=hot_window.hours)
+    keys = SyntheticKeys(
+        seed=args.seed,
+        start=cutoff + timedelta(minutes=1),
+        keys_per_hour=n / hot_window.hours,
+    )
+    columns = keys.columns(n)
+    rows = list(zip(*[columns[name].tolist() for name in SOURCE_NAMES]))
+    # 合成数据的时间可能超过当前时间, 整体平移到以现在结束
+    shift = local_now - rows[-1][1]
+    rows = [(row[0], row[1] + shift, *row[2:]) for row in rows]
+    hot_window._reset()
+    for offset in range(0, n, hot_window.REFRESH_BATCH):
+        hot_window.append(rows[offset : offset + hot_window.REFRESH_BATCH], cutoff)
+    hot_window.evict(cutoff)
+    hot_window.ready = True
+
+
+def run(results: Results, n: int, args):
+    fill(n, args)
+    broadcaster = DashboardBroadcaster(enabled=True)
+    after = hot_window.last_row_id - args.batch
+    if not broadcaster.available():
+        results.skip("delta", n, "hot window does not cover today")
+        return
+    latest = hot_window.last_row_id
+    today = len(hot_window.columns(*broadcaster._today(), names=("score",))["score"])
+    results.add(
+        f"delta[batch={args.batch}]",
+        today,
+        timed(lambda: broadcaster.delta(after, latest), args.repeat),
+    )
+
+    for count in [parse_size(value) for value in args.subscribers.split(",")]:
+        queues = [asyncio.Queue() for _ in range(count)]
+
+        def setup():
+            for queue in queues:
+                while not queue.empty():
+                    queue.get_nowait()
+            broadcaster._subscribers = set(queues)
+            broadcaster.last_id = after
+
+        results.add(
+            f"publish[subscribers={count}]",
+            today,
+            timed(lambda _: broadcaster.publish(), args.repeat, setup=setup),
+        )
+        results.add(
+            f"per-subscriber delta[subscribers={count}]",
+            today,
+            timed(
+                lambda: [
+                    encode_event("delta", broadcaster.delta(after, latest), latest)
+                    for _ in queues
+                ],
+                args.repeat,
+            ),
+        )
+
+
+def main(args):
+    sizes = [parse_size(size) for size in args.keys.split(",")]
+    results = Results(
+        "dashboard_stream",
+        {
+            "keys": sizes,
+            "hours": hot_window.hours,
+            "batch": args.batch,
+            "subscribers": args.subscribers,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+    )
+    for n in sizes:
+        run(results, n, args)
+    results.write(args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", default="100k,1M", help="keys held in the window")
+    parser.add_argument(
+        "--batch", type=int, default=100, help="newly ingested keys per delta"
+    )
+    parser.add_argument("--subscribers", default="1,100,1000")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--output", default=None, help="results file (default benchmarks/results/)"
+    )
+    main(parser.parse_args())
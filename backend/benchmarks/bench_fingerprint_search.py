@@ -0,0 +1,74 @@
+"""Latency of the in-process key-ID index against the FingerprintIndex targets.
+
+Builds the index from synthetic fingerprints (no database needed):
+
+    cd backend
+    python -m benchmarks.bench_fingerprint_search --keys 10000000
+
+Building 10M keys takes a few minutes and ~850 MB of memory.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.services.fingerprint_index import FingerprintIndex
+
+HEX = "0123456789abcdef"
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    index = FingerprintIndex()
+    started = time.perf_counter()
+    for row_id in range(1, args.keys + 1):
+        index.add(row_id, "%040x" % rng.getrandbits(160))
+    build_s = time.perf_counter() - started
+    print(
+        f"built {len(index)} keys in {build_s:.1f}s, "
+        f"{index.memory_bytes() / len(index):.1f} bytes/key, "
+        f"{index.memory_bytes() / 1024 / 1024:.0f} MB"
+    )
+
+    workloads = {
+        "suffix-8": lambda: index.search_suffix(
+            "".join(rng.choice(HEX) for _ in range(8)).upper(), args.limit
+        ),
+        "suffix-2": lambda: index.search_suffix(
+            "".join(rng.choice(HEX) for _ in range(2)).upper(), args.limit
+        ),
+        "regex-literal": lambda: index.search_regex(
+            "".join(rng.choice(HEX) for _ in range(5)) + ".?A", args.limit
+        ),
+        "regex-run": lambda: index.search_regex(
+            rng.choice(HEX).upper() + "{4}", args.limit
+        ),
+        "regex-scan": lambda: index.search_regex("(.)\\1{4}", args.limit),
+    }
+    print(f"{'workload':<15} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, query in workloads.items():
+        samples = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            query()
+            samples.append((time.perf_counter() - start) * 1000)
+        print(
+            f"{name:<15} {statistics.median(samples):>8.2f} "
+            f"{percentile(samples, 0.95):>8.2f} {max(samples):>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""In-memory hot window: memory per key and recent-range query latency.
+
+    cd backend
+    python -m benchmarks.bench_hot_window --keys 100k,1M
+
+For each size, a HotWindow is filled with synthetic keys spread over its
+``hours``, as the initial load would. The benchmark reports:
+
+- append throughput, and bytes per key (nominal and as allocated);
+- ``columns()`` plus every statistics step over the last 24 hours;
+- the same steps on a frame built from row objects, which is what a
+  Postgres miss pays after the query itself;
+- ``recent()`` and ``high_score()``;
+- the largest relative difference of the statistics output between the two
+  paths. Letter scores are stored as float32, so unrounded values differ
+  around 1e-7.
+"""
+
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+import pytz
+
+from app.services.compute_backend import BACKENDS
+from app.services.hot_window import HotWindow
+from app.services.key_analyzer import KeyAnalyzer, TimeRange
+from benchmarks.bench_key_analyzer import parse_size
+from benchmarks.results import Results, timed
+from benchmarks.synthetic import SyntheticKeys
+
+SOURCE_NAMES = (
+    "id",
+    "created_at",
+    "score",
+    "repeat_letter_score",
+    "increasing_letter_score",
+    "decreasing_letter_score",
+    "magic_letter_score",
+    "unique_letters_count",
+    "fingerprint",
+)
+
+
+def max_relative_difference(expected, actual) -> float:
+    if isinstance(expected, dict):
+        return max(
+            (max_relative_difference(expected[key], actual[key]) for key in expected),
+            default=0.0,
+        )
+    if isinstance(expected, list):
+        return max(
+            (
+                max_relative_difference(left, right)
+                for left, right in zip(expected, actual)
+            ),
+            default=0.0,
+        )
+    if isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        return (
+            abs(expected - actual) / max(abs(expected), 1e-12)
+            if expected != actual
+            else 0.0
+        )
+    return 0.0 if expected == actual else float("inf")
+
+
+def compute_statistics(
+    analyzer: KeyAnalyzer, frame, previous, time_range: TimeRange
+) -> dict:
+    backend = analyzer.backend
+    return {
+        "score_distribution": backend.score_distribution(frame),
+        "correlation_matrix": backend.correlation_matrix(frame),
+        "summary_stats": analyzer._summary_stats(frame, previous),
+        "score_types_stats": backend.score_types_stats(frame),
+        "trends": backend.trends(frame, time_range),
+    }
+
+
+def run(results: Results, n: int, args):
+    local_now = datetime.now(pytz.timezone("Asia/Shanghai")).replace(tzinfo=None)
+    keys = SyntheticKeys(
+        seed=args.seed,
+        start=local_now - timedelta(hours=args.hours) + timedelta(minutes=1),
+        keys_per_hour=n / args.hours,
+    )
+    columns = keys.columns(n)
+    lists = [columns[name].tolist() for name in SOURCE_NAMES]
+    rows = list(zip(*lists))
+    cutoff = local_now - timedelta(hours=args.hours)
+
+    filled = []
+
+    def fill():
+        window = HotWindow(hours=args.hours, enabled=True)
+        for offset in range(0, n, window.REFRESH_BATCH):
+            window.append(rows[offset : offset + window.REFRESH_BATCH], cutoff)
+        window.evict(cutoff)
+        window.ready = True
+        filled[:] = [window]
+
+    samples = timed(fill, args.repeat)
+    results.add("append", n, samples, keys_per_second=n / statistics.median(samples))
+    window = filled[0]
+    print(
+        f"{'memory':<36} {len(window):>10,} keys  {window.bytes_per_key()} B/key nominal, "
+        f"{window.memory_bytes() / max(len(window), 1):.1f} B/key allocated, "
+        f"{window.memory_bytes() / max(len(window), 1) * 1e6 / 1024 / 1024:.1f} MiB per million keys"
+    )
+    results.rows.append(
+        {
+            "name": "memory",
+            "rows": len(window),
+            "bytes_per_key": window.bytes_per_key(),
+            "allocated_bytes": window.memory_bytes(),
+        }
+    )
+
+    end = keys.span(columns)[1]
+    start = end - timedelta(hours=24)
+    time_range = TimeRange(start, end)
+    analyzer = KeyAnalyzer(db=None, backend=BACKENDS[args.backend]())
+    backend = analyzer.backend
+    in_range = [row for row in keys.objects(n) if start <= row.created_at <= end]
+
+    def from_window():
+        frame = backend.frame(window.columns(start, end))
+        return compute_statistics(
+            analyzer, frame, backend.empty_like(frame), time_range
+        )
+
+    def from_rows():
+        frame = analyzer._rows_frame(in_range)
+        return compute_statistics(
+            analyzer, frame, backend.empty_like(frame), time_range
+        )
+
+    results.add(
+        "statistics[24h,window]", len(in_range), timed(from_window, args.repeat)
+    )
+    results.add(
+        "statistics[24h,row frame]", len(in_range), timed(from_rows, args.repeat)
+    )
+    results.add(
+        "recent[24h]",
+        len(in_range),
+        timed(lambda: window.recent(start, end, 10), args.repeat),
+    )
+    results.add(
+        "high_score[24h]",
+        len(in_range),
+        timed(lambda: window.high_score(start, end, 400, 10), args.repeat),
+    )
+    difference = max_relative_difference(from_rows(), from_window())
+    print(f"{'max relative difference':<36} {difference:.2e}")
+    results.rows.append(
+        {"name": "max_relative_difference", "rows": len(in_range), "value": difference}
+    )
+
+
+def main(args):
+    sizes = [parse_size(size) for size in args.keys.split(",")]
+    results = Results(
+        "hot_window",
+        {
+            "keys": sizes,
+            "hours": args.hours,
+            "backend": args.backend,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+    )
+    for n in sizes:
+        run(results, n, args)
+    results.write(args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", default="100k,1M", help="keys held in the window")
+    parser.add_argument("--hours", type=float, default=48)
+    parser.add_argument("--backend", default="pandas")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--output", default=None, help="results file (default benchmarks/results/)"
+    )
+    main(parser.parse_args())
@@ -0,0 +1,265 @@
+"""KeyAnalyzer benchmark suite on synthetic keys.
+
+    cd backend
+    python -m benchmarks.bench_key_analyzer --sizes 10k,1M,10M
+    python -m benchmarks.bench_key_analyzer --sizes 1M,10M --backends pandas,polars
+    python -m benchmarks.bench_key_analyzer --sizes 10k --e2e --e2e-rows 1M
+
+Microbenchmarks time each statistics step of every compute backend in
+``--backends`` (frame construction, score distribution, correlation
+matrix, score type stats, summary and trends) and ``_get_dataframe`` on
+data from benchmarks.synthetic. Backends that cannot be imported are
+skipped. ``_get_dataframe`` is fed attribute rows through a stand-in
+session, so it measures frame construction and not the query. That needs
+every row as a Python object, so it is skipped above ``--max-object-rows``.
+
+``--e2e`` seeds the configured Postgres with the same generator (up to
+``--e2e-rows``) and times ``get_statistics`` over 1-day, 7-day and 30-day
+ranges ending at the last synthetic key. Each range is timed cold, with the
+Redis cache bypassed, and warm when Redis is reachable.
+
+Results are written to benchmarks/results/ (see benchmarks.results for
+comparing two runs).
+"""
+
+import argparse
+import asyncio
+from datetime import timedelta
+
+import pandas as pd
+import pytz
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models import KeyInfo
+from app.services.compute_backend import BACKENDS
+from app.services.key_analyzer import KeyAnalyzer, StatisticsCalculator, TimeRange
+from app.utils.redis import redis_client
+from benchmarks.results import Results, timed
+from benchmarks.synthetic import SyntheticKeys
+
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+LOCAL_TZ = pytz.timezone("Asia/Shanghai")
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value[-1] in SUFFIXES:
+        return int(float(value[:-1]) * SUFFIXES[value[-1]])
+    return int(value)
+
+
+class StandInResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class StandInSession:
+    """Answers every execute() with prebuilt rows."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, query):
+        return StandInResult(self.rows)
+
+
+def micro(results: Results, keys: SyntheticKeys, n: int, args):
+    columns = keys.columns(n, with_fingerprints=False)
+    start, end = keys.span(columns)
+    repeat = args.repeat
+
+    df = pd.DataFrame(columns)
+    results.add(
+        "safe_calc(mean)",
+        n,
+        timed(
+            lambda: StatisticsCalculator.safe_calc(df["score"], lambda x: x.mean()),
+            repeat,
+        ),
+    )
+    results.add(
+        "calculate_trend",
+        n,
+        timed(lambda: StatisticsCalculator.calculate_trend(412.5, 398.0), repeat),
+    )
+    del df
+
+    objects = keys.objects(n) if n <= args.max_object_rows else None
+    for name in args.backends.split(","):
+        try:
+            backend = BACKENDS[name]()
+        except ImportError as e:
+            results.skip(f"*[{name}]", n, str(e))
+            continue
+        frame = backend.frame(columns)
+        previous = backend.frame(
+            {column: values[: n // 2] for column, values in columns.items()}
+        )
+        analyzer = KeyAnalyzer(db=None, backend=backend)
+
+        results.add(f"frame[{name}]", n, timed(lambda: backend.frame(columns), repeat))
+        results.add(
+            f"score_distribution[{name}]",
+            n,
+            timed(lambda: backend.score_distribution(frame), repeat),
+        )
+        results.add(
+            f"correlation_matrix[{name}]",
+            n,
+            timed(lambda: backend.correlation_matrix(frame), repeat),
+        )
+        results.add(
+            f"score_types_stats[{name}]",
+            n,
+            timed(lambda: backend.score_types_stats(frame), repeat),
+        )
+        results.add(
+            f"_summary_stats[{name}]",
+            n,
+            timed(lambda: analyzer._summary_stats(frame, previous), repeat),
+        )
+        for label, time_range in (
+            ("open", TimeRange(None, None)),
+            ("range", TimeRange(start, end)),
+        ):
+            results.add(
+                f"trends[{name},{label}]",
+                n,
+                timed(lambda: backend.trends(frame, time_range), repeat),
+            )
+        del frame, previous
+
+        if objects is None:
+            results.skip(
+                f"_get_dataframe[{name}]",
+                n,
+                f"over --max-object-rows {args.max_object_rows:,}",
+            )
+            continue
+        frame_analyzer = KeyAnalyzer(db=StandInSession(objects), backend=backend)
+        loop = asyncio.new_event_loop()
+        try:
+            results.add(
+                f"_get_dataframe[{name}]",
+                n,
+                timed(
+                    lambda: loop.run_until_complete(
+                        frame_analyzer._get_dataframe(
+                            TimeRange(start, end), include_previous=False
+                        )
+                    ),
+                    repeat,
+                ),
+            )
+        finally:
+            loop.close()
+
+
+def local_ms(value) -> int:
+    return int(LOCAL_TZ.localize(value).timestamp() * 1000)
+
+
+async def seed(keys: SyntheticKeys, rows: int, batch_size: int = 10_000):
+    from app.database import async_session
+
+    async with async_session() as db:
+        existing = (await db.execute(select(func.count(KeyInfo.id)))).scalar_one()
+        if existing >= rows:
+            return
+        batch = []
+        for row in keys.rows(rows):
+            batch.append(row)
+            if len(batch) == batch_size:
+                await db.execute(insert(KeyInfo).values(batch).on_conflict_do_nothing())
+                batch = []
+        if batch:
+            await db.execute(insert(KeyInfo).values(batch).on_conflict_do_nothing())
+        await db.commit()
+        print(f"seeded {rows:,} synthetic keys")
+
+
+async def end_to_end(results: Results, keys: SyntheticKeys, args):
+    from app.database import async_session, check_schema
+
+    await check_schema()
+    await seed(keys, args.e2e_rows)
+    _, end = keys.span(keys.columns(args.e2e_rows, with_fingerprints=False))
+    redis_available = redis_client.enabled
+
+    for days in (1, 7, 30):
+        start_ms, end_ms = local_ms(end - timedelta(days=days)), local_ms(end)
+
+        async def run():
+            async with async_session() as db:
+                return await KeyAnalyzer(db).get_statistics(start_ms, end_ms)
+
+        samples = []
+        redis_client.enabled = False
+        for _ in range(args.repeat):
+            started = asyncio.get_running_loop().time()
+            await run()
+            samples.append(asyncio.get_running_loop().time() - started)
+        redis_client.enabled = redis_available
+        results.add(f"get_statistics[{days}d,cold]", args.e2e_rows, samples)
+
+        if redis_available:
+            redis_client.clear_prefix("statistics:")
+            await run()
+            samples = []
+            for _ in range(args.repeat):
+                started = asyncio.get_running_loop().time()
+                await run()
+                samples.append(asyncio.get_running_loop().time() - started)
+            results.add(f"get_statistics[{days}d,warm]", args.e2e_rows, samples)
+        else:
+            results.skip(
+                f"get_statistics[{days}d,warm]", args.e2e_rows, "Redis unavailable"
+            )
+
+
+def main(args):
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    keys = SyntheticKeys(seed=args.seed)
+    results = Results(
+        "key_analyzer",
+        {
+            "sizes": sizes,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "backends": args.backends,
+            "e2e_rows": args.e2e_rows if args.e2e else None,
+        },
+    )
+    for n in sizes:
+        micro(results, keys, n, args)
+    if args.e2e:
+        asyncio.run(end_to_end(results, keys, args))
+    results.write(args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10k,1M,10M")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument(
+        "--backends",
+        default="pandas,polars",
+        help="compute backends to time (see analytics.backend)",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-object-rows", type=parse_size, default=1_000_000)
+    parser.add_argument(
+        "--e2e", action="store_true", help="also time get_statistics against Postgres"
+    )
+    parser.add_argument("--e2e-rows", type=parse_size, default=1_000_000)
+    parser.add_argument(
+        "--output", default=None, help="results file (default benchmarks/results/)"
+    )
+    main(parser.parse_args())
@@ -0,0 +1,127 @@
+"""Keyset vs OFFSET pagination benchmark for /api/keys/*/page.
+
+Runs against the database configured in config.json:
+
+    cd backend
+    python -m benchmarks.bench_keyset_pagination --seed 1100000 --pages 10000
+
+The walk fetches every page in order (that is the only way to obtain a
+keyset cursor for page N), then re-times selected pages in isolation so the
+numbers compare like with like.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+
+from app.database import async_session, check_schema
+from app.models import KeyInfo
+from app.services.key_analyzer import KeyAnalyzer
+
+HEX = "0123456789abcdef"
+
+
+async def seed(target_rows: int, batch_size: int = 10_000):
+    async with async_session() as db:
+        existing = (await db.execute(select(func.count(KeyInfo.id)))).scalar_one()
+        rng = random.Random(42)
+        now = datetime.now()
+        for offset in range(existing, target_rows, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, target_rows)):
+                parts = [rng.random() * 120 for _ in range(4)]
+                rows.append(
+                    {
+                        "created_at": now - timedelta(seconds=i * 3),
+                        "fingerprint": "".join(rng.choice(HEX) for _ in range(40)),
+                        "repeat_letter_score": parts[0],
+                        "increasing_letter_score": parts[1],
+                        "decreasing_letter_score": parts[2],
+                        "magic_letter_score": parts[3],
+                        "score": round(sum(parts) + rng.expovariate(1 / 40), 2),
+                        "unique_letters_count": rng.randint(4, 16),
+                    }
+                )
+            await db.execute(insert(KeyInfo), rows)
+            await db.commit()
+            print(f"seeded {offset + len(rows)}/{target_rows}")
+
+
+async def time_call(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def bench(order: str, pages: int, limit: int, checkpoints, repeat: int):
+    fetch_page = (
+        "get_recent_keys_page" if order == "time" else "get_high_score_keys_page"
+    )
+    sort_column = KeyInfo.created_at if order == "time" else KeyInfo.score
+    filters = (
+        [] if order == "time" else [KeyInfo.score > KeyAnalyzer.HIGH_SCORE_THRESHOLD]
+    )
+
+    async with async_session() as db:
+        analyzer = KeyAnalyzer(db)
+        cursors = {1: None}
+        cursor = None
+        for page in range(1, pages + 1):
+            result = await getattr(analyzer, fetch_page)(cursor=cursor, limit=limit)
+            cursor = result["next_cursor"]
+            if cursor is None:
+                print(f"[{order}] ran out of rows at page {page}")
+                break
+            if page + 1 in checkpoints:
+                cursors[page + 1] = cursor
+
+        print(f"\n[{order}] median of {repeat} runs, page size {limit}")
+        print(f"{'page':>8} {'keyset ms':>10} {'offset ms':>10}")
+        for page, page_cursor in sorted(cursors.items()):
+            keyset_ms = await time_call(
+                lambda: getattr(analyzer, fetch_page)(cursor=page_cursor, limit=limit),
+                repeat,
+            )
+            offset_query = (
+                select(*KeyAnalyzer.PAGE_COLUMNS)
+                .where(sort_column.isnot(None), *filters)
+                .order_by(sort_column.desc(), KeyInfo.id.desc())
+                .offset((page - 1) * limit)
+                .limit(limit)
+            )
+            offset_ms = await time_call(lambda: db.execute(offset_query), repeat)
+            print(f"{page:>8} {keyset_ms:>10.2f} {offset_ms:>10.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--seed", type=int, default=0, help="ensure at least N rows exist"
+    )
+    parser.add_argument("--pages", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=KeyAnalyzer.DEFAULT_LIMIT)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--order", choices=["time", "score", "both"], default="both")
+    args = parser.parse_args()
+
+    await check_schema()
+    if args.seed:
+        await seed(args.seed)
+
+    checkpoints = {
+        p for p in (1, 10, 100, 1_000, 10_000, args.pages) if p <= args.pages
+    }
+    for order in ("time", "score") if args.order == "both" else (args.order,):
+        await bench(order, args.pages, args.limit, checkpoints, args.repeat)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
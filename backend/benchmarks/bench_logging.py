@@ -0,0 +1,133 @@
+"""Per-request logging overhead, print-based Debug vs the queued JSON logger.
+
+    cd backend
+    python -m benchmarks.bench_logging --requests 20000
+
+A request is the log traffic of a cached dashboard load before this change:
+for each of the three widgets (recent keys, high score keys, statistics) a
+Redis hit line plus the analyzer's own hit line, and a token cache hit.
+``before/print`` is the old Debug writing each line with print() to a file
+standing in for stdout. The ``after`` rows time the caller's side only; the
+JSON encoding and write happen on the listener thread, whose drain time is
+printed separately. ``after/info`` is the production level, where every one
+of these lines is dropped by the level check. ``--sink-latency-us`` adds a
+sleep to every write, standing in for a stdout pipe that is slow to drain;
+print() pays it on the event loop, the listener pays it off the loop.
+"""
+
+import argparse
+import contextlib
+import logging
+import queue
+import statistics
+import tempfile
+import time
+from logging.handlers import QueueListener
+
+from pythonjsonlogger import jsonlogger
+
+from app.utils.debug import Debug
+from app.utils.logger import JSON_FORMAT, DeferredQueueHandler
+
+WIDGETS = ("recent_keys:None:None", "high_score_keys:None:None", "statistics:None:None")
+PAYLOAD = "x" * 2048
+
+
+class PrintDebug:
+    """The Debug class as it was: unconditional f-strings and print()."""
+
+    enabled = True
+
+    def log(self, *args):
+        if self.enabled:
+            print("[DEBUG]", *args)
+
+
+class SlowSink:
+    def __init__(self, stream, latency: float):
+        self.stream = stream
+        self.latency = latency
+
+    def write(self, data):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def before_request(debug):
+    debug.log(f"Token cache hit")
+    for key in WIDGETS:
+        debug.log(f"Cache hit for key: {key}, value length: {len(PAYLOAD)}")
+        debug.log(f"{key.split(':')[0]} cache hit")
+
+
+def after_request(debug):
+    debug.sample("cache_hit", "Token cache hit")
+    for key in WIDGETS:
+        debug.sample(
+            "cache_hit", "Cache hit for key: %s, value length: %s", key, len(PAYLOAD)
+        )
+        debug.sample("cache_hit", "%s cache hit", key.split(":")[0])
+
+
+def report(name: str, samples: list):
+    samples.sort()
+    print(
+        f"{name:<22} mean {statistics.mean(samples) * 1e6:8.2f} us  "
+        f"p50 {samples[len(samples) // 2] * 1e6:8.2f} us  "
+        f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e6:8.2f} us"
+    )
+
+
+def run(request, debug, requests: int) -> list:
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        request(debug)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def queued_debug(name: str, level: str, sample_every: dict, stream):
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger(f"bench.{name}")
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.handlers[:] = [DeferredQueueHandler(log_queue)]
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(jsonlogger.JsonFormatter(JSON_FORMAT))
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    return Debug(logger, sample_every), listener
+
+
+def main(args):
+    with tempfile.TemporaryFile("w") as file:
+        out = SlowSink(file, args.sink_latency_us / 1e6)
+        with contextlib.redirect_stdout(out):
+            samples = run(before_request, PrintDebug(), args.requests)
+        report("before/print", samples)
+
+        for name, level, sample_every in (
+            ("debug-unsampled", "DEBUG", {}),
+            ("debug-sampled", "DEBUG", {"cache_hit": 100}),
+            ("info", "INFO", {}),
+        ):
+            debug, listener = queued_debug(name, level, sample_every, out)
+            samples = run(after_request, debug, args.requests)
+            started = time.perf_counter()
+            listener.stop()
+            report(f"after/{name}", samples)
+            print(
+                f"{'':<22} listener drained in {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sink-latency-us", type=float, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,74 @@
+"""Cold-start import time of the application, from ``python -X importtime``.
+
+    cd backend
+    python -m benchmarks.bench_startup --runs 5 --top 15
+
+Each run is a fresh interpreter importing ``app.main``; the import time
+report on stderr is parsed and the median of the runs is printed, with the
+slowest modules by cumulative and by self time. ``app.main + analytics``
+also imports pandas and numpy, which is what every worker paid at boot
+before the analytics stack became lazy; it is now loaded in the background
+after startup (``startup.preload_analytics``).
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, Tuple
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+SCENARIOS = {
+    "app.main": "import app.main",
+    "app.main + analytics": "import app.main, pandas, numpy",
+}
+
+
+def importtime(code: str) -> Dict[str, Tuple[int, int]]:
+    """Runs ``code`` in a fresh interpreter; module -> (self us, cumulative us)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            modules[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return modules
+
+
+def main(args):
+    for name, code in SCENARIOS.items():
+        self_times, cumulative_times = defaultdict(list), defaultdict(list)
+        totals = []
+        for _ in range(args.runs):
+            modules = importtime(code)
+            totals.append(sum(self_us for self_us, _ in modules.values()))
+            for module, (self_us, cumulative_us) in modules.items():
+                self_times[module].append(self_us)
+                cumulative_times[module].append(cumulative_us)
+
+        print(
+            f"{name}: median {statistics.median(totals) / 1000:.0f} ms over {args.runs} runs"
+        )
+        for label, times in (("cumulative", cumulative_times), ("self", self_times)):
+            ranked = sorted(
+                times.items(), key=lambda item: statistics.median(item[1]), reverse=True
+            )
+            print(f"  slowest by {label}:")
+            for module, samples in ranked[: args.top]:
+                print(f"    {statistics.median(samples) / 1000:8.1f} ms  {module}")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    main(parser.parse_args())
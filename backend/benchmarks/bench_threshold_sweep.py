@@ -0,0 +1,120 @@
+"""Threshold sweep: qualified counts for many thresholds in one call.
+
+    cd backend
+    python -m benchmarks.bench_threshold_sweep --keys 100k,1M --thresholds 100
+
+Synthetic keys fill the shared hot window, ending now, so the sweep reads
+them the way it reads recent ranges in production. Over the last 24 hours
+the benchmark reports:
+
+- ``score_summary per threshold``: one ``score_summary`` per threshold on a
+  statistics frame, which is what tuning the threshold through
+  ``/statistics`` costs after the query;
+- ``sweep[cold]``: ``KeyAnalyzer.get_threshold_sweep`` with an empty score
+  index (load, sort and index every hour);
+- ``sweep[warm]``: the same call with the settled hours indexed; only the
+  partial hours at the ends are read.
+
+Counts from the three paths are compared and must match exactly.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytz
+
+from app.services.compute_backend import BACKENDS
+from app.services.hot_window import hot_window
+from app.services.key_analyzer import KeyAnalyzer, TimeRange
+from app.services.score_index import score_index
+from benchmarks.bench_dashboard_stream import fill
+from benchmarks.bench_key_analyzer import parse_size
+from benchmarks.results import Results, timed
+
+LOCAL_TZ = pytz.timezone("Asia/Shanghai")
+
+
+def epoch_ms(value: datetime) -> int:
+    return int(LOCAL_TZ.localize(value).timestamp() * 1000)
+
+
+def run(results: Results, n: int, args):
+    fill(n, args)
+    end = datetime.now(LOCAL_TZ).replace(tzinfo=None)
+    start = end - timedelta(hours=24)
+    start_ms, end_ms = epoch_ms(start), epoch_ms(end)
+    thresholds = np.linspace(0, 800, args.thresholds).round(2).tolist()
+    analyzer = KeyAnalyzer(db=None, backend=BACKENDS[args.backend]())
+    # 与 get_threshold_sweep 相同的毫秒精度区间
+    time_range = TimeRange.from_timestamps(start_ms, end_ms)
+    columns = hot_window.columns(time_range.start, time_range.end)
+    frame = analyzer.backend.frame(columns)
+
+    def per_threshold():
+        return [
+            round(
+                analyzer.backend.score_summary(frame, threshold)["qualified_rate"]
+                * len(frame)
+            )
+            for threshold in thresholds
+        ]
+
+    def sweep():
+        result = asyncio.run(analyzer.get_threshold_sweep(thresholds, start_ms, end_ms))
+        return [row["qualified_count"] for row in result["thresholds"]]
+
+    results.add(
+        f"score_summary per threshold[{len(thresholds)}]",
+        len(frame),
+        timed(per_threshold, args.repeat),
+    )
+    results.add(
+        f"sweep[cold,{len(thresholds)}]",
+        len(frame),
+        timed(lambda _: sweep(), args.repeat, setup=score_index.clear),
+    )
+    sweep()
+    results.add(f"sweep[warm,{len(thresholds)}]", len(frame), timed(sweep, args.repeat))
+    print(
+        f"{'indexed hours':<36} {len(score_index):>10}  {score_index.memory_bytes() / 1024 / 1024:.1f} MiB"
+    )
+
+    expected = per_threshold()
+    matches = expected == sweep()
+    print(f"{'counts match':<36} {matches}")
+    results.rows.append({"name": "counts_match", "rows": len(frame), "value": matches})
+
+
+def main(args):
+    sizes = [parse_size(size) for size in args.keys.split(",")]
+    results = Results(
+        "threshold_sweep",
+        {
+            "keys": sizes,
+            "hours": hot_window.hours,
+            "thresholds": args.thresholds,
+            "backend": args.backend,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+    )
+    for n in sizes:
+        run(results, n, args)
+    results.write(args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", default="100k,1M", help="keys held in the window")
+    parser.add_argument(
+        "--thresholds", type=int, default=100, help="thresholds per sweep"
+    )
+    parser.add_argument("--backend", default="pandas")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--output", default=None, help="results file (default benchmarks/results/)"
+    )
+    main(parser.parse_args())
@@ -0,0 +1,66 @@
+"""Golden-output parity of the compute backends against pandas.
+
+    cd backend
+    pip install polars
+    python -m benchmarks.check_backend_parity --backends polars --sizes 100k,1M
+
+The comparisons of tests/test_compute_backend_parity.py (run by pytest at
+small sizes), at sizes too large for the test suite, for every backend in
+``--backends``. Exits with status 1 on any mismatch or when a backend
+cannot be loaded.
+"""
+
+import argparse
+import sys
+
+from app.services.compute_backend import BACKENDS
+from benchmarks.bench_key_analyzer import parse_size
+from benchmarks.synthetic import SyntheticKeys
+from tests.test_compute_backend_parity import (
+    case_columns,
+    case_ranges,
+    differences,
+    outputs,
+)
+
+
+def main(args) -> int:
+    reference = BACKENDS["pandas"]()
+    candidates = []
+    for name in args.backends.split(","):
+        try:
+            candidates.append(BACKENDS[name]())
+        except ImportError as e:
+            print(f"{name}: cannot load ({e})")
+            return 1
+
+    keys = SyntheticKeys(seed=args.seed)
+    failures = 0
+    for n in (parse_size(size) for size in args.sizes.split(",")):
+        for blank_letters in (False, True):
+            columns = case_columns(keys, n, blank_letters)
+            ranges = case_ranges(columns)
+            expected = outputs(reference, columns, ranges)
+            for backend in candidates:
+                found = differences(expected, outputs(backend, columns, ranges))
+                case = (
+                    f"{backend.name} n={n:,}{' blank letters' if blank_letters else ''}"
+                )
+                print(
+                    f"{case:<40} {'ok' if not found else f'{len(found)} differences'}"
+                )
+                for line in found[: args.show]:
+                    print(f"    {line}")
+                failures += bool(found)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="polars")
+    parser.add_argument("--sizes", default="100k,1M")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument(
+        "--show", type=int, default=10, help="differences printed per case"
+    )
+    sys.exit(main(parser.parse_args()))
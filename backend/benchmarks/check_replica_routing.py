@@ -0,0 +1,75 @@
+"""Exercise ReplicaRouter against a primary and one streaming replica.
+
+Start the pair with ``docker compose -f docker-compose.replica.yml up -d`` and
+add the replica to ``database.replicas`` in config.json, then:
+
+    cd backend
+    python -m benchmarks.check_replica_routing
+
+Pausing WAL replay on the replica (needs superuser) makes lag grow, which
+should move open-ended ranges to the primary while historical ranges whose
+end the replica already holds stay on the replica.
+"""
+
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from app.database import async_session, replica_router
+
+REPLICA_SUPERUSER_SQL = {
+    "pause": "SELECT pg_wal_replay_pause()",
+    "resume": "SELECT pg_wal_replay_resume()",
+}
+
+
+def route(end_ms):
+    factory = replica_router.session_factory(end_ms)
+    return "primary" if factory is async_session else "replica"
+
+
+async def write_on_primary():
+    async with async_session() as db:
+        await db.execute(
+            text("CREATE TABLE IF NOT EXISTS replica_probe (at timestamptz)")
+        )
+        await db.execute(text("INSERT INTO replica_probe VALUES (now())"))
+        await db.commit()
+
+
+async def sample(label: str):
+    await asyncio.gather(*(replica.check_lag() for replica in replica_router.replicas))
+    now_ms = int(time.time() * 1000)
+    lags = {replica.name: replica.lag for replica in replica_router.replicas}
+    print(
+        f"{label:<22} lag={lags} open-range->{route(None)} "
+        f"end=now->{route(now_ms)} end=-1h->{route(now_ms - 3_600_000)}"
+    )
+
+
+async def main():
+    if not replica_router.replicas:
+        raise SystemExit("No replicas configured in database.replicas")
+    replica = replica_router.replicas[0]
+
+    await write_on_primary()
+    await asyncio.sleep(1)
+    await sample("caught up")
+
+    async with replica.engine.connect() as conn:
+        await conn.execute(text(REPLICA_SUPERUSER_SQL["pause"]))
+    # Writes pile up behind the paused replay; lag = age of last replayed commit
+    for _ in range(8):
+        await write_on_primary()
+        await asyncio.sleep(1)
+    await sample("replay paused 8s")
+
+    async with replica.engine.connect() as conn:
+        await conn.execute(text(REPLICA_SUPERUSER_SQL["resume"]))
+    await asyncio.sleep(2)
+    await sample("replay resumed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+"""JSON benchmark results, for comparing runs across commits.
+
+Suites record timings with ``Results.add`` and write one file per run to
+``benchmarks/results/<suite>-<commit>.json`` (or ``--output``). Compare two
+runs with:
+
+    cd backend
+    python -m benchmarks.results baseline.json candidate.json --threshold 1.10
+
+Rows are matched on (name, rows) and compared on the median; the command
+exits with status 1 when any row is slower than ``threshold`` times the
+baseline.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> Dict[str, str]:
+    versions = {}
+    for module in ("numpy", "pandas", "pyarrow", "sqlalchemy", "fastapi"):
+        loaded = sys.modules.get(module)
+        if loaded is not None:
+            versions[module] = getattr(loaded, "__version__", "unknown")
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        **versions,
+    }
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "repeat": len(ordered),
+        "min_ms": ordered[0] * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "mean_ms": statistics.mean(ordered) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+class Results:
+    def __init__(self, suite: str, parameters: Optional[dict] = None):
+        self.suite = suite
+        self.parameters = parameters or {}
+        self.rows: List[dict] = []
+
+    def add(self, name: str, rows: Optional[int], samples: List[float], **extra):
+        row = {"name": name, "rows": rows, **summarize(samples), **extra}
+        self.rows.append(row)
+        size = f"{rows:>10,}" if rows is not None else " " * 10
+        print(
+            f"{name:<36} {size} rows  median {row['median_ms']:10.2f} ms  min {row['min_ms']:10.2f} ms  x{row['repeat']}"
+        )
+
+    def skip(self, name: str, rows: Optional[int], reason: str):
+        self.rows.append({"name": name, "rows": rows, "skipped": reason})
+        print(f"{name:<36} {rows or '':>10} rows  skipped ({reason})")
+
+    def write(self, path: Optional[str] = None) -> str:
+        commit = git_commit()
+        if path is None:
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            path = os.path.join(RESULTS_DIR, f"{self.suite}-{commit}.json")
+        document = {
+            "suite": self.suite,
+            "commit": commit,
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "environment": environment(),
+            "parameters": self.parameters,
+            "results": self.rows,
+        }
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2, default=str)
+        print(f"results written to {path}")
+        return path
+
+
+def timed(fn, repeat: int, budget_seconds: float = 30.0, setup=None) -> List[float]:
+    """Runs ``fn`` up to ``repeat`` times (at least once) within ``budget_seconds``.
+
+    ``setup``, when given, runs before each call outside the timing and its
+    return value is passed to ``fn``.
+    """
+    samples = []
+    deadline = time.perf_counter() + budget_seconds
+    while len(samples) < repeat and (not samples or time.perf_counter() < deadline):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        fn(argument) if setup else fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    before = {
+        (row["name"], row["rows"]): row
+        for row in baseline["results"]
+        if "median_ms" in row
+    }
+    regressions = 0
+    print(f"{baseline['commit']} -> {candidate['commit']}")
+    for row in candidate["results"]:
+        old = before.get((row["name"], row["rows"]))
+        if old is None or "median_ms" not in row:
+            continue
+        ratio = (
+            row["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        )
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(
+            f"{row['name']:<36} {row['rows'] or '':>10}  "
+            f"{old['median_ms']:10.2f} -> {row['median_ms']:10.2f} ms  x{ratio:5.2f}{flag}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.10)
+    args = parser.parse_args()
+    sys.exit(compare(args.baseline, args.candidate, args.threshold))
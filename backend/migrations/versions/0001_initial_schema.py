@@ -0,0 +1,54 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+
+The schema previously created at startup by ``Base.metadata.create_all``.
+Databases created that way are already at this revision: ``alembic stamp 0001``,
+then ``alembic upgrade head`` (see 0004 for the step needed before it).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "key_infos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("fingerprint", sa.String()),
+        sa.Column("repeat_letter_score", sa.Float()),
+        sa.Column("increasing_letter_score", sa.Float()),
+        sa.Column("decreasing_letter_score", sa.Float()),
+        sa.Column("magic_letter_score", sa.Float()),
+        sa.Column("score", sa.Float()),
+        sa.Column("unique_letters_count", sa.Integer()),
+    )
+    op.create_index("ix_key_infos_id", "key_infos", ["id"])
+
+    op.create_table(
+        "users",
+        sa.Column("id", sa.String(), primary_key=True),
+        sa.Column("username", sa.String()),
+        sa.Column("email", sa.String()),
+        sa.Column("hashed_password", sa.String()),
+        sa.Column("full_name", sa.String()),
+        sa.Column("disabled", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("users")
+    op.drop_table("key_infos")
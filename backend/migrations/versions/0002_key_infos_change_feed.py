@@ -0,0 +1,111 @@
+"""key_infos change feed
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+
+Statement-level triggers on ``key_infos`` that NOTIFY the
+``key_infos_changes`` channel after every INSERT, UPDATE, DELETE and
+TRUNCATE. One notification per statement, whatever the batch size: the
+payload carries the operation, the local hours (epoch seconds of
+``date_trunc('hour', created_at)``) the statement touched, the highest
+new id for inserts and the lowest and highest removed id for deletes.
+Statements touching more than 400 distinct
+hours send the first and last hour instead, to stay under the 8000-byte
+payload limit. Notifications are delivered at commit, and not at all on
+rollback.
+"""
+
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION key_infos_notify_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed bigint;
+    hours bigint[];
+    min_id integer;
+    max_id integer;
+    payload jsonb;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('key_infos_changes', '{"op": "truncate"}');
+        RETURN NULL;
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT count(*), max(id),
+               array_agg(DISTINCT extract(epoch FROM date_trunc('hour', created_at))::bigint
+                         ORDER BY extract(epoch FROM date_trunc('hour', created_at))::bigint)
+                   FILTER (WHERE created_at IS NOT NULL)
+          INTO changed, max_id, hours
+          FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT count(*),
+               array_agg(DISTINCT hour ORDER BY hour) FILTER (WHERE hour IS NOT NULL)
+          INTO changed, hours
+          FROM (
+              SELECT extract(epoch FROM date_trunc('hour', created_at))::bigint AS hour FROM new_rows
+              UNION ALL
+              SELECT extract(epoch FROM date_trunc('hour', created_at))::bigint FROM old_rows
+          ) touched;
+    ELSE
+        SELECT count(*), min(id), max(id),
+               array_agg(DISTINCT extract(epoch FROM date_trunc('hour', created_at))::bigint
+                         ORDER BY extract(epoch FROM date_trunc('hour', created_at))::bigint)
+                   FILTER (WHERE created_at IS NOT NULL)
+          INTO changed, min_id, max_id, hours
+          FROM old_rows;
+    END IF;
+
+    IF changed = 0 THEN
+        RETURN NULL;
+    END IF;
+    payload := jsonb_build_object('op', lower(TG_OP));
+    IF min_id IS NOT NULL THEN
+        payload := payload || jsonb_build_object('min_id', min_id);
+    END IF;
+    IF max_id IS NOT NULL THEN
+        payload := payload || jsonb_build_object('max_id', max_id);
+    END IF;
+    IF coalesce(array_length(hours, 1), 0) <= 400 THEN
+        payload := payload || jsonb_build_object('hours', coalesce(hours, '{}'));
+    ELSE
+        payload := payload || jsonb_build_object('from', hours[1], 'to', hours[array_length(hours, 1)]);
+    END IF;
+    PERFORM pg_notify('key_infos_changes', payload::text);
+    RETURN NULL;
+END;
+$$
+"""
+
+
+def upgrade() -> None:
+    op.execute(NOTIFY_FUNCTION)
+    # 带转换表的触发器只能对应一种事件, 所以每种操作各建一个
+    op.execute(
+        "CREATE TRIGGER key_infos_notify_insert AFTER INSERT ON key_infos "
+        "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION key_infos_notify_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER key_infos_notify_update AFTER UPDATE ON key_infos "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION key_infos_notify_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER key_infos_notify_delete AFTER DELETE ON key_infos "
+        "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION key_infos_notify_change()"
+    )
+    op.execute(
+        "CREATE TRIGGER key_infos_notify_truncate AFTER TRUNCATE ON key_infos "
+        "FOR EACH STATEMENT EXECUTE FUNCTION key_infos_notify_change()"
+    )
+
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete", "truncate"):
+        op.execute(f"DROP TRIGGER IF EXISTS key_infos_notify_{event} ON key_infos")
+    op.execute("DROP FUNCTION IF EXISTS key_infos_notify_change()")
@@ -0,0 +1,54 @@
+"""key_infos retention rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+
+Tables written by the retention job (``cli compact-keys``). Aged
+below-threshold keys are moved out of ``key_infos`` into
+``key_info_rollups``, keyed by local hour and lowest key id: each fold
+batch inserts a row and each run merges an hour's rows into one. A row
+holds mergeable aggregates (key count, scored key count, score sum and
+maximum), which the summary and threshold counts read directly, and
+arrays with one element per folded key in the same order, expanded where
+exact quantiles are needed. Their normalized fingerprints go to
+``archived_fingerprints`` so ingestion keeps rejecting them; the raw rows
+are in the archive files.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "key_info_rollups",
+        sa.Column("hour", sa.DateTime(), primary_key=True),
+        sa.Column("first_id", sa.Integer(), primary_key=True),
+        sa.Column("key_count", sa.Integer(), nullable=False),
+        sa.Column("score_count", sa.Integer(), nullable=False),
+        sa.Column("score_sum", sa.Float(), nullable=False),
+        sa.Column("score_max", sa.Float(), nullable=True),
+        sa.Column("created_at", ARRAY(sa.DateTime()), nullable=False),
+        sa.Column("repeat_letter_score", ARRAY(sa.Float()), nullable=False),
+        sa.Column("increasing_letter_score", ARRAY(sa.Float()), nullable=False),
+        sa.Column("decreasing_letter_score", ARRAY(sa.Float()), nullable=False),
+        sa.Column("magic_letter_score", ARRAY(sa.Float()), nullable=False),
+        sa.Column("score", ARRAY(sa.Float()), nullable=False),
+        sa.Column("unique_letters_count", ARRAY(sa.Integer()), nullable=False),
+    )
+    op.create_table(
+        "archived_fingerprints",
+        sa.Column("fingerprint", sa.String(), primary_key=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("archived_fingerprints")
+    op.drop_table("key_info_rollups")
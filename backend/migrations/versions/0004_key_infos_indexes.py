@@ -0,0 +1,52 @@
+"""key_infos pagination, search and dedup indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+
+Indexes the application relies on beyond the baseline schema of 0001:
+the keyset pagination indexes on (created_at, id) and (score, id), the
+pg_trgm GIN index for fingerprint substring search, and the unique index
+on the normalized fingerprint that ingestion's ON CONFLICT targets. The
+normalization is the one ingestion applies (whitespace and colons removed,
+upper-cased), so keys stored in a grouped form are duplicates of their
+compact form; the earlier ``upper(fingerprint)`` unique index is dropped.
+
+Creating the unique index fails while duplicate fingerprints exist: run
+``python -m app.cli dedupe-keys`` before ``alembic upgrade head``. The
+statements use IF NOT EXISTS, so databases that already have these
+indexes upgrade without changes.
+"""
+
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_key_infos_created_at_id ON key_infos (created_at, id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_key_infos_score_id ON key_infos (score, id)"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_key_infos_fingerprint_trgm "
+        "ON key_infos USING gin (upper(fingerprint) gin_trgm_ops)"
+    )
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_key_infos_fingerprint_normalized "
+        "ON key_infos (upper(regexp_replace(fingerprint, '[[:space:]:]', '', 'g')))"
+    )
+    op.execute("DROP INDEX IF EXISTS ux_key_infos_fingerprint_upper")
+
+
+def downgrade() -> None:
+    op.drop_index("ux_key_infos_fingerprint_normalized", table_name="key_infos")
+    op.drop_index("ix_key_infos_fingerprint_trgm", table_name="key_infos")
+    op.drop_index("ix_key_infos_score_id", table_name="key_infos")
+    op.drop_index("ix_key_infos_created_at_id", table_name="key_infos")
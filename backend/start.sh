@@ -1,9 +1,15 @@
 #!/bin/bash
 
+# 启动前应用数据库迁移 (应用启动时只检查版本, 不再建表)
+alembic upgrade head
+
 # 开发环境
 export ENV=development
 uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
 
 # 生产环境
 # export ENV=production
-# uvicorn app.main:app --host 0.0.0.0 --port 8000
+# 多 worker 时 Prometheus 指标需要多进程模式, 目录在启动前清空
+# export PROMETHEUS_MULTIPROC_DIR=/tmp/key-analysis-metrics
+# rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+# uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 4
@@ -0,0 +1,135 @@
+"""Golden-output parity of the compute backends against pandas.
+
+Synthetic keys (benchmarks.synthetic) go through each statistics step of
+the pandas backend, whose output is the reference, and of every other
+backend. Trends are checked over the open range and over 1-day, 10-day and
+40-day ranges, so hourly, 6-hourly and daily buckets are all covered, and
+the open range once more downsampled to 50 points. A second case blanks 1%
+of the letter scores, and the summary is also checked against an empty
+previous period.
+
+Values must match to 1e-9 relative, except where the output is rounded:
+correlations (3 decimals), trend values (2) and summary mean/max (1) may
+differ by one unit in the last place. Large sizes are run by
+benchmarks/check_backend_parity.py.
+"""
+
+import math
+from datetime import timedelta
+from typing import Any, List, Tuple
+
+import pytest
+
+from app.services.compute_backend import (
+    BACKENDS,
+    FRAME_COLUMNS,
+    ComputeBackend,
+    downsample_trends,
+)
+from app.services.key_analyzer import KeyAnalyzer, TimeRange
+from benchmarks.synthetic import SyntheticKeys
+
+SEED = 11
+
+
+def tolerance(path: Tuple) -> float:
+    if path[0] == "correlation_matrix":
+        return 1e-3
+    if path[0].startswith("trends") and path[-2] == "values":
+        return 1e-2
+    if path[0] == "summary_stats" and path[-1] in ("mean", "max"):
+        return 1e-1
+    return 0.0
+
+
+def differences(expected: Any, actual: Any, path: Tuple = ()) -> List[str]:
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        if list(expected) != list(actual):
+            return [
+                f"{'.'.join(map(str, path))}: keys {list(expected)} != {list(actual)}"
+            ]
+        found = []
+        for key in expected:
+            found += differences(expected[key], actual[key], path + (key,))
+        return found
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [
+                f"{'.'.join(map(str, path))}: length {len(expected)} != {len(actual)}"
+            ]
+        found = []
+        for index, (left, right) in enumerate(zip(expected, actual)):
+            found += differences(left, right, path + (index,))
+        return found
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        # 允许舍入边界上差一个末位单位
+        if math.isclose(
+            expected, actual, rel_tol=1e-9, abs_tol=tolerance(path) * 1.001 or 1e-12
+        ):
+            return []
+    elif expected == actual:
+        return []
+    return [f"{'.'.join(map(str, path))}: {expected!r} != {actual!r}"]
+
+
+def outputs(backend: ComputeBackend, columns: dict, ranges: List[TimeRange]) -> dict:
+    analyzer = KeyAnalyzer(db=None, backend=backend)
+    frame = backend.frame(columns)
+    previous = backend.frame(
+        {name: values[: len(values) // 2] for name, values in columns.items()}
+    )
+    result = {
+        "score_distribution": backend.score_distribution(frame),
+        "correlation_matrix": backend.correlation_matrix(frame),
+        "score_types_stats": backend.score_types_stats(frame),
+        "summary_stats": analyzer._summary_stats(frame, previous),
+        "summary_stats_empty_previous": analyzer._summary_stats(
+            frame, backend.empty_like(frame)
+        ),
+        # 合格线落在两位小数的分数上, 检查严格大于的边界
+        "score_distribution[threshold=80.5]": backend.score_distribution(frame, 80.5),
+        "summary_stats[threshold=80.5]": analyzer._summary_stats(frame, previous, 80.5),
+    }
+    for time_range in ranges:
+        label = (
+            "open" if time_range.start is None else f"{time_range.seconds() / 86400:g}d"
+        )
+        result[f"trends[{label}]"] = backend.trends(frame, time_range)
+    # 降采样在舍入后的值上选点, 两个后端应选出相同的点
+    result["trends[open,max_points=50]"] = downsample_trends(result["trends[open]"], 50)
+    return result
+
+
+def case_columns(keys: SyntheticKeys, n: int, blank_letters: bool) -> dict:
+    arrays = keys.columns(n)
+    columns = {name: arrays[name].tolist() for name in FRAME_COLUMNS}
+    if blank_letters:
+        for name in ("repeat_letter_score", "magic_letter_score"):
+            columns[name] = [
+                None if index % 100 == 7 else value
+                for index, value in enumerate(columns[name])
+            ]
+    return columns
+
+
+def case_ranges(columns: dict) -> List[TimeRange]:
+    first = columns["created_at"][0]
+    return [TimeRange(None, None)] + [
+        TimeRange(first, first + timedelta(days=days)) for days in (1, 10, 40)
+    ]
+
+
+@pytest.fixture(scope="module")
+def polars_backend():
+    pytest.importorskip("polars")
+    return BACKENDS["polars"]()
+
+
+@pytest.mark.parametrize("blank_letters", [False, True], ids=["full", "blank letters"])
+@pytest.mark.parametrize("n", [1, 1000, 20000])
+def test_polars_matches_pandas(polars_backend, n, blank_letters):
+    columns = case_columns(SyntheticKeys(seed=SEED), n, blank_letters)
+    ranges = case_ranges(columns)
+
+    expected = outputs(BACKENDS["pandas"](), columns, ranges)
+    assert differences(expected, outputs(polars_backend, columns, ranges)) == []
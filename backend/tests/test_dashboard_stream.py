@@ -0,0 +1,99 @@
+"""Live dashboard deltas built from the hot window."""
+
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+
+from app.services.dashboard_stream import DashboardBroadcaster
+from app.services.hot_window import hot_window
+
+FINGERPRINT = "0" * 24 + "{:016X}" + "0" * 24
+
+
+@pytest.fixture
+def broadcaster():
+    hot_window._reset()
+    broadcaster = DashboardBroadcaster(enabled=True)
+    start, _ = broadcaster._today()
+    hot_window.covered_from = start
+    yield broadcaster
+    hot_window._reset()
+
+
+def append(broadcaster, scores, first_id=1):
+    start, _ = broadcaster._today()
+    rows = [
+        (
+            row_id,
+            start + timedelta(minutes=row_id),
+            score,
+            1.0,
+            1.0,
+            1.0,
+            1.0,
+            5,
+            FINGERPRINT.format(row_id),
+        )
+        for row_id, score in enumerate(scores, first_id)
+    ]
+    hot_window.append(rows)
+    hot_window.ready = True
+
+
+def event(frame: str) -> tuple:
+    fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    return int(fields["id"]), json.loads(fields["data"])
+
+
+def test_catch_up_stops_at_the_broadcast_position(broadcaster):
+    append(broadcaster, [100.0, 200.0, 300.0, 500.0, 600.0])
+    # 已广播到 id 3, 窗口里还有尚未广播的 4 和 5
+    broadcaster.last_id = 3
+    broadcaster._subscribers.add(asyncio.Queue())
+
+    event_id, catch_up = event(broadcaster._catch_up(asyncio.Queue(), 1))
+    assert event_id == 3
+    assert [key["fingerprint"] for key in catch_up["recent"]] == [
+        "0000000000000003",
+        "0000000000000002",
+    ]
+    assert catch_up["summary"]["count"] == 3
+
+    queue = next(iter(broadcaster._subscribers))
+    broadcaster.publish()
+    event_id, delta = event(queue.get_nowait())
+    assert event_id == 5
+    assert [key["fingerprint"] for key in delta["recent"]] == [
+        "0000000000000005",
+        "0000000000000004",
+    ]
+    assert delta["summary"]["count"] == 5
+
+
+def test_keys_without_score_match_the_rest_summary(broadcaster):
+    append(broadcaster, [100.0, None, 500.0])
+    delta = broadcaster.delta(0, 3)
+
+    assert delta["summary"]["mean"] == 300.0
+    assert delta["summary"]["max"] == 500.0
+    assert delta["summary"]["count"] == 3
+    assert delta["summary"]["qualified_count"] == 1
+    assert sum(delta["trend"]["counts"]["values"]) == 2
+
+
+def test_bucket_with_only_unscored_keys_is_zero(broadcaster):
+    append(broadcaster, [None])
+    delta = broadcaster.delta(0, 1)
+
+    assert delta["summary"] == {
+        "mean": 0,
+        "max": 0,
+        "count": 1,
+        "qualified_count": 0,
+        "qualified_rate": 0.0,
+    }
+    assert delta["trend"]["avg_scores"]["values"] == [0.0]
+    assert delta["trend"]["max_scores"]["values"] == [0.0]
+    assert delta["trend"]["counts"]["values"] == [0]
@@ -0,0 +1,175 @@
+"""Client disconnects cancel read requests in DeadlineMiddleware.
+
+The Postgres test needs the database from config.json and is skipped when
+it cannot be reached.
+"""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app.database import async_session, engine
+from app.middleware.deadline import DeadlineMiddleware
+from app.utils.metrics import request_cancelled_total
+
+
+def http_scope(method: str, path: str) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 8000),
+    }
+
+
+def disconnecting_receive(after: float):
+    """The request body, then ``http.disconnect`` ``after`` seconds later."""
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(after)
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+class SlowApp:
+    """Sleeps ``seconds`` before responding.
+
+    Records whether it was cancelled or finished.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.cancelled = False
+        self.finished = False
+
+    async def __call__(self, scope, receive, send):
+        await receive()
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        self.finished = True
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def call(app, scope, receive):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return sent, time.perf_counter() - started
+
+
+def cancelled_count(route: str) -> float:
+    return request_cancelled_total.labels(route=route)._value.get()
+
+
+def test_disconnect_cancels_read_request():
+    inner = SlowApp(seconds=5)
+    before = cancelled_count("/api/statistics")
+    sent, elapsed = asyncio.run(
+        call(
+            DeadlineMiddleware(inner),
+            http_scope("GET", "/api/statistics"),
+            disconnecting_receive(0.05),
+        )
+    )
+    assert inner.cancelled and not inner.finished
+    assert elapsed < 1
+    assert sent == []
+    assert cancelled_count("/api/statistics") == before + 1
+
+
+def test_disconnect_does_not_cancel_ingest():
+    inner = SlowApp(seconds=0.2)
+    sent, _ = asyncio.run(
+        call(
+            DeadlineMiddleware(inner),
+            http_scope("POST", "/api/keys"),
+            disconnecting_receive(0.05),
+        )
+    )
+    assert inner.finished and not inner.cancelled
+    assert sent[0]["status"] == 200
+
+
+def test_default_prefixes_are_read_only_routes():
+    middleware = DeadlineMiddleware(SlowApp(seconds=0))
+    assert middleware._cancel_prefix("GET", "/api/keys/recent") == "/api/keys/recent"
+    assert middleware._cancel_prefix("GET", "/api/keys") is None
+    assert middleware._cancel_prefix("POST", "/api/statistics") is None
+
+
+async def postgres_available() -> bool:
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        return False
+    return True
+
+
+def test_disconnect_cancels_running_query():
+    async def scenario():
+        if not await postgres_available():
+            pytest.skip("Postgres is not available")
+
+        async def query_app(scope, receive, send):
+            await receive()
+            async with async_session() as db:
+                await db.execute(text("SELECT pg_sleep(10)"))
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        sent, elapsed = await call(
+            DeadlineMiddleware(query_app),
+            http_scope("GET", "/api/statistics"),
+            disconnecting_receive(0.2),
+        )
+        # 取消在服务端异步生效, 稍等片刻
+        running = None
+        for _ in range(50):
+            async with engine.connect() as conn:
+                running = (
+                    await conn.execute(
+                        text(
+                            "SELECT count(*) FROM pg_stat_activity "
+                            "WHERE state = 'active' "
+                            "AND query LIKE 'SELECT pg_sleep(10)%'"
+                        )
+                    )
+                ).scalar_one()
+            if running == 0 and engine.pool.checkedout() == 0:
+                break
+            await asyncio.sleep(0.02)
+        # 被取消请求的连接必须已归还连接池
+        checked_out = engine.pool.checkedout()
+        await engine.dispose()
+        return sent, elapsed, running, checked_out
+
+    sent, elapsed, running, checked_out = asyncio.run(scenario())
+    assert sent == []
+    assert elapsed < 2
+    assert running == 0
+    assert checked_out == 0
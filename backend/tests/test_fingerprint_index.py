@@ -0,0 +1,81 @@
+"""Fingerprint index postings after change feed deletes."""
+
+import asyncio
+import re
+
+import pytest
+
+from app.services import fingerprint_index as module
+from app.services.change_feed import Change
+from app.services.fingerprint_index import FingerprintIndex
+
+FINGERPRINT = "0" * 24 + "{}" + "0" * 24
+KEY_IDS = ["ABCDEF0123456789", "ABCDEF0000000001", "FFFF0123456789AB"]
+
+
+class Rows(list):
+    def all(self):
+        return list(self)
+
+    def scalars(self):
+        return self
+
+
+class StandInSession:
+    """Holds the ids in ``existing``; no keys are newer than the index."""
+
+    def __init__(self, existing):
+        self.existing = existing
+
+    async def execute(self, query):
+        if len(query.selected_columns) > 1:
+            return Rows()
+        sql = str(query.compile(compile_kwargs={"literal_binds": True}))
+        low, high = map(int, re.search(r"BETWEEN (\d+) AND (\d+)", sql).groups())
+        return Rows(row_id for row_id in self.existing if low <= row_id <= high)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def index():
+    index = FingerprintIndex()
+    for row_id, key_id in enumerate(KEY_IDS, 1):
+        index.add(row_id, FINGERPRINT.format(key_id))
+    index.ready = True
+    return index
+
+
+def refresh(index, monkeypatch, existing):
+    session = StandInSession(existing)
+    monkeypatch.setattr(module, "async_session", lambda: session)
+    return asyncio.run(index.refresh(session))
+
+
+def test_delete_removes_postings_of_missing_ids(index, monkeypatch):
+    index.on_change([Change("delete", [], max_id=2, min_id=1)])
+    refresh(index, monkeypatch, existing=[2, 3])
+
+    assert len(index) == 2
+    assert index.search_suffix("6789", 10) == []
+    assert index.search_suffix("0001", 10) == [2]
+    assert index.search_regex("ABCDEF", 10) == [2]
+    postings = [*index._grams.values(), *index._tails.values()]
+    assert all(0 not in posting for posting in postings)
+    assert b"6789" not in index._tails
+    # 无字面量的扫描同样跳过已删除的记录
+    assert index._scan(re.compile(rb"^[0-9A-F]"), False, 10) == [3, 2]
+
+
+def test_mostly_deleted_index_is_rebuilt(index, monkeypatch):
+    index.on_change([Change("delete", [], max_id=3, min_id=1)])
+    refresh(index, monkeypatch, existing=[3])
+
+    # 三条中两条已删除, 整体重建并从数据库重新读取
+    assert len(index) == 0
+    assert index.last_row_id == 0
+    assert not index._removed
@@ -0,0 +1,111 @@
+"""ReplicaRouter against a live streaming replica.
+
+Needs the primary from config.json and a replica, e.g. the pair from
+docker-compose.replica.yml. The replica is the first entry of
+``database.replicas``, or localhost:5433 when none is configured. Skipped
+when either cannot be reached.
+"""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app import database
+from app.database import REPLICA_LAG_SQL, ReplicaRouter, async_session, engine
+
+# docker-compose.replica.yml 中副本映射到本机 5433 端口
+DEFAULT_REPLICA = {"name": "replica1", "host": "localhost", "port": 5433}
+
+# 与 REPLICA_LAG_SQL 相同, 但 pg_stat_wal_receiver 没有行, 即 WAL receiver 未运行
+NO_RECEIVER_LAG_SQL = text(
+    REPLICA_LAG_SQL.text.replace(
+        "LEFT JOIN pg_stat_wal_receiver AS receiver ON true",
+        "LEFT JOIN (SELECT NULL::text AS status,"
+        " NULL::timestamptz AS last_msg_receipt_time) AS receiver ON false",
+    )
+)
+
+
+async def reachable(target, query: str = "SELECT 1"):
+    try:
+        async with target.connect() as conn:
+            return (await conn.execute(text(query))).scalar_one()
+    except Exception:
+        return None
+
+
+async def live_router() -> ReplicaRouter:
+    """A router over the test replica with a fresh lag sample.
+
+    Skips the test when the primary or the replica is unavailable.
+    """
+    replicas = database.db_config.get("replicas") or [DEFAULT_REPLICA]
+    router = ReplicaRouter(replicas[:1])
+    replica = router.replicas[0]
+    if await reachable(engine) is None:
+        await replica.engine.dispose()
+        pytest.skip("Postgres primary is not available")
+    if not await reachable(replica.engine, "SELECT pg_is_in_recovery()"):
+        await replica.engine.dispose()
+        pytest.skip(f"No streaming replica at {replica.engine.url.render_as_string()}")
+    await replica.check_lag()
+    if replica.lag is None:
+        await replica.engine.dispose()
+        pytest.skip(f"Replica {replica.name} is not streaming WAL")
+    return router
+
+
+def route(router: ReplicaRouter, end_ms=None) -> str:
+    return "primary" if router.session_factory(end_ms) is async_session else "replica"
+
+
+def test_lag_over_the_limit_falls_back_to_primary(monkeypatch):
+    async def scenario():
+        router = await live_router()
+        replica = router.replicas[0]
+        try:
+            # 限额大于实测延迟时副本可用, 说明回退只由延迟引起
+            monkeypatch.setattr(database, "REPLICA_MAX_LAG_SECONDS", replica.lag + 60)
+            within = route(router)
+            monkeypatch.setattr(database, "REPLICA_MAX_LAG_SECONDS", replica.lag - 1)
+            over_open = route(router)
+            over_now = route(router, int(time.time() * 1000))
+            # 早于延迟的历史区间副本已经持有, 仍由副本读取
+            over_history = route(router, int((replica.checked_at - 3600) * 1000))
+        finally:
+            await replica.engine.dispose()
+            await engine.dispose()
+        return within, over_open, over_now, over_history
+
+    within, over_open, over_now, over_history = asyncio.run(scenario())
+    assert within == "replica"
+    assert over_open == "primary"
+    assert over_now == "primary"
+    assert over_history == "replica"
+
+
+def test_replica_without_streaming_receiver_falls_back_to_primary(monkeypatch):
+    async def scenario():
+        router = await live_router()
+        replica = router.replicas[0]
+        try:
+            history_ms = int((replica.checked_at - 3600) * 1000)
+            before = route(router, history_ms)
+            async with replica.engine.connect() as conn:
+                lag = (await conn.execute(NO_RECEIVER_LAG_SQL)).scalar_one()
+            monkeypatch.setattr(database, "REPLICA_LAG_SQL", NO_RECEIVER_LAG_SQL)
+            await replica.check_lag()
+            after = (route(router), route(router, history_ms))
+        finally:
+            await replica.engine.dispose()
+            await engine.dispose()
+        return before, lag, replica.lag, after
+
+    before, lag, sampled, after = asyncio.run(scenario())
+    assert before == "replica"
+    # 没有 WAL receiver 时延迟无法确认, 任何区间都不再读副本
+    assert lag is None
+    assert sampled is None
+    assert after == ("primary", "primary")
@@ -0,0 +1,57 @@
+"""Sealed-day snapshot export racing with invalidation."""
+
+import asyncio
+from datetime import date
+
+import pytest
+
+from app.services import key_exporter
+from app.services.snapshot_store import SnapshotStore
+
+DAY = date(2026, 1, 5)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path), enabled=True)
+
+
+def fake_stream(monkeypatch, during=None):
+    async def stream(self):
+        yield b"first"
+        if during is not None:
+            during()
+        yield b"second"
+
+    monkeypatch.setattr(key_exporter.KeyExporter, "stream", stream)
+
+
+def test_export_writes_the_day(store, monkeypatch):
+    fake_stream(monkeypatch)
+
+    assert asyncio.run(store.export_day(DAY))
+    with open(store._day_path(DAY), "rb") as f:
+        assert f.read() == b"firstsecond"
+
+
+def test_invalidation_during_export_discards_the_copy(store, monkeypatch):
+    fake_stream(monkeypatch, during=lambda: store.invalidate([DAY]))
+
+    assert not asyncio.run(store.export_day(DAY))
+    store._scan(force=True)
+    assert DAY not in store.days
+
+    # 下一轮导出清除标记并重新写入
+    fake_stream(monkeypatch)
+    assert asyncio.run(store.export_day(DAY))
+    store._scan(force=True)
+    assert DAY in store.days
+
+
+def test_invalidation_after_export_drops_the_file(store, monkeypatch):
+    fake_stream(monkeypatch)
+    asyncio.run(store.export_day(DAY))
+
+    store.invalidate([DAY])
+    store._scan(force=True)
+    assert DAY not in store.days
@@ -39,7 +39,7 @@ const convertToUTC = (timestamp: number) => {
 }
 
 // 响应数据时区转换
-const convertDatesToLocal = (data: any) => {
+export const convertDatesToLocal = (data: any) => {
   if (!data) return data
 
   if (Array.isArray(data)) {
@@ -247,8 +247,16 @@ export const getHighScoreKeys = (dateRange: { start: number; end: number } | nul
   return api.get('/keys/high-score', { params })
 }
 
-export const getStatistics = (dateRange: { start: number; end: number } | null = null) => {
-  let params: DateRangeParams = {}
+interface StatisticsParams extends DateRangeParams {
+  max_points?: number;
+}
+
+// maxPoints: 趋势序列的最大点数, 服务端按此降采样 (LTTB)
+export const getStatistics = (
+  dateRange: { start: number; end: number } | null = null,
+  maxPoints?: number
+) => {
+  let params: StatisticsParams = {}
 
   if (dateRange) {
     const start = dayjs(dateRange.start).tz(TIMEZONE)
@@ -273,9 +281,118 @@ export const getStatistics = (dateRange: { start: number; end: number } | null =
     })
   }
 
+  if (maxPoints) {
+    params.max_points = maxPoints
+  }
+
   return api.get('/statistics', { params })
 }
 
+export interface DashboardDelta {
+  day: string
+  recent: any[]
+  high_score: any[]
+  summary: {
+    mean: number
+    max: number
+    count: number
+    qualified_count: number
+    qualified_rate: number
+  }
+  trend: {
+    time_format: string
+    avg_scores: { times: string[]; values: number[] }
+    max_scores: { times: string[]; values: number[] }
+    counts: { times: string[]; values: number[] }
+  }
+}
+
+interface DashboardStreamHandlers {
+  onDelta: (delta: DashboardDelta) => void
+  // 服务端要求通过 REST 重新加载
+  onReset: () => void
+}
+
+// 今日仪表盘的实时增量 (SSE). EventSource 不能带 Authorization 头, 所以用 fetch 读取事件流;
+// 断开后按服务端的 retry 间隔重连, 并用 Last-Event-ID 补发断开期间的增量
+export const streamDashboard = (handlers: DashboardStreamHandlers) => {
+  const controller = new AbortController()
+  let lastEventId: string | null = null
+  let retryMs = 3000
+
+  const dispatch = (block: string) => {
+    let event = 'message'
+    let data = ''
+    let id: string | null = null
+    for (const line of block.split('\n')) {
+      if (line.startsWith(':')) continue
+      const colon = line.indexOf(':')
+      const field = colon === -1 ? line : line.slice(0, colon)
+      const value = colon === -1 ? '' : line.slice(colon + 1).replace(/^ /, '')
+      if (field === 'event') event = value
+      else if (field === 'data') data += (data ? '\n' : '') + value
+      else if (field === 'id') id = value
+      else if (field === 'retry' && /^\d+$/.test(value)) retryMs = Number(value)
+    }
+    if (id !== null) lastEventId = id
+    if (event === 'delta' && data) {
+      const delta = JSON.parse(data) as DashboardDelta
+      handlers.onDelta({
+        ...delta,
+        recent: convertDatesToLocal(delta.recent),
+        high_score: convertDatesToLocal(delta.high_score)
+      })
+    } else if (event === 'reset') {
+      // 重新加载后以 REST 结果为准, 不再补发旧的增量
+      lastEventId = null
+      handlers.onReset()
+    }
+  }
+
+  const connect = async () => {
+    const headers: Record<string, string> = { Accept: 'text/event-stream' }
+    const token = localStorage.getItem('token')
+    if (token) headers.Authorization = `Bearer ${token}`
+    if (lastEventId) headers['Last-Event-ID'] = lastEventId
+
+    const response = await fetch(`${currentConfig.api.baseURL}/stream/dashboard`, {
+      headers,
+      signal: controller.signal
+    })
+    if (!response.ok || !response.body) {
+      throw new Error(`Dashboard stream failed: ${response.status}`)
+    }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) return
+      buffer += value.replace(/\r\n?/g, '\n')
+      let boundary = buffer.indexOf('\n\n')
+      while (boundary !== -1) {
+        dispatch(buffer.slice(0, boundary))
+        buffer = buffer.slice(boundary + 2)
+        boundary = buffer.indexOf('\n\n')
+      }
+    }
+  }
+
+  const run = async () => {
+    while (!controller.signal.aborted) {
+      try {
+        await connect()
+      } catch (error) {
+        if (controller.signal.aborted) return
+        debug.warn('Dashboard stream disconnected:', error)
+      }
+      await new Promise(resolve => setTimeout(resolve, retryMs))
+    }
+  }
+
+  run()
+  return () => controller.abort()
+}
+
 interface MaskOrdersRequest {
   type: 'orderId' | 'productId'
   ids: string[]